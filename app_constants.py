@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import sys
+from functools import cache
 from pathlib import Path
 
+import numpy as np
+
 # ====== runtime / 路徑相關 ======
 WORKSPACE_ROOT = Path(__file__).resolve().parent
 USER_DATA_ROOT_DIRNAME = "user_data"
@@ -10,24 +13,33 @@ USER_DATA_STORE_DIRNAME = "user_schedules"
 COURSE_INPUT_DIRNAME = "course_inputs"
 
 
+@cache
 def runtime_root_path() -> Path:
-    """開發期即 workspace root，打包後為 exe 同層。"""
+    """開發期即 workspace root，打包後為 exe 同層（行程啟動後不會改變，結果快取）。"""
     return Path(sys.executable).resolve().parent if getattr(sys, "frozen", False) else WORKSPACE_ROOT
 
 
+@cache
 def user_data_root_path() -> Path:
     """取得程式目前所應遵守的 user_data 根資料夾。"""
     return runtime_root_path() / USER_DATA_ROOT_DIRNAME
 
 
+@cache
 def user_data_store_path() -> Path:
     """實際保存使用者資料的子資料夾（user_data/user_schedules）。"""
     return user_data_root_path() / USER_DATA_STORE_DIRNAME
 
 
+@cache
 def course_input_dir_path() -> Path:
-    """儲存課程輸入 Excel 的目錄（user_data/course_inputs）。"""
-    path = user_data_root_path() / COURSE_INPUT_DIRNAME
+    """儲存課程輸入 Excel 的目錄（user_data/course_inputs）；只計算路徑，不建立資料夾。"""
+    return user_data_root_path() / COURSE_INPUT_DIRNAME
+
+
+def ensure_course_input_dir() -> Path:
+    """確保 user_data/course_inputs 存在後回傳；僅在需要寫入時呼叫。"""
+    path = course_input_dir_path()
     path.mkdir(parents=True, exist_ok=True)
     return path
 
@@ -66,6 +78,18 @@ PERIOD_INDEX = {p: i for i, p in enumerate(PERIODS)}
 DAY_INDEX = {d: i for i, d in enumerate(DAYS)}
 BITS_PER_DAY = len(PERIODS)
 
+# 以字元碼位查表（-1 表示不是星期/節次字元）；"10" 為兩字元節次，需另外處理
+DAY_CODE_TABLE = np.full(0x10000, -1, dtype=np.int8)
+for _i, _d in enumerate(DAYS):
+    DAY_CODE_TABLE[ord(_d)] = _i
+DAY_CODE_TABLE[ord("天")] = DAY_INDEX["日"]
+
+PERIOD_CODE_TABLE = np.full(128, -1, dtype=np.int8)
+for _i, _p in enumerate(PERIODS):
+    if len(_p) == 1:
+        PERIOD_CODE_TABLE[ord(_p)] = _i
+del _i, _d, _p
+
 # 節次對應時間
 PERIOD_TIME = {
     "0": "07:10 ~ 08:00",
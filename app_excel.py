@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-import io
 import os
+import pickle
+import re
+import shutil
+import xml.etree.ElementTree as ET
 import zipfile
-from typing import List, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
@@ -13,7 +17,7 @@ from app_constants import COURSE_SHEET_CANDIDATES, REQUIRED_COLUMNS
 from app_utils import (
     parse_cid_to_int,
     parse_time_text,
-    slots_set_to_masks,
+    slot_sets_to_mask_array,
     format_cid4,
     _slot_sort_key,
     parse_gened_categories_from_course_name,
@@ -25,41 +29,179 @@ class ExcelFormatError(RuntimeError):
     pass
 
 
-def _patch_xlsx_namespaces_inplace(xlsx_path: str) -> bool:
-    repls = {
-        b"http://purl.oclc.org/ooxml/spreadsheetml/main": b"http://schemas.openxmlformats.org/spreadsheetml/2006/main",
-        b"http://purl.oclc.org/ooxml/officeDocument/relationships": b"http://schemas.openxmlformats.org/officeDocument/2006/relationships",
-        b"http://purl.oclc.org/ooxml/spreadsheetml/2009/9/main": b"http://schemas.microsoft.com/office/spreadsheetml/2009/9/main",
-    }
+# python-calamine 為選用套件：有安裝時 .xlsx 改用原生解析器，否則維持 openpyxl
+try:
+    import python_calamine  # noqa: F401
+
+    _CALAMINE_AVAILABLE = True
+except Exception:
+    _CALAMINE_AVAILABLE = False
+
+
+def _excel_engine_for(excel_path: str) -> Optional[str]:
+    ext = os.path.splitext(excel_path)[1].lower()
+    if _CALAMINE_AVAILABLE and ext in (".xlsx", ".xlsm"):
+        return "calamine"
+    return None
+
+
+# 解析結果快取格式版本；解析邏輯或欄位變動時需遞增，使舊快取失效
+PARSED_CACHE_VERSION = 2
+
+
+def _parsed_cache_path(excel_path: str) -> str:
+    return excel_path + ".parsed.pkl"
+
+
+def _parsed_cache_key(excel_path: str) -> Tuple[int, float, int]:
+    st = os.stat(excel_path)
+    return (PARSED_CACHE_VERSION, st.st_mtime, st.st_size)
+
+
+def _load_parsed_cache(excel_path: str) -> Optional[Tuple[pd.DataFrame, str]]:
+    cache_path = _parsed_cache_path(excel_path)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            key, df, sheet = pickle.load(f)
+        if key != _parsed_cache_key(excel_path):
+            return None
+        return df, sheet
+    except Exception:
+        return None
+
+
+def _save_parsed_cache(excel_path: str, df: pd.DataFrame, sheet: str) -> None:
+    cache_path = _parsed_cache_path(excel_path)
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump((_parsed_cache_key(excel_path), df, sheet), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+_ZIP_SCAN_CHUNK = 64 * 1024
+
+
+def _zip_worker_count(n_members: int) -> int:
+    return max(1, min(n_members, os.cpu_count() or 1))
+
+
+_PURL_NS_PREFIX = b"http://purl.oclc.org/ooxml/"
+_PURL_NS_SUFFIX_REPLS: Tuple[Tuple[bytes, bytes], ...] = (
+    (b"spreadsheetml/2009/9/main", b"http://schemas.microsoft.com/office/spreadsheetml/2009/9/main"),
+    (b"spreadsheetml/main", b"http://schemas.openxmlformats.org/spreadsheetml/2006/main"),
+    (b"officeDocument/relationships", b"http://schemas.openxmlformats.org/officeDocument/2006/relationships"),
+)
+
+
+def _replace_purl_namespaces(data: bytes) -> bytes:
+    # 三個來源 URI 共用同一前綴：只掃描一次前綴，命中後再比對後綴
+    pos = data.find(_PURL_NS_PREFIX)
+    if pos < 0:
+        return data
+
+    plen = len(_PURL_NS_PREFIX)
+    parts: List[bytes] = []
+    last = 0
+    while pos >= 0:
+        tail = pos + plen
+        for suffix, repl in _PURL_NS_SUFFIX_REPLS:
+            if data.startswith(suffix, tail):
+                parts.append(data[last:pos])
+                parts.append(repl)
+                last = tail + len(suffix)
+                break
+        pos = data.find(_PURL_NS_PREFIX, max(last, tail))
+
+    if not parts:
+        return data
+    parts.append(data[last:])
+    return b"".join(parts)
+
 
+def _patch_xlsx_namespaces_inplace(xlsx_path: str) -> bool:
+    def _member_needs_patch(zin: zipfile.ZipFile, name: str) -> bool:
+        # 串流解壓並分塊搜尋，保留上一塊尾端以免 needle 跨塊被切斷
+        needle = b"purl.oclc.org/ooxml"
+        keep = len(needle) - 1
+        tail = b""
+        with zin.open(name) as fp:
+            while True:
+                chunk = fp.read(_ZIP_SCAN_CHUNK)
+                if not chunk:
+                    return False
+                if needle in chunk or needle in tail + chunk[:keep]:
+                    return True
+                tail = chunk[-keep:]
+
+    # zlib 解壓時會釋放 GIL，各成員可並行解壓；任一成員命中即可提早結束
     with zipfile.ZipFile(xlsx_path, "r") as zin:
+        xml_names = [n for n in zin.namelist() if n.endswith(".xml")]
         needs = False
-        for name in zin.namelist():
-            if name.endswith(".xml") and b"purl.oclc.org/ooxml" in zin.read(name):
-                needs = True
-                break
+        with ThreadPoolExecutor(max_workers=_zip_worker_count(len(xml_names))) as ex:
+            futures = [ex.submit(_member_needs_patch, zin, n) for n in xml_names]
+            for fut in as_completed(futures):
+                if fut.result():
+                    needs = True
+                    for pending in futures:
+                        pending.cancel()
+                    break
 
     if not needs:
         return False
 
     backup_path = xlsx_path + ".bak.xlsx"
     if not os.path.exists(backup_path):
-        with open(xlsx_path, "rb") as fsrc, open(backup_path, "wb") as fdst:
-            fdst.write(fsrc.read())
+        # 同一檔案系統上以硬連結備份（不複製內容）；不支援時改用 copyfile
+        try:
+            os.link(xlsx_path, backup_path)
+        except OSError:
+            shutil.copyfile(xlsx_path, backup_path)
+
+    def _read_and_patch(zin: zipfile.ZipFile, item: zipfile.ZipInfo) -> bytes:
+        data = zin.read(item.filename)
+        if item.filename.endswith(".xml"):
+            data = _replace_purl_namespaces(data)
+        return data
+
+    # 寫到暫存檔再 os.replace：原檔 inode 不會被截斷，硬連結備份得以保留舊內容
+    tmp_path = xlsx_path + ".patching"
+    try:
+        with zipfile.ZipFile(xlsx_path, "r") as zin, zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zout:
+            items = zin.infolist()
+            with ThreadPoolExecutor(max_workers=_zip_worker_count(len(items))) as ex:
+                datas = list(ex.map(lambda it: _read_and_patch(zin, it), items))
+            for item, data in zip(items, datas):
+                zout.writestr(item, data)
+        os.replace(tmp_path, xlsx_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
-    buf = io.BytesIO()
-    with zipfile.ZipFile(xlsx_path, "r") as zin, zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zout:
-        for item in zin.infolist():
-            data = zin.read(item.filename)
-            if item.filename.endswith(".xml"):
-                for a, b in repls.items():
-                    data = data.replace(a, b)
-            zout.writestr(item, data)
+    return True
 
-    with open(xlsx_path, "wb") as f:
-        f.write(buf.getvalue())
 
-    return True
+_SHEET_TAG_RE = re.compile(rb"<(?:[\w.-]+:)?sheet\b")
+
+
+def _read_workbook_xml(xlsx_path: str) -> bytes:
+    try:
+        with zipfile.ZipFile(xlsx_path, "r") as z:
+            return z.read("xl/workbook.xml")
+    except KeyError as e:
+        raise ExcelFormatError("不是有效的 Excel 活頁簿：缺少 xl/workbook.xml。") from e
+    except zipfile.BadZipFile as e:
+        raise ExcelFormatError(f"不是有效的 Excel 活頁簿：{e}") from e
 
 
 def ensure_excel_readable(excel_path: str) -> str:
@@ -80,26 +222,49 @@ def ensure_excel_readable(excel_path: str) -> str:
             ) from e
 
     if ext in (".xlsx", ".xlsm", ".xltx", ".xltm"):
-        try:
-            wb = load_workbook(excel_path, data_only=True)
-            if not wb.sheetnames:
-                raise ExcelFormatError("Workbook 沒有任何工作表。")
-            return excel_path
-        except Exception:
-            patched = _patch_xlsx_namespaces_inplace(excel_path)
-            if not patched:
-                raise
-            wb2 = load_workbook(excel_path, data_only=True)
-            if not wb2.sheetnames:
-                raise ExcelFormatError("已嘗試修補 Excel，但仍讀不到工作表。")
-            return excel_path
+        # 只讀 xl/workbook.xml 驗證格式，不建構整本活頁簿
+        wb_xml = _read_workbook_xml(excel_path)
+        if _PURL_NS_PREFIX in wb_xml:
+            try:
+                patched = _patch_xlsx_namespaces_inplace(excel_path)
+            except Exception as e:
+                raise ExcelFormatError(f"修補 Excel 命名空間失敗：{e}") from e
+            if patched:
+                wb2 = load_workbook(excel_path, read_only=True, data_only=True)
+                try:
+                    if not wb2.sheetnames:
+                        raise ExcelFormatError("已嘗試修補 Excel，但仍讀不到工作表。")
+                finally:
+                    wb2.close()
+                return excel_path
+        if not _SHEET_TAG_RE.search(wb_xml):
+            raise ExcelFormatError("Workbook 沒有任何工作表。")
+        return excel_path
 
     raise ExcelFormatError(f"不支援的 Excel 副檔名：{ext}（僅支援 .xls / .xlsx）")
 
 
+_SHEETNAMES_CACHE: Dict[Tuple[str, float, int], List[str]] = {}
+
+
 def get_sheetnames(excel_path: str) -> List[str]:
-    xls = pd.ExcelFile(excel_path)
-    return list(xls.sheet_names)
+    st = os.stat(excel_path)
+    key = (os.path.abspath(excel_path), st.st_mtime, st.st_size)
+    cached = _SHEETNAMES_CACHE.get(key)
+    if cached is not None:
+        return list(cached)
+
+    ext = os.path.splitext(excel_path)[1].lower()
+    if ext == ".xls":
+        with pd.ExcelFile(excel_path) as xls:
+            names = [str(n) for n in xls.sheet_names]
+    else:
+        # 工作表名稱只存在 xl/workbook.xml，不需要 openpyxl 讀整本
+        root = ET.fromstring(_read_workbook_xml(excel_path))
+        names = [el.get("name", "") for el in root.findall("{*}sheets/{*}sheet")]
+
+    _SHEETNAMES_CACHE[key] = names
+    return list(names)
 
 
 def _pick_course_sheet(sheetnames: Sequence[str]) -> str:
@@ -109,84 +274,74 @@ def _pick_course_sheet(sheetnames: Sequence[str]) -> str:
     return sheetnames[0]
 
 
+def _map_unique(series: pd.Series, func) -> pd.Series:
+    # 系所/教師/必選等欄位重複值多：只對相異字串呼叫一次 func，再以 map 散回
+    return series.map({k: func(k) for k in series.unique()})
+
+
 def _build_courses_df_from_raw(raw: pd.DataFrame) -> pd.DataFrame:
     missing = [c for c in REQUIRED_COLUMNS if c not in raw.columns]
     if missing:
         raise ExcelFormatError("Excel 欄位不足，缺少：" + ", ".join(missing))
 
-    df = raw.copy()
-
-    cid_series = df["開課序號"].apply(parse_cid_to_int)
-    df = df[cid_series.notna()].copy()
-    df["_cid"] = cid_series.loc[df.index].astype(int)
+    # 以布林遮罩一次取出有效列（本身即為新物件），不再先整份 copy 再過濾
+    cid_series = raw["開課序號"].apply(parse_cid_to_int)
+    valid = cid_series.notna().to_numpy()
+    df = raw.loc[valid].reset_index(drop=True)
+    df["_cid"] = cid_series.to_numpy()[valid].astype(np.int64)
     df["開課序號"] = df["_cid"].apply(format_cid4)
 
     for col in ["開課代碼", "系所", "中文課程名稱", "教師", "必/選", "全/半", "地點時間"]:
         if col in df.columns:
-            df[col] = df[col].fillna("").astype(str).str.strip()
+            df[col] = _map_unique(df[col].fillna("").astype(str), str.strip)
 
     for col in ["學分", "限修人數", "選修人數"]:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce")
 
-    # Cache time parsing results to reduce repeated parsing on identical strings
-    time_cache = {}
-    parsed_results = []
-    for text in df["地點時間"]:
-        key = "" if text is None else str(text)
-        res = time_cache.get(key)
-        if res is None:
-            res = parse_time_text(text)
-            time_cache[key] = res
-        parsed_results.append(res)
-    df["_slots_set"] = [res.slots for res in parsed_results]
-    df["_slots"] = [sorted(res.slots, key=_slot_sort_key) for res in parsed_results]
-    df["_tba"] = [res.tba for res in parsed_results]
-
-    masks = [slots_set_to_masks(slots) for slots in df["_slots_set"]]
-    df["_mask_lo"] = [np.uint64(t[0]) for t in masks]
-    df["_mask_hi"] = [np.uint64(t[1]) for t in masks]
-
-    # Cache gened parsing to reduce repeated regex work
-    gened_cache = {}
-    gened_results = []
-    for name in df["中文課程名稱"]:
-        key = "" if name is None else str(name)
-        res = gened_cache.get(key)
-        if res is None:
-            res = parse_gened_categories_from_course_name(name)
-            gened_cache[key] = res
-        gened_results.append(res)
-    df["_gened_cats"] = gened_results
-
-    cname_series = df["銝剜?隤脩??迂"].fillna("").astype(str)
-    clean_name = cname_series.map(strip_bracket_text_for_timetable)
-    serial_label = df["_cid"].map(format_cid4)
+    # 以 factorize 去重後只解析一次：物件欄位以 map 散回，遮罩以整數索引一次 gather
+    time_text = df["地點時間"].fillna("").astype(str)
+    time_codes, time_uniq = pd.factorize(time_text, sort=False)
+    time_parsed = {k: parse_time_text(k) for k in time_uniq}
+
+    df["_slots_set"] = time_text.map({k: res.slots for k, res in time_parsed.items()})
+    df["_slots"] = time_text.map({k: sorted(res.slots, key=_slot_sort_key) for k, res in time_parsed.items()})
+    df["_tba"] = time_text.map({k: res.tba for k, res in time_parsed.items()}).astype(bool)
+
+    # (N, 2) 連續 uint64 陣列：欄 0 為 lo、欄 1 為 hi
+    uniq_masks = slot_sets_to_mask_array([time_parsed[k].slots for k in time_uniq])
+    masks = uniq_masks[time_codes]
+    df["_mask_lo"] = masks[:, 0]
+    df["_mask_hi"] = masks[:, 1]
+
+    cname_text = df["中文課程名稱"].fillna("").astype(str)
+    gened_parsed = {k: parse_gened_categories_from_course_name(k) for k in cname_text.unique()}
+    df["_gened_cats"] = cname_text.map(gened_parsed)
+
+    clean_name = cname_text.map(strip_bracket_text_for_timetable)
+    serial_label = df["_cid"].astype(str).str.zfill(4)
     df["_tt_label"] = (clean_name + "\n" + serial_label).str.strip()
 
     # Precompute lowercased fields for faster search (kept as internal columns)
-    if "開課代碼" in df.columns:
-        df["_code_lc"] = df["開課代碼"].str.lower()
-    if "中文課程名稱" in df.columns:
-        df["_cname_lc"] = df["中文課程名稱"].str.lower()
-    if "教師" in df.columns:
-        df["_teacher_lc"] = df["教師"].str.lower()
-    if "系所" in df.columns:
-        df["_dept_lc"] = df["系所"].str.lower()
+    for src, dst in (("開課代碼", "_code_lc"), ("中文課程名稱", "_cname_lc"), ("教師", "_teacher_lc"), ("系所", "_dept_lc")):
+        if src in df.columns:
+            df[dst] = _map_unique(df[src], str.lower)
 
     display_cols = [c for c in df.columns if not str(c).startswith("_")]
-    
-    # Using vectorized string concatenation is much faster than row-wise agg
-    all_text_series = pd.Series([""] * len(df), index=df.index, dtype=str)
-    for col in display_cols:
-        all_text_series += df[col].astype(str).fillna("") + " "
-    
-    df["_alltext"] = all_text_series.str.lower()
 
-    return df.reset_index(drop=True)
+    # 一次轉成 object 陣列後逐列 join，避免每個欄位各產生一份中間 Series
+    text_arr = df[display_cols].astype(str).fillna("").to_numpy(dtype=object)
+    all_text = [" ".join(row) + " " for row in text_arr.tolist()]
+    df["_alltext"] = pd.Series(all_text, index=df.index).str.lower()
+
+    return df
 
 
 def load_courses_auto(excel_path: str) -> Tuple[pd.DataFrame, str]:
+    cached = _load_parsed_cache(excel_path)
+    if cached is not None:
+        return cached
+
     sheetnames = get_sheetnames(excel_path)
     if not sheetnames:
         raise ExcelFormatError("Workbook 沒有任何工作表。")
@@ -198,18 +353,20 @@ def load_courses_auto(excel_path: str) -> Tuple[pd.DataFrame, str]:
     preferred = _pick_course_sheet(sheetnames)
     ordered = [preferred] + [s for s in sheetnames if s != preferred]
 
-    for s in ordered:
-        try:
-            raw = pd.read_excel(excel_path, sheet_name=s)
-            if any(c not in raw.columns for c in REQUIRED_COLUMNS):
+    # 只開啟一次活頁簿，共用的 sharedStrings/styles 不必每張工作表重新解析
+    with pd.ExcelFile(excel_path, engine=_excel_engine_for(excel_path)) as xls:
+        for s in ordered:
+            try:
+                raw = xls.parse(s)
+                if any(c not in raw.columns for c in REQUIRED_COLUMNS):
+                    continue
+                cnt = raw["開課序號"].apply(parse_cid_to_int).notna().sum()
+                if cnt > best_count:
+                    best_count = int(cnt)
+                    best_sheet = s
+                    best_raw = raw
+            except Exception:
                 continue
-            cnt = raw["開課序號"].apply(parse_cid_to_int).notna().sum()
-            if cnt > best_count:
-                best_count = int(cnt)
-                best_sheet = s
-                best_raw = raw
-        except Exception:
-            continue
 
     if best_raw is None:
         msg = "找不到包含必要欄位的工作表。\n\n"
@@ -217,4 +374,5 @@ def load_courses_auto(excel_path: str) -> Tuple[pd.DataFrame, str]:
         raise ExcelFormatError(msg)
 
     df = _build_courses_df_from_raw(best_raw)
+    _save_parsed_cache(excel_path, df, best_sheet)
     return df, best_sheet
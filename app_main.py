@@ -6,6 +6,7 @@ r"""專案架構與環境:
 
 from __future__ import annotations
 
+import multiprocessing
 import sys
 import traceback
 
@@ -38,5 +39,7 @@ def main() -> int:
         return 1
 
 if __name__ == "__main__":
+    # 打包後的最佳課表計算會啟動子行程，需先讓子行程辨識自身
+    multiprocessing.freeze_support()
 
     raise SystemExit(main())
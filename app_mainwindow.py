@@ -1,15 +1,17 @@
 from __future__ import annotations
 
+import itertools
 import os
 import shutil
 import sys
 import time
+from collections import OrderedDict
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
-from functools import partial
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from functools import lru_cache, partial
 
 import numpy as np
-import pandas as pd
 
 from PySide6.QtCore import (
     Qt,
@@ -19,13 +21,12 @@ from PySide6.QtCore import (
     QSortFilterProxyModel,
     QThreadPool,
 )
-from PySide6.QtGui import QAction, QBrush, QColor, QFontMetrics
+from PySide6.QtGui import QAction, QBrush, QColor, QRegion
 from PySide6.QtWidgets import (
     QApplication,
     QAbstractItemView,
     QCheckBox,
     QComboBox,
-    QCompleter,
     QFileDialog,
     QFormLayout,
     QGroupBox,
@@ -47,6 +48,8 @@ from PySide6.QtWidgets import (
 )
 
 from app_constants import (
+    BITS_PER_DAY,
+    DAY_INDEX,
     DAY_LABEL,
     GENED_CORE_OPTIONS,
     GENED_DEPT_NAME,
@@ -55,8 +58,9 @@ from app_constants import (
     SPORT_DEPT_NAME,
     TEACHING_NAME_TOKEN,
     course_input_dir_path,
+    ensure_course_input_dir,
 )
-from app_excel import ensure_excel_readable, load_courses_auto
+from app_search_kernels import SubstringIndex, filter_rows
 from app_timetable_logic import build_timetable_matrix_per_day_lanes_sorted, darken, occupied_masks_sorted
 from app_user_data import (
     best_schedule_dir_path,
@@ -70,56 +74,124 @@ from app_user_data import (
     save_user_file,
 )
 from app_utils import (
+    mask_arrays_to_slot_csr,
     parse_gened_categories_from_course_name,
     sanitize_folder_name,
-    slot_to_mask,
+    slot_code_to_pair,
     sorted_array_from_set_int,
+    sorted_index_of,
     format_cid4,
+    lazy_pandas,
 )
 from app_widgets import (
-    FavoritesTableWidget,
-    FloatSortItem,
-    IntSortItem,
+    ContainsCompleter,
+    FAV_CID_ROLE,
+    FavDeleteDelegate,
+    FavHandleDelegate,
+    FavoritesModel,
+    FavoritesTableView,
     ResultsFrozenView,
     ResultsModel,
     TimetableWidget,
     TTTimeSelectDelegate,
+    TableFreeze,
+    font_metrics,
+    text_width,
 )
 from app_workers import BestScheduleWorker, SaveWorker
 
-FAV_CID_ROLE = Qt.UserRole + 1
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 打包成員索引的旗標位元
+_MEMBER_FAV = 1
+_MEMBER_INC = 2
+_MEMBER_LOCK = 4
+_MEMBER_ALL = _MEMBER_FAV | _MEMBER_INC | _MEMBER_LOCK
+
+_SLOTS_CACHE_MAX = 16
+_TT_BUILD_CACHE_MAX = 2
+
+# 延遲工作種類（共用同一個 QTimer，依序號決定執行順序）
+PEND_SEARCH = 1
+PEND_AUTOSAVE = 2
+
+# 輸入框的搜尋防彈跳（毫秒）：連續輸入時期限一直往後延，整段輸入只跑最後一次搜尋
+_SEARCH_DEBOUNCE_TEXT_MS = 150
+_SEARCH_DEBOUNCE_FULL_TEXT_MS = 180
+_SEARCH_DEBOUNCE_DEPT_MS = 120
+
+# 文字搜尋用的小寫欄位：載入時各建一個子字串索引
+_TEXT_INDEX_COLUMNS = ("_alltext", "_code_lc", "_cname_lc", "_teacher_lc", "_dept_lc")
+
+# 節次數固定；熱路徑（繪製/拖曳）直接用常數，不每次呼叫 len()
+_N_PERIODS = len(PERIODS)
+
+_EXCEL_SUFFIXES = (".xls", ".xlsx")
+_EXCEL_SUFFIXES_FAST = _EXCEL_SUFFIXES + (".XLS", ".XLSX")
 
 
 def _is_excel_file_name(fn: str) -> bool:
-    lf = fn.lower()
-    if not (lf.endswith(".xls") or lf.endswith(".xlsx")):
-        return False
-    if lf.startswith("~$"):
+    if fn.startswith("~$"):
         return False
-    return True
+    if fn.endswith(_EXCEL_SUFFIXES_FAST):
+        return True
+    # 少見的大小寫混用（如 .Xlsx）：只對副檔名長度的尾段做 lower()
+    return fn[-5:].lower().endswith(_EXCEL_SUFFIXES)
+
+
+@lru_cache(maxsize=4)
+def _slot_mask_table(show_days: Tuple[str, ...]) -> np.ndarray:
+    """回傳 (天數, 節次, 2) 的 uint64 遮罩表（最後一維為 lo/hi）；只取決於顯示的星期，唯讀共用。"""
+    day_idx = np.array([DAY_INDEX.get(d, -1) for d in show_days], dtype=np.int64)
+    bit = day_idx[:, None] * BITS_PER_DAY + np.arange(len(PERIODS), dtype=np.int64)[None, :]
+    valid = (day_idx >= 0)[:, None]
+    one = np.uint64(1)
+    tbl = np.zeros((len(show_days), len(PERIODS), 2), dtype=np.uint64)
+    tbl[..., 0] = np.where(valid & (bit < 64), one << (bit % 64).astype(np.uint64), 0)
+    tbl[..., 1] = np.where(valid & (bit >= 64), one << (bit % 64).astype(np.uint64), 0)
+    tbl.setflags(write=False)
+    return tbl
+
+
+@lru_cache(maxsize=4)
+def _slot_mask_not_table(show_days: Tuple[str, ...]) -> np.ndarray:
+    """_slot_mask_table 逐格取反（~mask），拖曳清除選取時直接以 bitwise_and 化簡。"""
+    tbl = ~_slot_mask_table(show_days)
+    tbl.setflags(write=False)
+    return tbl
+
+
+@lru_cache(maxsize=8)
+def _day_mask(day: str) -> np.ndarray:
+    """某一天所有節次 OR 起來的 (2,) uint64 遮罩；每個星期只計算一次。"""
+    m = np.bitwise_or.reduce(_slot_mask_table((day,))[0], axis=0)
+    m.setflags(write=False)
+    return m
 
 
 def find_lex_last_excel(search_dirs: Sequence[str]) -> Optional[str]:
-    candidates: List[str] = []
+    # 以檔名（字典序）為準取最後；scandir 的 is_file() 使用目錄項快取，不另外 stat
+    best_key: Optional[str] = None
+    best_path: Optional[str] = None
     for d in search_dirs:
         if not d or not os.path.isdir(d):
             continue
         try:
-            for fn in os.listdir(d):
-                if not _is_excel_file_name(fn):
-                    continue
-                p = os.path.join(d, fn)
-                if os.path.isfile(p):
-                    candidates.append(p)
+            with os.scandir(d) as it:
+                for entry in it:
+                    if not _is_excel_file_name(entry.name):
+                        continue
+                    if not entry.is_file():
+                        continue
+                    key = entry.name.casefold()
+                    if best_key is None or key > best_key:
+                        best_key = key
+                        best_path = entry.path
         except Exception:
             continue
 
-    if not candidates:
-        return None
-
-    # 以檔名（字典序）為準，取最後
-    best = max(candidates, key=lambda p: os.path.basename(p).casefold())
-    return best
+    return best_path
 
 
 class MainWindow(QMainWindow):
@@ -131,8 +203,10 @@ class MainWindow(QMainWindow):
         self.excel_path: str = ""
         self.course_sheet_name: str = ""
         self.courses_df: Optional[pd.DataFrame] = None
+        # (路徑, mtime_ns, 檔案大小)：與上次載入相同時沿用已解析的 DataFrame 與索引
+        self._index_signature: Optional[Tuple[str, int, int]] = None
         self.display_columns: List[str] = []
-        self.filtered_df: pd.DataFrame = pd.DataFrame()
+        self.filtered_df: Optional[pd.DataFrame] = None
 
         self.username: str = ""
         self.user_dir_path: str = ""
@@ -146,36 +220,46 @@ class MainWindow(QMainWindow):
         self.fav_seq: Dict[int, int] = {}
         self._fav_seq_next: int = 1
 
-        self._favorites_sorted_cache = np.empty((0,), dtype=np.int64)
-        self._favorites_sorted_dirty = True
-        self._included_sorted_cache = np.empty((0,), dtype=np.int64)
-        self._included_sorted_dirty = True
-        self._locked_sorted_cache = np.empty((0,), dtype=np.int64)
-        self._locked_sorted_dirty = True
+        # 最愛/課表/鎖定三組集合的打包索引：一個排序好的 id 陣列 + 每個 id 的旗標位元
+        self._member_ids = np.empty((0,), dtype=np.int64)
+        self._member_flags = np.empty((0,), dtype=np.uint8)
+        self._member_dirty: int = _MEMBER_ALL
+        self._member_sorted: Dict[int, np.ndarray] = {}
 
-        self._sel_lo = np.uint64(0)
-        self._sel_hi = np.uint64(0)
+        # 128 位元時間選取遮罩，[lo, hi]
+        self._sel_mask = np.zeros(2, dtype=np.uint64)
+        # ~_sel_mask，只在選取改變時重算（見 _set_sel_mask），搜尋時直接使用
+        self._sel_mask_not = ~self._sel_mask
+        # 已排課課程的佔用遮罩：(排課 id bytes, (2,) uint64)，排課不變時搜尋直接沿用
+        self._occ_mask_cache: Optional[Tuple[bytes, np.ndarray]] = None
 
         self.show_saturday = False
         self.show_time = False
         self.show_days: List[str] = self._calc_show_days()
-        self._slot_mask_lo: List[List[np.uint64]] = []
-        self._slot_mask_hi: List[List[np.uint64]] = []
+        self._days_len = len(self.show_days)
+        self._slot_mask_tbl: np.ndarray = np.empty((0, len(PERIODS), 2), dtype=np.uint64)
+        self._slot_mask_not_tbl: np.ndarray = self._slot_mask_tbl
+        # (天數, 節次) 的布林表：各格是否在選取範圍內，隨 _sel_mask 一起更新，繪製時直接查表
+        self._tt_sel_cells: np.ndarray = np.zeros((0, len(PERIODS)), dtype=bool)
         self._rebuild_slot_masks()
 
         self._tt_col_day_idx: List[int] = []
         self._tt_first_lane_col: Dict[int, int] = {}
-        self._tt_locked_matrix: List[List[bool]] = []
+        self._tt_col_day: Tuple[Optional[int], ...] = ()
+        self._tt_col_has_box: Tuple[bool, ...] = ()
+        # 課表中鎖定課程所佔的 (列, 欄)；繪製時以集合判斷，不必逐層檢查巢狀 list 的邊界
+        self._tt_locked_cells: frozenset = frozenset()
 
         self._tt_dragging = False
         self._tt_drag_state: Optional[bool] = None
         self._tt_drag_start_day: Optional[int] = None
         self._tt_drag_start_row: Optional[int] = None
-        self._tt_drag_base_lo = np.uint64(0)
-        self._tt_drag_base_hi = np.uint64(0)
+        self._tt_drag_base_mask = np.zeros(2, dtype=np.uint64)
         self._tt_drag_last_rect: Optional[Tuple[int, int, int, int]] = None
         self._tt_drag_has_moved = False
         self._tt_drag_initial_rect: Optional[Tuple[int, int, int, int]] = None
+        # 拖曳中的查詢延遲（毫秒）：移動時合併成一次，放開滑鼠時立即查詢
+        self._drag_search_delay_ms = 60
 
         self._session_fav_backup: Optional[Set[int]] = None
         self._session_inc_backup: Optional[Set[int]] = None
@@ -188,9 +272,12 @@ class MainWindow(QMainWindow):
         self._best_token = 0
         self._best_files: List[str] = []
         self._history_selected_brush = QBrush(QColor("#FFB74D"))
+        self._empty_brush = QBrush()
         self.tbl_tt_preview: Optional[TimetableWidget] = None
         self._history_preview_snapshot: Optional[Dict[str, Any]] = None
         self._history_layout_active = False
+        # 課表重繪合併：同一輪事件內多次標記只重繪一次
+        self._tt_dirty = False
 
         self._day_bg_base: List[QColor] = [
             QColor("#F2F7FF"),
@@ -201,35 +288,75 @@ class MainWindow(QMainWindow):
             QColor("#F2FFFF"),
         ]
         self._block_dark_factor = 0.82
+        # 課表格子用的畫刷只建立一次：(星期索引, 是否加深) -> QBrush，以及固定顏色
+        self._tt_day_brush: Dict[Tuple[int, bool], QBrush] = {}
+        for i, color in enumerate(self._day_bg_base):
+            self._tt_day_brush[(i, False)] = QBrush(color)
+            self._tt_day_brush[(i, True)] = QBrush(darken(color, self._block_dark_factor))
+        # 同色的畫刷共用同一個物件
+        black_brush = QBrush(QColor("#000000"))
+        white_brush = QBrush(QColor("#FFFFFF"))
+        self._tt_locked_bg_brush = black_brush
+        self._tt_locked_fg_brush = white_brush
+        self._tt_added_bg_brush = QBrush(QColor("#1B5E20"))
+        self._tt_added_fg_brush = white_brush
+        self._tt_deleted_bg_brush = QBrush(QColor("#B71C1C"))
+        self._tt_default_fg_brush = black_brush
 
         self._cid_sorted: Optional[np.ndarray] = None
         self._name_sorted: Optional[np.ndarray] = None
         self._teacher_sorted: Optional[np.ndarray] = None
         self._credit_sorted: Optional[np.ndarray] = None
+        # 開課序號 -> 學分（NaN 視為 0）；少量 id 加總時直接查表
+        self._credit_by_cid: Dict[int, float] = {}
+        self._cid_str_sorted: Optional[np.ndarray] = None
         self._all_depts: Set[str] = set()
+        self._all_depts_sorted: List[str] = []
         self._cid_arr: Optional[np.ndarray] = None
-        self._mask_lo_arr: Optional[np.ndarray] = None
-        self._mask_hi_arr: Optional[np.ndarray] = None
+        # 每門課的 128 位元時間遮罩，形狀 (N, 2)，欄 0 為 lo、欄 1 為 hi
+        self._mask_arr: Optional[np.ndarray] = None
         self._tba_arr: Optional[np.ndarray] = None
         self._dept_arr: Optional[np.ndarray] = None
-        self._slots_by_cid: Dict[int, Set[str]] = {}
-
-        self._search_timer = QTimer(self)
-        self._search_timer.setSingleShot(True)
-        self._search_timer.timeout.connect(self._do_search_now)
+        self._dept_code_arr: Optional[np.ndarray] = None
+        self._dept_code_of: Dict[str, int] = {}
+        self._text_index: Dict[str, SubstringIndex] = {}
+        self._course_info_cache: Dict[int, Tuple[str, str, str, float]] = {}
+        # id 集合 -> 佔用節次；只依課程資料而定，重建課程索引時清空（先進先出，最多 _SLOTS_CACHE_MAX 筆）
+        self._slots_cache: "OrderedDict[frozenset, Set[Tuple[str, str]]]" = OrderedDict()
+        # (已選 id bytes, 鎖定集合, 顯示星期) -> 課表建構結果；主課表與預覽課表常以相同輸入連續重繪
+        self._tt_build_cache: "OrderedDict[Tuple[bytes, frozenset, Tuple[str, ...]], Tuple[Any, ...]]" = OrderedDict()
+        self._last_search_key: Optional[Tuple[Any, ...]] = None
+        self._cid_sorted_rows: Optional[np.ndarray] = None
+        # 每門課使用的 slot（CSR：第 i 列為 _slots_values[_slots_indptr[i]:_slots_indptr[i + 1]]）
+        self._slots_indptr: Optional[np.ndarray] = None
+        self._slots_values: Optional[np.ndarray] = None
+
+        # 搜尋 / 自動儲存共用一個單次 QTimer：只有在新的期限更早時才重設計時器
+        self._pending_flags = 0
+        self._pending_due: Dict[int, float] = {}
+        self._pending_timer = QTimer(self)
+        self._pending_timer.setSingleShot(True)
+        self._pending_timer.timeout.connect(self._drain_pending)
+        self._pending_timer_due = 0.0
 
         self.threadpool = QThreadPool.globalInstance()
-        self._autosave_timer = QTimer(self)
-        self._autosave_timer.setSingleShot(True)
-        self._autosave_timer.timeout.connect(self._autosave_now)
 
         self._save_token = 0
         self._save_latest_token = 0
         self._save_inflight = False
         self._save_pending = False
-        self._save_pending_snapshot: Optional[Tuple[Set[int], Set[int], Set[int], Dict[int, int]]] = None
+        # 待存快照：(存檔路徑, 課程表 id, 成員 id, 成員旗標, 加入順序)，後三者為與成員索引對齊的陣列
+        self._save_pending_snapshot: Optional[Tuple[str, int, np.ndarray, np.ndarray, np.ndarray]] = None
+        self._save_inflight_sig: Optional[Tuple[str, int, bytes, bytes, bytes]] = None
+        # 上次成功存檔的快照簽章；內容相同時不再啟動存檔 worker
+        self._last_saved_sig: Optional[Tuple[str, int, bytes, bytes, bytes]] = None
+        self._save_seq_dirty = True
 
         self._default_sizes_applied = False
+        # 我的最愛表格不可見時（視窗尚未顯示）只記下待刷新，顯示時再重建一次
+        self._fav_pending_refresh = False
+        # 上次重建我的最愛表格時的（最愛 id, 旗標, 優先度）簽章；相同時略過重建
+        self._last_fav_render_sig: Optional[Tuple[bytes, bytes, Tuple[int, ...]]] = None
         self._fav_default_width_applied = False
 
         self.FAV_COL_HANDLE = 0
@@ -243,14 +370,19 @@ class MainWindow(QMainWindow):
         self.FAV_COL_DELETE = 8
         self._fav_sort_section = self.FAV_COL_RANK
         self._fav_sort_order = Qt.AscendingOrder
+        # 是否以加入順序（優先度欄遞增）排序；只在 _set_fav_sort_state 中重算
+        self._fav_join_sort_active = True
 
         self._build_menu()
         self._build_ui()
-        self._try_autoload_default_excel()
+        # 視窗先顯示，再載入課程檔（pandas / openpyxl 於此時才匯入）
+        QTimer.singleShot(0, self._try_autoload_default_excel)
 
     # ====== UI / Menu ======
     def showEvent(self, event):
         super().showEvent(event)
+        if self._fav_pending_refresh:
+            self._refresh_favorites_table()
         if not self._default_sizes_applied:
             self._default_sizes_applied = True
             QTimer.singleShot(0, self._apply_default_panel_sizes)
@@ -274,11 +406,17 @@ class MainWindow(QMainWindow):
             cb.lineEdit().setPlaceholderText(placeholder)
             cb.lineEdit().setClearButtonEnabled(True)
 
-        comp = QCompleter(cb.model(), cb)
-        comp.setCaseSensitivity(Qt.CaseInsensitive)
-        comp.setFilterMode(Qt.MatchContains)
-        comp.setCompletionMode(QCompleter.PopupCompletion)
+        comp = ContainsCompleter(cb)
         cb.setCompleter(comp)
+        if cb.lineEdit():
+            cb.lineEdit().textEdited.connect(comp.set_filter_text)
+        self._sync_combo_completer(cb)
+
+    @staticmethod
+    def _sync_combo_completer(cb: QComboBox) -> None:
+        comp = cb.completer()
+        if isinstance(comp, ContainsCompleter):
+            comp.set_items([cb.itemText(i) for i in range(cb.count())])
 
     def _build_ui(self) -> None:
         root = QWidget()
@@ -296,6 +434,7 @@ class MainWindow(QMainWindow):
         self.cb_users = QComboBox()
         self._configure_combo_searchable(self.cb_users, "搜尋/選擇已建立使用者")
         self.cb_users.addItem("(未選擇)")
+        self._sync_combo_completer(self.cb_users)
         self.cb_users.setMinimumWidth(220)
         top.addWidget(self.cb_users)
 
@@ -554,17 +693,37 @@ class MainWindow(QMainWindow):
         self.lbl_readonly.setVisible(False)
         fav_layout.addWidget(self.lbl_readonly)
 
-        self.tbl_fav = FavoritesTableWidget(
+        self.fav_model = FavoritesModel(
+            ["拖曳排序", "課表", "鎖定", "開課序號", "中文課程名稱", "教師", "學分數", "優先度", "刪除"],
+            schedule_col=self.FAV_COL_SCHEDULE,
+            lock_col=self.FAV_COL_LOCK,
+            id_col=self.FAV_COL_ID,
+            name_col=self.FAV_COL_NAME,
+            teacher_col=self.FAV_COL_TEACHER,
+            credit_col=self.FAV_COL_CREDIT,
+            rank_col=self.FAV_COL_RANK,
+            drag_col=self.FAV_COL_HANDLE,
+        )
+        self.fav_model.checkToggled.connect(self.on_fav_check_toggled)
+        # 排序交給 proxy：Qt.UserRole 為各欄的排序鍵（數值欄以數值比較）
+        self.proxy_fav = QSortFilterProxyModel(self)
+        self.proxy_fav.setSourceModel(self.fav_model)
+        self.proxy_fav.setSortRole(Qt.UserRole)
+
+        self.tbl_fav = FavoritesTableView(
             move_column=self.FAV_COL_HANDLE,
             cid_column=self.FAV_COL_ID,
         )
-        self.tbl_fav.setColumnCount(9)
-        self.tbl_fav.setHorizontalHeaderLabels(
-            ["拖曳排序", "課表", "鎖定", "開課序號", "中文課程名稱", "教師", "學分數", "優先度", "刪除"]
-        )
+        self.tbl_fav.setModel(self.proxy_fav)
+        # 拖曳把手與刪除按鈕以 delegate 直接繪製，不為每列建立 widget
+        self.fav_handle_delegate = FavHandleDelegate(self.tbl_fav)
+        self.fav_delete_delegate = FavDeleteDelegate(self.FAV_COL_LOCK, self.tbl_fav)
+        self.fav_delete_delegate.deleteRequested.connect(self._delete_favorite)
+        self.tbl_fav.setItemDelegateForColumn(self.FAV_COL_HANDLE, self.fav_handle_delegate)
+        self.tbl_fav.setItemDelegateForColumn(self.FAV_COL_DELETE, self.fav_delete_delegate)
+        self.tbl_fav.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.tbl_fav.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.tbl_fav.setSelectionMode(QAbstractItemView.SingleSelection)
-        self.tbl_fav.cellChanged.connect(self.on_fav_cell_changed)
         self.tbl_fav.orderChanged.connect(self._on_favorites_reordered)
         self.tbl_fav.dragSelectionFinished.connect(self._on_fav_drag_selection_finished)
         # If a drop completed but did not change order, request a visual refresh
@@ -583,7 +742,7 @@ class MainWindow(QMainWindow):
 
         fav_btn_row = QHBoxLayout()
         self.btn_refresh_fav = QPushButton("重新整理")
-        self.btn_refresh_fav.clicked.connect(self._refresh_favorites_table)
+        self.btn_refresh_fav.clicked.connect(lambda: self._refresh_favorites_table(force=True))
         self.btn_refresh_fav.setToolTip("重新整理「我的最愛」列表")
         
         self.btn_clear_fav = QPushButton("清空最愛")
@@ -653,7 +812,7 @@ class MainWindow(QMainWindow):
         self.results_frozen = ResultsFrozenView()
         res_layout.addWidget(self.results_frozen, 1)
 
-        self.model_results = ResultsModel(pd.DataFrame(), self.favorites_ids)
+        self.model_results = ResultsModel(None, self.favorites_ids)
         self.model_results.favoriteToggled.connect(self.on_result_favorite_toggled)
 
         self.proxy_results = QSortFilterProxyModel(self)
@@ -664,28 +823,48 @@ class MainWindow(QMainWindow):
         self.results_frozen.setModel(self.proxy_results)
 
         # signals
-        self.ed_serial.textChanged.connect(lambda: self.schedule_search(80))
-        self.ed_course_code.textChanged.connect(lambda: self.schedule_search(80))
-        self.ed_cname.textChanged.connect(lambda: self.schedule_search(80))
-        self.ed_teacher.textChanged.connect(lambda: self.schedule_search(80))
-        self.ed_full.textChanged.connect(lambda: self.schedule_search(100))
-
-        self.cb_dept.currentTextChanged.connect(lambda: self.schedule_search(60))
+        # 以綁定方法連接（不為每個訊號各建一個 lambda）
+        self.ed_serial.textChanged.connect(self._on_text_filter_changed)
+        self.ed_course_code.textChanged.connect(self._on_text_filter_changed)
+        self.ed_cname.textChanged.connect(self._on_text_filter_changed)
+        self.ed_teacher.textChanged.connect(self._on_text_filter_changed)
+        self.ed_full.textChanged.connect(self._on_full_text_filter_changed)
+
+        self.cb_dept.currentTextChanged.connect(self._on_dept_filter_changed)
         if self.cb_dept.lineEdit() is not None:
-            self.cb_dept.lineEdit().textEdited.connect(lambda _txt: self.schedule_search(80))
+            self.cb_dept.lineEdit().textEdited.connect(self._on_text_filter_changed)
 
-        self.ck_not_full.stateChanged.connect(lambda _v: self.schedule_search(0))
-        self.ck_exclude_conflict.stateChanged.connect(lambda _v: self.schedule_search(0))
-        self.ck_exclude_selected.stateChanged.connect(lambda _v: self.schedule_search(0))
-        self.ck_show_tba.stateChanged.connect(lambda _v: self.schedule_search(0))
+        self.ck_not_full.stateChanged.connect(self._on_filter_changed)
+        self.ck_exclude_conflict.stateChanged.connect(self._on_filter_changed)
+        self.ck_exclude_selected.stateChanged.connect(self._on_filter_changed)
+        self.ck_show_tba.stateChanged.connect(self._on_filter_changed)
 
-        self.cb_match_mode.currentIndexChanged.connect(lambda _v: self.schedule_search(0))
-        self.cb_gened_core.currentTextChanged.connect(lambda _v: self.schedule_search(0))
+        self.cb_match_mode.currentIndexChanged.connect(self._on_filter_changed)
+        self.cb_gened_core.currentTextChanged.connect(self._on_filter_changed)
 
         self.ck_gened.toggled.connect(self.on_special_option_toggled)
         self.ck_sport.toggled.connect(self.on_special_option_toggled)
         self.ck_teaching.toggled.connect(self.on_special_option_toggled)
 
+        # 「清除所有條件」時需暫停訊號的元件
+        self._clear_all_widgets: Tuple[QWidget, ...] = (
+            self.ed_serial,
+            self.ed_course_code,
+            self.ed_cname,
+            self.ed_teacher,
+            self.ed_full,
+            self.cb_dept,
+            self.cb_match_mode,
+            self.ck_gened,
+            self.ck_sport,
+            self.ck_teaching,
+            self.ck_not_full,
+            self.ck_exclude_conflict,
+            self.ck_exclude_selected,
+            self.ck_show_tba,
+            self.cb_gened_core,
+        )
+
         QTimer.singleShot(0, self._apply_fav_default_column_widths_once)
 
     def _configure_timetable_widget(self, widget: TimetableWidget, *, use_delegate: bool) -> None:
@@ -772,7 +951,8 @@ class MainWindow(QMainWindow):
                 self.split_left_v.setSizes([1, 1])
             if hasattr(self, "tt_splitter"):
                 self.tt_splitter.setSizes([1, 0])
-        self._refresh_history_preview_timetable()
+        if not self._tt_dirty:
+            self._refresh_history_preview_timetable()
 
     # ====== Excel 載入：自動找字典序最後的 xls/xlsx ======
     def _try_autoload_default_excel(self) -> None:
@@ -793,6 +973,12 @@ class MainWindow(QMainWindow):
                 )
                 return
 
+        # 找不到課程檔時才建立資料夾，方便使用者把檔案放進去
+        try:
+            ensure_course_input_dir()
+        except Exception:
+            pass
+
         self.lbl_excel.setText("課程 Excel：尚未載入（請使用「檔案 → 開啟課程 Excel…」）")
         QMessageBox.information(
             self,
@@ -803,32 +989,48 @@ class MainWindow(QMainWindow):
 
     def _ensure_course_input_file(self, candidate: str) -> str:
         src = Path(candidate)
-        dest_dir = course_input_dir_path()
-        dest = dest_dir / src.name
+        dest = course_input_dir_path() / src.name
         try:
             if src.resolve() == dest.resolve():
                 return str(dest)
         except Exception:
             pass
-        dest_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            d_st = dest.stat()
+        except OSError:
+            d_st = None
+        if d_st is not None:
+            try:
+                # 同一檔案（大小寫不同的路徑、符號連結）或先前以 copy2 複製過的相同檔案：不必再複製
+                if os.path.samefile(src, dest):
+                    return str(dest)
+                s_st = src.stat()
+                if s_st.st_size == d_st.st_size and int(s_st.st_mtime) == int(d_st.st_mtime):
+                    return str(dest)
+            except OSError:
+                pass
+        ensure_course_input_dir()
         shutil.copy2(str(src), str(dest))
         return str(dest)
 
     def _first_excel_in_course_inputs(self, folder: Optional[Path]) -> Optional[str]:
         if not folder or not folder.exists():
             return None
+        # 單次掃描取檔名（casefold）最小者；每個檔名只 casefold 一次，不排序整個清單
+        best_key: Optional[str] = None
+        best_path: Optional[str] = None
         try:
-            entries = [
-                p
-                for p in folder.iterdir()
-                if p.is_file() and p.suffix.lower() in {".xls", ".xlsx"} and not p.name.startswith("~$")
-            ]
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if not _is_excel_file_name(entry.name) or not entry.is_file():
+                        continue
+                    key = entry.name.casefold()
+                    if best_key is None or key < best_key:
+                        best_key = key
+                        best_path = entry.path
         except Exception:
             return None
-        if not entries:
-            return None
-        entries.sort(key=lambda p: p.name.casefold())
-        return str(entries[0])
+        return best_path
 
     def on_open_excel(self) -> None:
         start_dir = os.fspath(course_input_dir_path())
@@ -855,52 +1057,108 @@ class MainWindow(QMainWindow):
 
     # ====== 資料索引 ======
     def _build_course_binary_index(self) -> None:
+        self._course_info_cache = {}
+        self._slots_cache.clear()
+        self._tt_build_cache.clear()
+        self._occ_mask_cache = None
+        self._last_fav_render_sig = None
+        self._credit_by_cid = {}
         if self.courses_df is None or self.courses_df.empty:
             self._cid_sorted = None
             self._name_sorted = None
             self._teacher_sorted = None
             self._credit_sorted = None
+            self._cid_str_sorted = None
             self._cid_arr = None
-            self._mask_lo_arr = None
-            self._mask_hi_arr = None
+            self._mask_arr = None
             self._tba_arr = None
             self._dept_arr = None
-            self._slots_by_cid = {}
-            return
-
-        cids = self.courses_df["_cid"].to_numpy(dtype=np.int64, copy=True)
-        order = np.argsort(cids, kind="mergesort")
-        self._cid_sorted = cids[order]
-        self._name_sorted = self.courses_df["中文課程名稱"].to_numpy(dtype=object, copy=False)[order]
-        self._teacher_sorted = self.courses_df["教師"].to_numpy(dtype=object, copy=False)[order]
-        self._credit_sorted = self.courses_df["學分"].to_numpy(dtype=float, copy=False)[order]
+            self._dept_code_arr = None
+            self._dept_code_of = {}
+            self._all_depts = set()
+            self._all_depts_sorted = []
+            self._cid_sorted_rows = None
+            self._slots_indptr = None
+            self._slots_values = None
+            self._text_index = {}
+            return
+
+        cids = self.courses_df["_cid"].to_numpy(dtype=np.int64, copy=False)
+        if cids.size < 2 or bool(np.all(cids[1:] >= cids[:-1])):
+            # 課程檔本身已依開課序號排序：直接取欄位視圖，省去 argsort 與各欄的 gather
+            order = None
+            self._cid_sorted_rows = np.arange(cids.size, dtype=np.intp)
+        else:
+            order = np.argsort(cids, kind="mergesort")
+            self._cid_sorted_rows = order
+
+        def _in_cid_order(arr: np.ndarray) -> np.ndarray:
+            return arr if order is None else arr[order]
+
+        self._cid_sorted = _in_cid_order(cids)
+        self._name_sorted = _in_cid_order(self.courses_df["中文課程名稱"].to_numpy(dtype=object, copy=False))
+        self._teacher_sorted = _in_cid_order(self.courses_df["教師"].to_numpy(dtype=object, copy=False))
+        # 缺學分（NaN）於載入時一次補 0，之後的查詢與加總都不必再處理 NaN
+        self._credit_sorted = _in_cid_order(np.nan_to_num(self.courses_df["學分"].to_numpy(dtype=float), nan=0.0))
+        # 反向建立，重複序號時保留排序後的第一筆（與 searchsorted 取到的位置一致）
+        self._credit_by_cid = dict(zip(self._cid_sorted[::-1].tolist(), self._credit_sorted[::-1].tolist()))
+        # 顯示用的四位數開課序號：載入時「開課序號」欄已是 format_cid4 的結果，直接依排序 gather
+        if "開課序號" in self.courses_df.columns:
+            self._cid_str_sorted = _in_cid_order(self.courses_df["開課序號"].to_numpy(dtype=object, copy=False))
+        else:
+            self._cid_str_sorted = np.array([format_cid4(c) for c in self._cid_sorted.tolist()], dtype=object)
 
         self._cid_arr = self.courses_df["_cid"].to_numpy(dtype=np.int64, copy=False)
-        self._mask_lo_arr = self.courses_df["_mask_lo"].to_numpy(dtype="uint64", copy=False)
-        self._mask_hi_arr = self.courses_df["_mask_hi"].to_numpy(dtype="uint64", copy=False)
+        self._mask_arr = np.column_stack(
+            (
+                self.courses_df["_mask_lo"].to_numpy(dtype="uint64", copy=False),
+                self.courses_df["_mask_hi"].to_numpy(dtype="uint64", copy=False),
+            )
+        )
         self._tba_arr = self.courses_df["_tba"].to_numpy(dtype=bool, copy=False)
         if "系所" in self.courses_df.columns:
             self._dept_arr = self.courses_df["系所"].to_numpy(dtype=object, copy=False)
+            # 系所整數編碼：等值篩選改為整數比較（缺值為 -1）
+            codes, uniques = lazy_pandas().factorize(self.courses_df["系所"], use_na_sentinel=True)
+            self._dept_code_arr = codes.astype(np.int32, copy=False)
+            self._dept_code_of = {str(d): i for i, d in enumerate(uniques.tolist())}
         else:
             self._dept_arr = None
-        self._slots_by_cid = {}
-        for cid, slots in zip(self.courses_df["_cid"].tolist(), self.courses_df["_slots_set"].tolist()):
-            try:
-                cid_i = int(cid)
-            except Exception:
-                continue
-            if isinstance(slots, set):
-                self._slots_by_cid[cid_i] = slots
+            self._dept_code_arr = None
+            self._dept_code_of = {}
+        # factorize 已取得相異系所（不含缺值），下拉選單與等值判斷直接沿用
+        self._all_depts = set(self._dept_code_of)
+        self._all_depts_sorted = sorted(self._all_depts)
+        self._slots_indptr, self._slots_values = mask_arrays_to_slot_csr(self._mask_arr)
+        self._text_index = {
+            col: SubstringIndex(self.courses_df[col].tolist())
+            for col in _TEXT_INDEX_COLUMNS
+            if col in self.courses_df.columns
+        }
 
     def _load_excel(self, path: str) -> None:
-        ensure_excel_readable(path)
-        df, sheet = load_courses_auto(path)
+        from app_excel import ensure_excel_readable, load_courses_auto
+
+        def _file_signature() -> Tuple[str, int, int]:
+            st = os.stat(path)
+            return (os.path.normcase(os.path.abspath(path)), st.st_mtime_ns, st.st_size)
+
+        if self.courses_df is not None and _file_signature() == self._index_signature:
+            # 檔案未變動：格式檢查、解析結果與索引皆與上次相同，只重新整理畫面
+            df, sheet = self.courses_df, self.course_sheet_name
+        else:
+            # 格式檢查可能就地修補 xlsx，簽章需在其後取得
+            ensure_excel_readable(path)
+            signature = _file_signature()
+            df, sheet = load_courses_auto(path)
+            self.courses_df = df
+            self._index_signature = None
+            self._build_course_binary_index()
+            self._index_signature = signature
 
         self.excel_path = path
-        self.courses_df = df
         self.course_sheet_name = sheet
-
-        self._build_course_binary_index()
+        self._last_search_key = None
 
         base_display = [c for c in df.columns if not str(c).startswith("_")]
         preferred = ["開課序號", "開課代碼", "中文課程名稱", "教師"]
@@ -913,24 +1171,18 @@ class MainWindow(QMainWindow):
         n = len(df)
         self.lbl_excel.setText(f"課程 Excel：{self.excel_path}（課程工作表：{self.course_sheet_name}；課程筆數：{n}）")
 
-        self.cb_dept.blockSignals(True)
-        self.cb_dept.clear()
-        self.cb_dept.addItem("(全部)")
-        if "系所" in df.columns:
-            self._all_depts = set(df["系所"].dropna().astype(str).unique().tolist())
-            for d in sorted(self._all_depts):
-                self.cb_dept.addItem(str(d))
-        else:
-            self._all_depts = set()
-        self.cb_dept.blockSignals(False)
+        with QSignalBlocker(self.cb_dept):
+            self.cb_dept.clear()
+            self.cb_dept.addItem("(全部)")
+            self.cb_dept.addItems(self._all_depts_sorted)
 
-        if self.cb_dept.completer() is not None:
-            self.cb_dept.completer().setModel(self.cb_dept.model())
+        self._sync_combo_completer(self.cb_dept)
 
         self._refresh_user_selector()
 
-        self.filtered_df = df.loc[:, self.display_columns]
-        self.model_results.set_df(self.filtered_df)
+        # 不複製顯示欄位的子表，由 model 依 display_columns 投影
+        self.filtered_df = df
+        self.model_results.set_df(self.filtered_df, columns=self.display_columns, row_cids=self._cid_arr)
         self.model_results.notify_favorites_changed()
         self.proxy_results.invalidate()
 
@@ -953,12 +1205,11 @@ class MainWindow(QMainWindow):
 
         cur_text = prefer_select or self.cb_users.currentText().strip()
 
-        self.cb_users.blockSignals(True)
-        self.cb_users.clear()
-        self.cb_users.addItem("(未選擇)")
-        for u in users:
-            self.cb_users.addItem(u)
-        self.cb_users.blockSignals(False)
+        with QSignalBlocker(self.cb_users):
+            self.cb_users.clear()
+            self.cb_users.addItem("(未選擇)")
+            for u in users:
+                self.cb_users.addItem(u)
 
         target = prefer_select or cur_text
         if target:
@@ -967,8 +1218,7 @@ class MainWindow(QMainWindow):
         else:
             self.cb_users.setCurrentIndex(0)
 
-        if self.cb_users.completer() is not None:
-            self.cb_users.completer().setModel(self.cb_users.model())
+        self._sync_combo_completer(self.cb_users)
 
     # ====== 時間選取（拖曳表格格子） ======
     def _calc_show_days(self) -> List[str]:
@@ -976,77 +1226,106 @@ class MainWindow(QMainWindow):
 
     def _rebuild_slot_masks(self) -> None:
         self.show_days = self._calc_show_days()
-        self._slot_mask_lo = []
-        self._slot_mask_hi = []
-        for d in self.show_days:
-            row_lo = []
-            row_hi = []
-            for p in PERIODS:
-                mlo, mhi = slot_to_mask(d, p)
-                row_lo.append(np.uint64(mlo))
-                row_hi.append(np.uint64(mhi))
-            self._slot_mask_lo.append(row_lo)
-            self._slot_mask_hi.append(row_hi)
+        self._days_len = len(self.show_days)
+        self._slot_mask_tbl = _slot_mask_table(tuple(self.show_days))
+        self._slot_mask_not_tbl = _slot_mask_not_table(tuple(self.show_days))
+        self._set_sel_mask(self._sel_mask)
+
+    def _set_sel_mask(self, mask: np.ndarray) -> None:
+        self._sel_mask = mask
+        self._sel_mask_not = ~mask
+        self._tt_sel_cells = (self._slot_mask_tbl & mask).any(axis=2)
 
     def _clear_saturday_selection_bits(self) -> None:
-        lo = np.uint64(self._sel_lo)
-        hi = np.uint64(self._sel_hi)
-        for p in PERIODS:
-            mlo, mhi = slot_to_mask("六", p)
-            lo &= (~np.uint64(mlo))
-            hi &= (~np.uint64(mhi))
-        self._sel_lo = np.uint64(lo)
-        self._sel_hi = np.uint64(hi)
+        self._set_sel_mask(self._sel_mask & ~_day_mask("六"))
 
     def tt_day_idx_from_col(self, col: int) -> Optional[int]:
-        if col < 0 or col >= len(self._tt_col_day_idx):
-            return None
-        di = self._tt_col_day_idx[col]
-        return int(di) if 0 <= di < len(self.show_days) else None
+        cols = self._tt_col_day
+        return cols[col] if 0 <= col < len(cols) else None
 
     def tt_is_time_selected(self, day_idx: int, row: int) -> bool:
-        if not (0 <= day_idx < len(self.show_days) and 0 <= row < len(PERIODS)):
+        if not (0 <= day_idx < self._days_len and 0 <= row < _N_PERIODS):
             return False
-        mlo = self._slot_mask_lo[day_idx][row]
-        mhi = self._slot_mask_hi[day_idx][row]
-        return (self._sel_lo & mlo) != 0 or (self._sel_hi & mhi) != 0
+        return bool(self._tt_sel_cells[day_idx, row])
 
     def tt_cell_locked(self, row: int, col: int) -> bool:
-        if row < 0 or col < 0:
-            return False
-        if not self._tt_locked_matrix:
-            return False
-        if row >= len(self._tt_locked_matrix):
-            return False
-        if col >= len(self._tt_locked_matrix[row]):
-            return False
-        return bool(self._tt_locked_matrix[row][col])
+        return (row, col) in self._tt_locked_cells
 
     def tt_cell_has_selector_box(self, row: int, col: int) -> bool:
-        di = self.tt_day_idx_from_col(col)
-        if di is None:
-            return False
-        first_col = self._tt_first_lane_col.get(di, None)
-        return first_col == col and 0 <= row < len(PERIODS)
+        has_box = self._tt_col_has_box
+        return 0 <= col < len(has_box) and has_box[col] and 0 <= row < _N_PERIODS
 
     def _rebuild_tt_first_lane_cols(self) -> None:
         self._tt_first_lane_col = {}
+        setd = self._tt_first_lane_col.setdefault
         for c, di in enumerate(self._tt_col_day_idx):
-            if di not in self._tt_first_lane_col:
-                self._tt_first_lane_col[int(di)] = c
+            setd(int(di), c)
+        # 每欄已驗證的星期索引（超出顯示範圍為 None）與是否為該天第一欄；繪製時直接以 tuple 索引
+        days_len = self._days_len
+        self._tt_col_day = tuple(int(di) if 0 <= di < days_len else None for di in self._tt_col_day_idx)
+        self._tt_col_has_box = tuple(
+            di is not None and self._tt_first_lane_col.get(di) == c for c, di in enumerate(self._tt_col_day)
+        )
 
     def schedule_search(self, delay_ms: int = 60) -> None:
         if self.courses_df is None:
             return
         delay_ms = int(max(0, delay_ms))
         if delay_ms == 0:
+            self._cancel_pending(PEND_SEARCH)
             self._do_search_now()
             return
-        self._search_timer.start(delay_ms)
+        self._schedule_pending(PEND_SEARCH, delay_ms)
+
+    def _on_filter_changed(self, *_args) -> None:
+        self.schedule_search(0)
+
+    def _on_text_filter_changed(self, *_args) -> None:
+        self.schedule_search(_SEARCH_DEBOUNCE_TEXT_MS)
+
+    def _on_full_text_filter_changed(self, *_args) -> None:
+        self.schedule_search(_SEARCH_DEBOUNCE_FULL_TEXT_MS)
+
+    def _on_dept_filter_changed(self, *_args) -> None:
+        self.schedule_search(_SEARCH_DEBOUNCE_DEPT_MS)
 
     def _do_search_now(self) -> None:
         self.on_search()
 
+    def _schedule_pending(self, kind: int, delay_ms: int) -> None:
+        due = time.monotonic() + delay_ms / 1000.0
+        self._pending_flags |= kind
+        self._pending_due[kind] = due
+        if not self._pending_timer.isActive() or due < self._pending_timer_due:
+            self._pending_timer_due = due
+            self._pending_timer.start(delay_ms)
+
+    def _cancel_pending(self, kind: int) -> None:
+        self._pending_flags &= ~kind
+        self._pending_due.pop(kind, None)
+        if not self._pending_flags:
+            self._pending_timer.stop()
+
+    def _drain_pending(self) -> None:
+        now = time.monotonic()
+        ready = 0
+        for kind, due in list(self._pending_due.items()):
+            if due <= now + 0.001:
+                ready |= kind
+                del self._pending_due[kind]
+        self._pending_flags &= ~ready
+
+        if self._pending_due:
+            # 期限被延後（持續輸入）的工作：以最早期限重新計時
+            due = min(self._pending_due.values())
+            self._pending_timer_due = due
+            self._pending_timer.start(max(0, int((due - now) * 1000.0 + 0.5)))
+
+        if ready & PEND_SEARCH:
+            self._do_search_now()
+        if ready & PEND_AUTOSAVE:
+            self._autosave_now()
+
     def eventFilter(self, watched, event):
         if watched is self.tbl_tt.viewport():
             et = event.type()
@@ -1066,15 +1345,15 @@ class MainWindow(QMainWindow):
                 self._tt_dragging = True
                 self._tt_drag_start_day = int(di)
                 self._tt_drag_start_row = int(r)
-                self._tt_drag_base_lo = np.uint64(self._sel_lo)
-                self._tt_drag_base_hi = np.uint64(self._sel_hi)
+                self._tt_drag_base_mask = self._sel_mask.copy()
                 initial_rect = (int(r), int(r), int(di), int(di))
                 self._tt_drag_initial_rect = initial_rect
                 self._tt_drag_last_rect = initial_rect
                 self._tt_drag_has_moved = False
 
+                before = self._sel_mask
                 self._apply_tt_drag_rect(int(r), int(r), int(di), int(di))
-                self.tbl_tt.viewport().update()
+                self._update_tt_selection_cells(before)
                 return True
 
             if et == QEvent.MouseMove and self._tt_dragging:
@@ -1103,12 +1382,13 @@ class MainWindow(QMainWindow):
                     return True
                 self._tt_drag_last_rect = rect
 
+                before = self._sel_mask
                 self._apply_tt_drag_rect(int(r0), int(r1), int(d0), int(d1))
                 if self._tt_drag_initial_rect is not None and rect != self._tt_drag_initial_rect:
                     self._tt_drag_has_moved = True
                 if self._tt_drag_has_moved:
-                    self.schedule_search(0)
-                self.tbl_tt.viewport().update()
+                    self.schedule_search(self._drag_search_delay_ms)
+                self._update_tt_selection_cells(before)
                 return True
 
             if et == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton and self._tt_dragging:
@@ -1117,8 +1397,7 @@ class MainWindow(QMainWindow):
                     and self._tt_drag_initial_rect is not None
                     and self._tt_drag_last_rect == self._tt_drag_initial_rect
                 ):
-                    self._sel_lo = np.uint64(self._tt_drag_base_lo)
-                    self._sel_hi = np.uint64(self._tt_drag_base_hi)
+                    self._set_sel_mask(self._tt_drag_base_mask.copy())
                     self.tbl_tt.viewport().update()
                 self._tt_dragging = False
                 self._tt_drag_state = None
@@ -1134,82 +1413,166 @@ class MainWindow(QMainWindow):
 
     def _apply_tt_drag_rect(self, r0: int, r1: int, d0: int, d1: int) -> None:
         state = bool(self._tt_drag_state)
-        lo = np.uint64(self._tt_drag_base_lo)
-        hi = np.uint64(self._tt_drag_base_hi)
-
-        r0 = max(0, min(len(PERIODS) - 1, r0))
-        r1 = max(0, min(len(PERIODS) - 1, r1))
-        d0 = max(0, min(len(self.show_days) - 1, d0))
-        d1 = max(0, min(len(self.show_days) - 1, d1))
-
-        for di in range(d0, d1 + 1):
-            for rr in range(r0, r1 + 1):
-                mlo = self._slot_mask_lo[di][rr]
-                mhi = self._slot_mask_hi[di][rr]
-                if state:
-                    lo |= mlo
-                    hi |= mhi
-                else:
-                    lo &= (~mlo)
-                    hi &= (~mhi)
+        sel = self._tt_drag_base_mask.copy()
 
-        self._sel_lo = np.uint64(lo)
-        self._sel_hi = np.uint64(hi)
+        r0 = max(0, min(_N_PERIODS - 1, r0))
+        r1 = max(0, min(_N_PERIODS - 1, r1))
+        d0 = max(0, min(self._days_len - 1, d0))
+        d1 = max(0, min(self._days_len - 1, d1))
+
+        # 矩形內所有格子的遮罩一次化簡後整體套用；清除時使用預先取反的表
+        if state:
+            block = self._slot_mask_tbl[d0 : d1 + 1, r0 : r1 + 1].reshape(-1, 2)
+            sel |= np.bitwise_or.reduce(block, axis=0)
+        else:
+            block = self._slot_mask_not_tbl[d0 : d1 + 1, r0 : r1 + 1].reshape(-1, 2)
+            sel &= np.bitwise_and.reduce(block, axis=0)
+
+        self._set_sel_mask(sel)
+
+    def _update_tt_selection_cells(self, before: np.ndarray) -> None:
+        """只重繪選取狀態有變動的勾選框格子；拖曳時每次移動通常只影響一兩列。"""
+        diff = before ^ self._sel_mask
+        if not diff.any():
+            return
+        changed = (self._slot_mask_tbl & diff).any(axis=2)
+        model = self.tbl_tt.model()
+        region = QRegion()
+        for di, row in zip(*np.nonzero(changed)):
+            col = self._tt_first_lane_col.get(int(di))
+            if col is None:
+                continue
+            region += self.tbl_tt.visualRect(model.index(int(row), col))
+        if region.isEmpty():
+            self.tbl_tt.viewport().update()
+        else:
+            self.tbl_tt.viewport().update(region)
 
     # ====== 其餘功能（查詢/最愛/課表刷新/儲存/歷史等） ======
     # 下面為保持完整功能，基本沿用你原本 main.py 的邏輯，只做必要搬移與少量調整。
 
     def _mark_favorites_dirty(self) -> None:
-        self._favorites_sorted_dirty = True
+        self._member_dirty |= _MEMBER_FAV
 
     def _mark_included_dirty(self) -> None:
-        self._included_sorted_dirty = True
+        self._member_dirty |= _MEMBER_INC
 
     def _mark_locked_dirty(self) -> None:
-        self._locked_sorted_dirty = True
+        self._member_dirty |= _MEMBER_LOCK
+
+    def _mark_fav_seq_dirty(self) -> None:
+        # fav_seq 有變動；下次自動存檔快照需重新取出序號陣列
+        self._save_seq_dirty = True
+
+    def _ensure_member_index(self) -> None:
+        if not self._member_dirty:
+            return
+        if self._member_dirty & (_MEMBER_INC | _MEMBER_LOCK):
+            self.included_ids |= self.locked_ids
+
+        # 三組集合串接後只排序一次；各 id 的所屬集合以位元 OR 回填
+        n_fav, n_inc, n_lock = len(self.favorites_ids), len(self.included_ids), len(self.locked_ids)
+        raw = np.fromiter(
+            itertools.chain(self.favorites_ids, self.included_ids, self.locked_ids),
+            dtype=np.int64,
+            count=n_fav + n_inc + n_lock,
+        )
+        bits = np.repeat(
+            np.array([_MEMBER_FAV, _MEMBER_INC, _MEMBER_LOCK], dtype=np.uint8),
+            [n_fav, n_inc, n_lock],
+        )
+        ids, inverse = np.unique(raw, return_inverse=True)
+        flags = np.zeros(ids.shape, dtype=np.uint8)
+        np.bitwise_or.at(flags, inverse, bits)
+
+        self._member_ids = ids
+        self._member_flags = flags
+        self._member_sorted = {}
+        self._member_dirty = 0
+
+    def _member_sync_one(self, cid: int) -> None:
+        """
+        單一 id 的所屬集合變動後，就地更新打包索引（插入/刪除一格或改旗標），不重建整個索引。
+        呼叫前集合需已維持「鎖定必在排課中」；索引本來就待重建時只標記 dirty。
+        """
+        x = int(cid)
+        flags = (
+            (_MEMBER_FAV if x in self.favorites_ids else 0)
+            | (_MEMBER_INC if x in self.included_ids else 0)
+            | (_MEMBER_LOCK if x in self.locked_ids else 0)
+        )
+        if self._member_dirty:
+            self._member_dirty = _MEMBER_ALL
+            return
+
+        ids = self._member_ids
+        found = sorted_index_of(ids, x)
+        present = found >= 0
+        pos = found if present else int(ids.searchsorted(x))
+        old = int(self._member_flags[pos]) if present else 0
+        if old == flags:
+            return
+        if not present:
+            self._member_ids = np.insert(ids, pos, x)
+            self._member_flags = np.insert(self._member_flags, pos, np.uint8(flags))
+        elif flags:
+            self._member_flags[pos] = flags
+        else:
+            self._member_ids = np.delete(ids, pos)
+            self._member_flags = np.delete(self._member_flags, pos)
+
+        changed = old ^ flags
+        for bit in (_MEMBER_FAV, _MEMBER_INC, _MEMBER_LOCK):
+            if changed & bit:
+                self._member_sorted.pop(bit, None)
+
+    def _member_sorted_ids(self, bit: int) -> np.ndarray:
+        self._ensure_member_index()
+        arr = self._member_sorted.get(bit)
+        if arr is None:
+            # 由旗標遮罩取出即為已排序，不需重新排序
+            arr = self._member_ids[(self._member_flags & bit) != 0]
+            self._member_sorted[bit] = arr
+        return arr
+
+    def _member_has(self, cid: int, bit: int) -> bool:
+        self._ensure_member_index()
+        p = sorted_index_of(self._member_ids, cid)
+        return p >= 0 and bool(self._member_flags.item(p) & bit)
+
+    def _member_flags_many(self, cids: Sequence[int]) -> np.ndarray:
+        """一次查詢多個 id 的成員旗標（依輸入順序回傳 uint8）；查詢先排序，searchsorted 沿單一方向前進。"""
+        self._ensure_member_index()
+        n = len(cids)
+        out = np.zeros(n, dtype=np.uint8)
+        ids = self._member_ids
+        if n == 0 or ids.size == 0:
+            return out
+        q = np.fromiter(cids, dtype=np.int64, count=n)
+        order = np.argsort(q, kind="stable")
+        qs = q[order]
+        pos = np.searchsorted(ids, qs, side="left")
+        np.minimum(pos, ids.size - 1, out=pos)
+        out[order] = np.where(ids[pos] == qs, self._member_flags[pos], 0)
+        return out
 
     def _get_favorites_sorted(self) -> np.ndarray:
-        if self._favorites_sorted_dirty:
-            self._favorites_sorted_cache = sorted_array_from_set_int(self.favorites_ids)
-            self._favorites_sorted_dirty = False
-        return self._favorites_sorted_cache
+        return self._member_sorted_ids(_MEMBER_FAV)
 
     def _get_included_sorted(self) -> np.ndarray:
-        if self._included_sorted_dirty:
-            self.included_ids |= self.locked_ids
-            self._included_sorted_cache = sorted_array_from_set_int(self.included_ids)
-            self._included_sorted_dirty = False
-        return self._included_sorted_cache
+        return self._member_sorted_ids(_MEMBER_INC)
 
     def _get_locked_sorted(self) -> np.ndarray:
-        if self._locked_sorted_dirty:
-            self._locked_sorted_cache = sorted_array_from_set_int(self.locked_ids)
-            self._locked_sorted_dirty = False
-        return self._locked_sorted_cache
+        return self._member_sorted_ids(_MEMBER_LOCK)
 
     def _favorites_has(self, cid: int) -> bool:
-        arr = self._get_favorites_sorted()
-        if arr.size == 0:
-            return False
-        x = np.int64(int(cid))
-        p = int(np.searchsorted(arr, x, side="left"))
-        return 0 <= p < arr.size and int(arr[p]) == int(x)
+        return self._member_has(cid, _MEMBER_FAV)
 
     def _included_has(self, cid: int) -> bool:
-        arr = self._get_included_sorted()
-        if arr.size == 0:
-            return False
-        x = np.int64(int(cid))
-        p = int(np.searchsorted(arr, x, side="left"))
-        return 0 <= p < arr.size and int(arr[p]) == int(x)
+        return self._member_has(cid, _MEMBER_INC)
 
     def _locked_has(self, cid: int) -> bool:
-        arr = self._get_locked_sorted()
-        if arr.size == 0:
-            return False
-        x = np.int64(int(cid))
-        p = int(np.searchsorted(arr, x, side="left"))
-        return 0 <= p < arr.size and int(arr[p]) == int(x)
+        return self._member_has(cid, _MEMBER_LOCK)
 
     def _sync_toggle_buttons(self, checked: bool, *buttons: Optional[QPushButton]) -> None:
         for btn in buttons:
@@ -1240,8 +1603,7 @@ class MainWindow(QMainWindow):
         self._refresh_timetable()
 
     def _timetable_min_row_height(self) -> int:
-        fm = QFontMetrics(self.tbl_tt.font())
-        line_h = max(1, int(fm.lineSpacing()))
+        line_h = max(1, int(font_metrics(self.tbl_tt.font()).lineSpacing()))
         return int(line_h * 2 + 8)
 
     def _apply_timetable_row_heights(self) -> None:
@@ -1296,36 +1658,21 @@ class MainWindow(QMainWindow):
         self._apply_timetable_row_heights()
 
     def on_clear_time_selection(self) -> None:
-        self._sel_lo = np.uint64(0)
-        self._sel_hi = np.uint64(0)
+        self._set_sel_mask(np.zeros(2, dtype=np.uint64))
         self.tbl_tt.viewport().update()
         self.schedule_search(0)
 
     def on_clear_all_conditions(self) -> None:
-        self._search_timer.stop()
-
-        blockers = []
-
-        def _blk(obj):
-            prev = obj.blockSignals(True)
-            blockers.append((obj, prev))
-
-        _blk(self.ed_serial)
-        _blk(self.ed_course_code)
-        _blk(self.ed_cname)
-        _blk(self.ed_teacher)
-        _blk(self.ed_full)
-        _blk(self.cb_dept)
-        _blk(self.cb_match_mode)
-        _blk(self.ck_gened)
-        _blk(self.ck_sport)
-        _blk(self.ck_teaching)
-        _blk(self.ck_not_full)
-        _blk(self.ck_exclude_conflict)
-        _blk(self.ck_exclude_selected)
-        _blk(self.ck_show_tba)
-        _blk(self.cb_gened_core)
+        self._cancel_pending(PEND_SEARCH)
+
+        with ExitStack() as stack:
+            for w in self._clear_all_widgets:
+                stack.enter_context(QSignalBlocker(w))
+            self._reset_condition_widgets()
 
+        self.on_clear_time_selection()
+
+    def _reset_condition_widgets(self) -> None:
         self.ed_serial.clear()
         self.ed_course_code.clear()
         self.ed_cname.clear()
@@ -1349,11 +1696,6 @@ class MainWindow(QMainWindow):
         self.cb_gened_core.setCurrentText("所有通識")
         self.stk_gened_core.setCurrentIndex(0)
 
-        for obj, prev in blockers:
-            obj.blockSignals(prev)
-
-        self.on_clear_time_selection()
-
     def on_special_option_toggled(self, checked: bool) -> None:
         sender = self.sender()
         if not isinstance(sender, QCheckBox):
@@ -1370,9 +1712,8 @@ class MainWindow(QMainWindow):
                 others.append(self.ck_teaching)
 
             for ck in others:
-                ck.blockSignals(True)
-                ck.setChecked(False)
-                ck.blockSignals(False)
+                with QSignalBlocker(ck):
+                    ck.setChecked(False)
 
         self.stk_gened_core.setCurrentIndex(1 if self.ck_gened.isChecked() else 0)
         self.schedule_search(0)
@@ -1409,33 +1750,47 @@ class MainWindow(QMainWindow):
         self.included_ids.update((set(inc) & set(fav)) | set(self.locked_ids))
 
         self.fav_seq.clear()
+        seq_max = 0
         if seq:
             for cid in self.favorites_ids:
                 if int(cid) in seq:
-                    self.fav_seq[int(cid)] = int(seq[int(cid)])
+                    v = int(seq[int(cid)])
+                    self.fav_seq[int(cid)] = v
+                    if v > seq_max:
+                        seq_max = v
 
         if len(self.fav_seq) != len(self.favorites_ids):
             missing = [int(cid) for cid in self.favorites_ids if int(cid) not in self.fav_seq]
             missing.sort()
-            start = 1
-            if self.fav_seq:
-                start = max(self.fav_seq.values()) + 1
             for cid in missing:
-                self.fav_seq[cid] = start
-                start += 1
+                seq_max += 1
+                self.fav_seq[cid] = seq_max
 
-        self._fav_seq_next = (max(self.fav_seq.values()) + 1) if self.fav_seq else 1
+        self._fav_seq_next = seq_max + 1
+        self._mark_fav_seq_dirty()
         self._mark_favorites_dirty()
         self._mark_included_dirty()
         self._mark_locked_dirty()
-        self._fav_sort_section = self.FAV_COL_RANK
-        self._fav_sort_order = Qt.AscendingOrder
+        self._set_fav_sort_state(self.FAV_COL_RANK, Qt.AscendingOrder)
 
     def _ensure_seq_for_new_fav(self, cid: int) -> None:
         cid_i = int(cid)
         if cid_i not in self.fav_seq:
             self.fav_seq[cid_i] = int(self._fav_seq_next)
             self._fav_seq_next += 1
+            self._mark_fav_seq_dirty()
+
+    def _discard_fav_seq(self, cids: Iterable[int]) -> None:
+        """移除序號並維護 _fav_seq_next（= 最大序號 + 1）；只有移除到目前最大值時才重新掃描。"""
+        rescan = False
+        top = self._fav_seq_next - 1
+        pop = self.fav_seq.pop
+        self._mark_fav_seq_dirty()
+        for cid in cids:
+            if pop(int(cid), None) == top:
+                rescan = True
+        if rescan:
+            self._fav_seq_next = max(self.fav_seq.values(), default=0) + 1
 
     def on_login(self) -> None:
         if self.courses_df is None:
@@ -1485,11 +1840,11 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "建立使用者檔案失敗", f"無法建立本次登入檔案：\n{self.session_file_path}\n\n錯誤：{e}")
             self.session_file_path = ""
             return
+        self._on_direct_session_save()
 
         self._refresh_user_selector(prefer_select=self.username)
-        self.ed_new_user.blockSignals(True)
-        self.ed_new_user.clear()
-        self.ed_new_user.blockSignals(False)
+        with QSignalBlocker(self.ed_new_user):
+            self.ed_new_user.clear()
 
         self._session_fav_backup = None
         self._session_inc_backup = None
@@ -1527,291 +1882,173 @@ class MainWindow(QMainWindow):
         self.lbl_user_file.setText(msg)
 
     def _compress_join_order_map(self) -> Dict[int, int]:
-        items = []
-        for cid in self.favorites_ids:
-            cid_i = int(cid)
-            seq = int(self.fav_seq.get(cid_i, 10**12))
-            items.append((seq, cid_i))
-        items.sort()
-        total_items = len(items)
-
-        out: Dict[int, int] = {}
-        k = 1
-        for _seq, cid in items:
-            out[int(cid)] = k
-            k += 1
-        return out
+        order = self._favorite_order_list()
+        return dict(zip(order, range(1, len(order) + 1)))
+
+    def _cid_text_by_id(self, cid: int) -> str:
+        return self._lookup_by_ids([cid])[0][0]
 
     def _course_name_by_id(self, cid: int) -> str:
-        if self._cid_sorted is None or self._name_sorted is None:
-            return ""
-        x = np.int64(int(cid))
-        pos = int(np.searchsorted(self._cid_sorted, x, side="left"))
-        if 0 <= pos < self._cid_sorted.size and int(self._cid_sorted[pos]) == int(x):
-            return str(self._name_sorted[pos] or "").strip()
-        return ""
+        return self._lookup_by_ids([cid])[0][1]
 
     def _teacher_by_id(self, cid: int) -> str:
-        if self._cid_sorted is None or self._teacher_sorted is None:
-            return ""
-        x = np.int64(int(cid))
-        pos = int(np.searchsorted(self._cid_sorted, x, side="left"))
-        if 0 <= pos < self._cid_sorted.size and int(self._cid_sorted[pos]) == int(x):
-            return str(self._teacher_sorted[pos] or "").strip()
-        return ""
+        return self._lookup_by_ids([cid])[0][2]
 
     def _credit_by_id(self, cid: int) -> float:
-        if self._cid_sorted is None or self._credit_sorted is None:
-            return 0.0
-        x = np.int64(int(cid))
-        pos = int(np.searchsorted(self._cid_sorted, x, side="left"))
-        if 0 <= pos < self._cid_sorted.size and int(self._cid_sorted[pos]) == int(x):
-            v = self._credit_sorted[pos]
-            try:
-                if np.isnan(v):
-                    return 0.0
-            except Exception:
-                pass
-            try:
-                return float(v)
-            except Exception:
-                return 0.0
-        return 0.0
+        return self._lookup_by_ids([cid])[0][3]
+
+    def _lookup_by_ids(self, cids: Sequence[int]) -> List[Tuple[str, str, str, float]]:
+        """
+        多門課的（序號文字, 課名, 教師, 學分）。結果依 cid 快取（換課程檔時清空），
+        只有尚未查過的 id 才走一次 searchsorted。
+        """
+        cache = self._course_info_cache
+        missing = [c for c in dict.fromkeys(int(c) for c in cids) if c not in cache]
+        if missing:
+            cache.update(zip(missing, self._lookup_by_ids_uncached(missing)))
+        return [cache[int(c)] for c in cids]
+
+    def _lookup_by_ids_uncached(self, cids: Sequence[int]) -> List[Tuple[str, str, str, float]]:
+        """一次 searchsorted 取回多門課的（序號文字, 課名, 教師, 學分）。"""
+        n = len(cids)
+        if n == 0:
+            return []
+        if self._cid_sorted is None or self._cid_sorted.size == 0:
+            return [(format_cid4(c), "", "", 0.0) for c in cids]
+
+        q = np.fromiter(cids, dtype=np.int64, count=n)
+        sorted_ids = self._cid_sorted
+        pos = np.searchsorted(sorted_ids, q, side="left")
+        np.minimum(pos, sorted_ids.size - 1, out=pos)
+        hit = sorted_ids[pos] == q
+
+        cid_texts = self._cid_str_sorted[pos].tolist() if self._cid_str_sorted is not None else [None] * n
+        names = self._name_sorted[pos].tolist() if self._name_sorted is not None else [""] * n
+        teachers = self._teacher_sorted[pos].tolist() if self._teacher_sorted is not None else [""] * n
+        credits = self._credit_sorted[pos] if self._credit_sorted is not None else np.zeros(n, dtype=float)
+        credits = np.where(hit, credits, 0.0).tolist()
+
+        out: List[Tuple[str, str, str, float]] = []
+        for i, (cid, h) in enumerate(zip(cids, hit.tolist())):
+            if not h:
+                out.append((format_cid4(cid), "", "", 0.0))
+                continue
+            cid_text = cid_texts[i]
+            out.append(
+                (
+                    cid_text if cid_text is not None else format_cid4(cid),
+                    str(names[i] or "").strip(),
+                    str(teachers[i] or "").strip(),
+                    float(credits[i]),
+                )
+            )
+        return out
+
+    def _refresh_favorites_table(self, *, force: bool = False) -> None:
+        if not self.tbl_fav.isVisible():
+            self._fav_pending_refresh = True
+            return
+        self._fav_pending_refresh = False
+
+        # 列集合、各列旗標與優先度都沒變時，model 內容與上次相同，不必重建
+        join_rank = self._compress_join_order_map()
+        fav_sorted = self._get_favorites_sorted()
+        sig = (
+            fav_sorted.tobytes(),
+            self._member_flags_many(fav_sorted).tobytes(),
+            tuple(join_rank.get(c, 0) for c in fav_sorted.tolist()),
+        )
+        if not force and sig == self._last_fav_render_sig:
+            self._update_fav_drag_state()
+            return
+        self._last_fav_render_sig = sig
 
-    def _refresh_favorites_table(self) -> None:
         # Before clearing, save the vertical scroll position
         scrollbar = self.tbl_fav.verticalScrollBar()
         scroll_pos = scrollbar.value()
-        updates_enabled = self.tbl_fav.updatesEnabled()
 
         # Before clearing, save the current visual order of course IDs
+        # 依加入順序或開課序號排序時鍵值唯一，重建後的順序完全由排序決定，不必逐列讀回表格
         visual_order = []
-        for r in range(self.tbl_fav.rowCount()):
-            id_item = self.tbl_fav.item(r, self.FAV_COL_ID)
-            if id_item:
-                cid_data = id_item.data(Qt.UserRole)
+        if self._fav_sort_section not in (self.FAV_COL_RANK, self.FAV_COL_ID):
+            model = self.tbl_fav.model()
+            for r in range(model.rowCount()):
+                cid_data = model.index(r, self.FAV_COL_ID).data(Qt.UserRole)
                 if cid_data is not None:
                     visual_order.append(int(cid_data))
 
-        sorting_enabled = self.tbl_fav.isSortingEnabled()
-        self.tbl_fav.setSortingEnabled(False)
-        
-        was_drag_enabled = self.tbl_fav.is_drag_enabled()
-        self.tbl_fav.set_drag_enabled(False)
-
-        self.tbl_fav.setUpdatesEnabled(False)
-        self.tbl_fav.blockSignals(True)
-        self.tbl_fav.setRowCount(0)
-
-        join_rank = self._compress_join_order_map()
-
         # If visual order was captured, use it only when it matches current favorites.
         # Otherwise, fall back to sorting by rank from favorites_ids.
         fav_set = set(int(x) for x in self.favorites_ids)
         cids_to_render = [cid for cid in visual_order if cid in fav_set]
         if len(cids_to_render) != len(fav_set):
-            items = []
-            for cid in self.favorites_ids:
-                cid_i = int(cid)
-                seq = int(self.fav_seq.get(cid_i, 10**12))
-                items.append((seq, cid_i))
-            items.sort()
-            cids_to_render = [cid for _, cid in items]
-
-        move_controls_enabled = self._is_fav_join_sort_active() and not self.readonly_mode
-        total_items = len(cids_to_render)
-
-        for r_idx, cid_i in enumerate(cids_to_render):
-            r = self.tbl_fav.rowCount()
-            self.tbl_fav.insertRow(r)
-
-            handle_widget = self._build_move_widget(cid_i, r, total_items, enabled=move_controls_enabled)
-            self.tbl_fav.setCellWidget(r, self.FAV_COL_HANDLE, handle_widget)
-
-            is_lock = cid_i in self.locked_ids
-
-            in_course = True if is_lock else self._included_has(cid_i)
-            ck_item = IntSortItem("", 1 if in_course else 0)
-            if is_lock:
-                ck_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-                ck_item.setCheckState(Qt.Checked)
-            else:
-                ck_item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-                ck_item.setCheckState(Qt.Checked if in_course else Qt.Unchecked)
-            ck_item.setData(FAV_CID_ROLE, cid_i)
-            self.tbl_fav.setItem(r, self.FAV_COL_SCHEDULE, ck_item)
-
-            lock_item = IntSortItem("", 1 if is_lock else 0)
-            lock_item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            lock_item.setCheckState(Qt.Checked if is_lock else Qt.Unchecked)
-            lock_item.setData(FAV_CID_ROLE, cid_i)
-            self.tbl_fav.setItem(r, self.FAV_COL_LOCK, lock_item)
-
-            id_item = IntSortItem(format_cid4(cid_i), cid_i)
-            id_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            id_item.setData(Qt.UserRole, cid_i)
-            self.tbl_fav.setItem(r, self.FAV_COL_ID, id_item)
-
-            name_item = QTableWidgetItem(self._course_name_by_id(cid_i))
-            name_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            self.tbl_fav.setItem(r, self.FAV_COL_NAME, name_item)
-
-            t_item = QTableWidgetItem(self._teacher_by_id(cid_i))
-            t_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            self.tbl_fav.setItem(r, self.FAV_COL_TEACHER, t_item)
-
-            cr = self._credit_by_id(cid_i)
-            cr_text = "" if cr == 0.0 else (str(int(cr)) if abs(cr - round(cr)) < 1e-9 else f"{cr:g}")
-            cr_item = FloatSortItem(cr_text, cr)
-            cr_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            self.tbl_fav.setItem(r, self.FAV_COL_CREDIT, cr_item)
-
-            rank = int(join_rank.get(cid_i, 0))
-            rank_item = IntSortItem(str(rank) if rank > 0 else "", rank)
-            rank_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            rank_item.setData(FAV_CID_ROLE, cid_i)
-            self.tbl_fav.setItem(r, self.FAV_COL_RANK, rank_item)
-
-            if is_lock:
-                self.tbl_fav.setCellWidget(r, self.FAV_COL_DELETE, QWidget())
-            else:
-                btn = QPushButton("×")
-                btn.setProperty("cid", cid_i)
-                btn.setFixedWidth(32)
-                btn.setToolTip("刪除此最愛")
-                btn.clicked.connect(self.on_delete_favorite_button_clicked)
-                btn.setEnabled(not self.readonly_mode)
-                self.tbl_fav.setCellWidget(r, self.FAV_COL_DELETE, btn)
-
-        self.tbl_fav.blockSignals(False)
-        self.tbl_fav.setUpdatesEnabled(updates_enabled)
-
-        if was_drag_enabled:
-            self.tbl_fav.set_drag_enabled(True)
+            cids_to_render = self._favorite_order_list()
+
+        # 整批替換 model 的各欄資料；proxy 依目前排序欄重新排序（同鍵值保留 cids_to_render 的順序）
+        flags = self._member_flags_many(cids_to_render).tolist()
+        inc_bits = _MEMBER_INC | _MEMBER_LOCK
+        get_rank = join_rank.get
+        with TableFreeze(self.tbl_fav, drag=True):
+            self.fav_model.reset_rows(
+                cids_to_render,
+                self._lookup_by_ids(cids_to_render),
+                [bool(f & inc_bits) for f in flags],
+                [bool(f & _MEMBER_LOCK) for f in flags],
+                [int(get_rank(c, 0)) for c in cids_to_render],
+            )
         self._update_fav_drag_state()
 
-        self.tbl_fav.setSortingEnabled(sorting_enabled)
-
         # Restore the scroll position
         scrollbar.setValue(scroll_pos)
 
     def _try_append_favorite_row(self, cid_i: int) -> bool:
         if getattr(self, "tbl_fav", None) is None:
             return False
+        if not self.tbl_fav.isVisible():
+            self._fav_pending_refresh = True
+            return True
         # If the table is out of sync, fall back to full refresh.
-        if self.tbl_fav.rowCount() != (len(self.favorites_ids) - 1):
+        if self.fav_model.rowCount() != (len(self.favorites_ids) - 1):
             return False
 
-        sorting_enabled = self.tbl_fav.isSortingEnabled()
-        updates_enabled = self.tbl_fav.updatesEnabled()
-        self.tbl_fav.setUpdatesEnabled(False)
-        self.tbl_fav.blockSignals(True)
-
-        row = self.tbl_fav.rowCount()
-        self.tbl_fav.insertRow(row)
-
-        move_controls_enabled = self._is_fav_join_sort_active() and not self.readonly_mode
-        total_items = row + 1
-
-        handle_widget = self._build_move_widget(cid_i, row, total_items, enabled=move_controls_enabled)
-        self.tbl_fav.setCellWidget(row, self.FAV_COL_HANDLE, handle_widget)
-
+        # 單筆直接查集合即可，不需經過 packed 成員索引
         is_lock = cid_i in self.locked_ids
-        in_course = True if is_lock else self._included_has(cid_i)
-
-        ck_item = IntSortItem("", 1 if in_course else 0)
-        if is_lock:
-            ck_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            ck_item.setCheckState(Qt.Checked)
-        else:
-            ck_item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            ck_item.setCheckState(Qt.Checked if in_course else Qt.Unchecked)
-        ck_item.setData(FAV_CID_ROLE, cid_i)
-        self.tbl_fav.setItem(row, self.FAV_COL_SCHEDULE, ck_item)
-
-        lock_item = IntSortItem("", 1 if is_lock else 0)
-        lock_item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-        lock_item.setCheckState(Qt.Checked if is_lock else Qt.Unchecked)
-        lock_item.setData(FAV_CID_ROLE, cid_i)
-        self.tbl_fav.setItem(row, self.FAV_COL_LOCK, lock_item)
-
-        id_item = IntSortItem(format_cid4(cid_i), cid_i)
-        id_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-        id_item.setData(Qt.UserRole, cid_i)
-        self.tbl_fav.setItem(row, self.FAV_COL_ID, id_item)
-
-        name_item = QTableWidgetItem(self._course_name_by_id(cid_i))
-        name_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-        self.tbl_fav.setItem(row, self.FAV_COL_NAME, name_item)
-
-        t_item = QTableWidgetItem(self._teacher_by_id(cid_i))
-        t_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-        self.tbl_fav.setItem(row, self.FAV_COL_TEACHER, t_item)
-
-        cr = self._credit_by_id(cid_i)
-        cr_text = "" if cr == 0.0 else (str(int(cr)) if abs(cr - round(cr)) < 1e-9 else f"{cr:g}")
-        cr_item = FloatSortItem(cr_text, cr)
-        cr_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-        self.tbl_fav.setItem(row, self.FAV_COL_CREDIT, cr_item)
-
-        rank = len(self.favorites_ids)
-        rank_item = IntSortItem(str(rank), rank)
-        rank_item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-        rank_item.setData(FAV_CID_ROLE, cid_i)
-        self.tbl_fav.setItem(row, self.FAV_COL_RANK, rank_item)
-
-        if is_lock:
-            self.tbl_fav.setCellWidget(row, self.FAV_COL_DELETE, QWidget())
-        else:
-            btn = QPushButton("×")
-            btn.setProperty("cid", cid_i)
-            btn.setFixedWidth(32)
-            btn.setToolTip("刪除此最愛")
-            btn.clicked.connect(self.on_delete_favorite_button_clicked)
-            btn.setEnabled(not self.readonly_mode)
-            self.tbl_fav.setCellWidget(row, self.FAV_COL_DELETE, btn)
-
-        self.tbl_fav.blockSignals(False)
-        self.tbl_fav.setUpdatesEnabled(updates_enabled)
-
-        if sorting_enabled:
-            self.tbl_fav.sortItems(self._fav_sort_section, self._fav_sort_order)
-
-        self._update_fav_drag_state()
+        in_course = is_lock or cid_i in self.included_ids
+        info = self._lookup_by_ids([cid_i])[0]
+        # 新增列後 proxy 會以二分插入放到目前排序欄的正確位置，不需整表重排；
+        # 排序欄與唯讀狀態都沒變，拖曳狀態也不必重算
+        self.fav_model.append_row(cid_i, info, in_course, is_lock, len(self.favorites_ids))
+        self._last_fav_render_sig = None
         return True
 
+    def _set_fav_sort_state(self, section: int, order: Qt.SortOrder) -> None:
+        self._fav_sort_section = section
+        self._fav_sort_order = order
+        self._fav_join_sort_active = section == self.FAV_COL_RANK and order == Qt.AscendingOrder
+
     def _is_fav_join_sort_active(self) -> bool:
-        return self._fav_sort_section == self.FAV_COL_RANK and self._fav_sort_order == Qt.AscendingOrder
+        return self._fav_join_sort_active
 
     def _update_fav_drag_state(self) -> None:
         enabled = self._is_fav_join_sort_active() and not self.readonly_mode
         self.tbl_fav.set_drag_enabled(enabled)
+        self.fav_handle_delegate.tooltip = (
+            "按住並拖曳此欄位以調整優先度" if enabled else "切換至加入順序並解除唯讀後才能調整優先度"
+        )
 
     def _on_fav_sort_changed(self, section: int, order: Qt.SortOrder) -> None:
-        self._fav_sort_section = section
-        self._fav_sort_order = order
+        self._set_fav_sort_state(section, order)
         self._update_fav_drag_state()
 
-    def _build_move_widget(self, cid: int, row: int, total: int, *, enabled: bool = True) -> QWidget:
-        container = QWidget()
-        layout = QHBoxLayout(container)
-        layout.setContentsMargins(2, 0, 2, 0)
-        layout.setSpacing(0)
-        handle = QLabel("☰")
-        handle.setAlignment(Qt.AlignCenter)
-        layout.addWidget(handle)
-        tooltip = "按住並拖曳此欄位以調整優先度" if enabled else "切換至加入順序並解除唯讀後才能調整優先度"
-        container.setToolTip(tooltip)
-        return container
-
     def _favorite_order_list(self) -> List[int]:
-        order: List[Tuple[int, int]] = []
-        for cid in self.favorites_ids:
-            cid_i = int(cid)
-            seq = int(self.fav_seq.get(cid_i, 10**12))
-            order.append((seq, cid_i))
-        order.sort()
-        return [cid for _seq, cid in order]
+        """依加入順序（fav_seq，無序號者排最後、同序號再依開課序號）排列的最愛 id。"""
+        fav = self._get_favorites_sorted()
+        if fav.size == 0:
+            return []
+        get_seq = self.fav_seq.get
+        seqs = np.fromiter((get_seq(c, 10**12) for c in fav.tolist()), dtype=np.int64, count=fav.size)
+        # fav 已依 id 排序，穩定排序 seq 即等同 (seq, id) 排序
+        return fav[np.argsort(seqs, kind="stable")].tolist()
 
     def _move_favorite(self, cid: int, direction: int) -> None:
         order = self._favorite_order_list()
@@ -1824,17 +2061,13 @@ class MainWindow(QMainWindow):
             return
         new_order = order.copy()
         new_order[idx], new_order[target] = new_order[target], new_order[idx]
-        for rank, cid_i in enumerate(new_order, start=1):
-            self.fav_seq[cid_i] = rank
-        self._fav_seq_next = len(new_order) + 1
 
-        self._mark_favorites_dirty()
-        self._mark_included_dirty()
-        self._mark_locked_dirty()
-        self._fav_sort_section = self.FAV_COL_RANK
-        self._fav_sort_order = Qt.AscendingOrder
+        self._set_fav_sort_state(self.FAV_COL_RANK, Qt.AscendingOrder)
 
-        self._refresh_favorites_table()
+        if not self._apply_fav_order(new_order):
+            self._refresh_favorites_table()
+        else:
+            self._update_fav_drag_state()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
         self.proxy_results.invalidate()
@@ -1842,44 +2075,69 @@ class MainWindow(QMainWindow):
         self.schedule_search(0)
 
     def _sync_fav_seq_from_view(self) -> List[int]:
+        model = self.tbl_fav.model()
+        index = model.index
+        col_id = self.FAV_COL_ID
+        role = Qt.UserRole
         order: List[int] = []
-        self.tbl_fav.blockSignals(True)
-        seq = 1
-        for row in range(self.tbl_fav.rowCount()):
-            id_item = self.tbl_fav.item(row, self.FAV_COL_ID)
-            if id_item is None:
-                continue
-            cid_data = id_item.data(Qt.UserRole)
+        append = order.append
+        for row in range(model.rowCount()):
+            cid_data = index(row, col_id).data(role)
             if cid_data is None:
                 continue
             try:
-                cid_i = int(cid_data)
+                append(int(cid_data))
             except Exception:
                 continue
-            order.append(cid_i)
-            self.fav_seq[cid_i] = seq
-            rank_item = self.tbl_fav.item(row, self.FAV_COL_RANK)
-            if rank_item is not None:
-                rank_item.setText(str(seq))
-                rank_item.setData(FAV_CID_ROLE, cid_i)
-            seq += 1
-        self._fav_seq_next = seq
-        self.tbl_fav.blockSignals(False)
+        self._apply_fav_order(order)
         return order
 
+    def _is_current_fav_order(self, order: List[int]) -> bool:
+        """
+        order（皆為最愛 id）是否與 _favorite_order_list() 相同；
+        只需確認涵蓋全部最愛且 (序號, id) 沿 order 嚴格遞增，遇到第一個逆序即結束，不必排序。
+        """
+        if len(order) != len(self.favorites_ids):
+            return False
+        get_seq = self.fav_seq.get
+        prev = None
+        for c in order:
+            key = (get_seq(c, 10**12), c)
+            if prev is not None and key <= prev:
+                return False
+            prev = key
+        return True
+
+    def _apply_fav_order(self, order: List[int]) -> bool:
+        """
+        依 order 重新編排 fav_seq（1..n），並就地更新 model 的優先度欄（單一 dataChanged，proxy 自行重新排序）。
+        model 與目前最愛不一致時回傳 False，由呼叫端改為整表重建。
+        """
+        rank_of = dict(zip(order, range(1, len(order) + 1)))
+        self.fav_seq.update(rank_of)
+        self._fav_seq_next = len(order) + 1
+        self._mark_fav_seq_dirty()
+        if (
+            self._fav_pending_refresh
+            or len(rank_of) != len(self.favorites_ids)
+            or self.fav_model.rowCount() != len(rank_of)
+        ):
+            return False
+        self.fav_model.set_ranks(rank_of)
+        self._last_fav_render_sig = None
+        return True
+
     def _apply_fav_default_column_widths_once(self) -> None:
         if self._fav_default_width_applied:
             return
         self._fav_default_width_applied = True
-        hh = self.tbl_fav.horizontalHeader()
-        fm = QFontMetrics(hh.font())
-        one_char = max(1, fm.horizontalAdvance("字"))
-        two_char = max(1, fm.horizontalAdvance("字字"))
-        three_char = max(1, fm.horizontalAdvance("字字字"))
-        four_char = max(1, fm.horizontalAdvance("字字字字"))
-        for c in range(self.tbl_fav.columnCount()):
-            it = self.tbl_fav.horizontalHeaderItem(c)
-            title = it.text() if it else ""
+        font = self.tbl_fav.horizontalHeader().font()
+        one_char = max(1, text_width(font, "字"))
+        two_char = max(1, text_width(font, "字字"))
+        three_char = max(1, text_width(font, "字字字"))
+        four_char = max(1, text_width(font, "字字字字"))
+        for c in range(self.fav_model.columnCount()):
+            title = self.fav_model.headerData(c, Qt.Horizontal) or ""
             if title == "拖曳排序":
                 w = three_char + 8
             elif title == "學分數":
@@ -1887,22 +2145,16 @@ class MainWindow(QMainWindow):
             elif title == "優先度":
                 w = four_char + 8
             elif title in ("課表", "鎖定", "開課序號", "中文課程名稱"):
-                w = fm.horizontalAdvance(title) + one_char + 18 - one_char
+                w = text_width(font, title) + one_char + 18 - one_char
                 w = max(w, 40)
             else:
-                w = fm.horizontalAdvance(title) + one_char + 18
+                w = text_width(font, title) + one_char + 18
                 w = max(w, 40)
             self.tbl_fav.setColumnWidth(c, int(w))
 
-    def on_delete_favorite_button_clicked(self) -> None:
+    def _delete_favorite(self, cid: int) -> None:
         if self.readonly_mode:
             return
-        btn = self.sender()
-        if btn is None:
-            return
-        cid = btn.property("cid")
-        if cid is None:
-            return
         cid_i = int(cid)
 
         if cid_i in self.locked_ids:
@@ -1911,12 +2163,9 @@ class MainWindow(QMainWindow):
         self.favorites_ids.discard(cid_i)
         self.included_ids.discard(cid_i)
         self.locked_ids.discard(cid_i)
-        self.fav_seq.pop(cid_i, None)
-        self._fav_seq_next = (max(self.fav_seq.values()) + 1) if self.fav_seq else 1
+        self._discard_fav_seq((cid_i,))
 
-        self._mark_favorites_dirty()
-        self._mark_included_dirty()
-        self._mark_locked_dirty()
+        self._member_sync_one(cid_i)
 
         self._refresh_favorites_table()
         self._refresh_timetable()
@@ -1926,48 +2175,37 @@ class MainWindow(QMainWindow):
         self.schedule_autosave(250)
         self.schedule_search(0)
 
-    def on_fav_cell_changed(self, row: int, col: int) -> None:
+    def on_fav_check_toggled(self, cid_i: int, col: int, checked: bool) -> None:
+        # model 已就地改變，下次重建不可沿用舊簽章
+        self._last_fav_render_sig = None
         if self.readonly_mode:
             return
 
         if col not in (self.FAV_COL_SCHEDULE, self.FAV_COL_LOCK):
             return
 
-        item = self.tbl_fav.item(row, col)
-        if not item:
-            return
-
-        cid = item.data(FAV_CID_ROLE)
-        if cid is None:
-            return
-        cid_i = int(cid)
-
         if not self._favorites_has(cid_i):
             return
 
         if col == self.FAV_COL_SCHEDULE:
             if cid_i in self.locked_ids:
-                self.tbl_fav.blockSignals(True)
-                item.setCheckState(Qt.Checked)
-                self.tbl_fav.blockSignals(False)
                 return
 
-            if item.checkState() == Qt.Checked:
+            if checked:
                 self.included_ids.add(cid_i)
             else:
                 self.included_ids.discard(cid_i)
-            self._mark_included_dirty()
 
         elif col == self.FAV_COL_LOCK:
-            if item.checkState() == Qt.Checked:
+            if checked:
                 self.locked_ids.add(cid_i)
                 self.included_ids.add(cid_i)
-                self._mark_included_dirty()
             else:
                 self.locked_ids.discard(cid_i)
-            self._mark_locked_dirty()
 
-        self._refresh_favorites_table()
+        self._member_sync_one(cid_i)
+
+        # model 已更新該列的勾選狀態（proxy 需要時會自行重新排序），不必重建表格
         self._refresh_timetable()
 
         self.schedule_autosave(250)
@@ -1980,13 +2218,16 @@ class MainWindow(QMainWindow):
         if column not in (self.FAV_COL_SCHEDULE, self.FAV_COL_LOCK):
             return
             
-        changed = False
+        # 先讀出各列勾選狀態分成兩組，再以集合運算一次套用
+        on_cids: Set[int] = set()
+        off_cids: Set[int] = set()
+        model = self.tbl_fav.model()
         for row in affected_rows:
-            item = self.tbl_fav.item(row, column)
-            if not item:
+            idx = model.index(row, column)
+            if not idx.isValid():
                 continue
 
-            cid_data = item.data(FAV_CID_ROLE)
+            cid_data = idx.data(FAV_CID_ROLE)
             if cid_data is None:
                 continue
             
@@ -1994,30 +2235,26 @@ class MainWindow(QMainWindow):
             if not self._favorites_has(cid_i):
                 continue
             
-            is_checked = item.checkState() == Qt.Checked
-            changed = True
+            if idx.data(Qt.CheckStateRole) == Qt.Checked:
+                on_cids.add(cid_i)
+            else:
+                off_cids.add(cid_i)
 
-            if column == self.FAV_COL_SCHEDULE:
-                if is_checked:
-                    self.included_ids.add(cid_i)
-                else:
-                    # Do not uncheck if it's locked
-                    if cid_i not in self.locked_ids:
-                        self.included_ids.discard(cid_i)
-
-            elif column == self.FAV_COL_LOCK:
-                if is_checked:
-                    self.locked_ids.add(cid_i)
-                    self.included_ids.add(cid_i) # Locking also includes it in schedule
-                else:
-                    self.locked_ids.discard(cid_i)
+        changed = bool(on_cids or off_cids)
+        if column == self.FAV_COL_SCHEDULE:
+            self.included_ids |= on_cids
+            # Do not uncheck if it's locked
+            self.included_ids -= off_cids - self.locked_ids
+        else:
+            self.locked_ids |= on_cids
+            self.included_ids |= on_cids  # Locking also includes it in schedule
+            self.locked_ids -= off_cids
 
         if changed:
             self._mark_included_dirty()
             self._mark_locked_dirty()
             
-            # Refresh everything once after all changes
-            self._refresh_favorites_table()
+            # 勾選狀態已在 model 中，不必重建整張表
             self._refresh_timetable()
             self.schedule_autosave(250)
             self.schedule_search(0)
@@ -2042,34 +2279,21 @@ class MainWindow(QMainWindow):
             return
         
         # 檢查新順序是否與當前順序不同（如果相同則表示沒有移動）
-        current_order = self._favorite_order_list()
-        if valid_order == current_order:
+        if self._is_current_fav_order(valid_order):
             # 順序未改變，不進行任何操作
             return
         
-        # 防止表格刷新時拖曳被打斷：先暫時禁用拖曳
-        was_drag_enabled = self.tbl_fav.is_drag_enabled()
-        self.tbl_fav.set_drag_enabled(False)
-        
-        try:
-            seq = 1
-            for cid_i in valid_order:
-                self.fav_seq[cid_i] = seq
-                seq += 1
-            self._fav_seq_next = seq
-            self._mark_favorites_dirty()
-            self._fav_sort_section = self.FAV_COL_RANK
-            self._fav_sort_order = Qt.AscendingOrder
+        # 防止表格刷新時拖曳被打斷：先暫時禁用拖曳，離開時恢復
+        with TableFreeze(self.tbl_fav, signals=False, drag=True):
+            self._set_fav_sort_state(self.FAV_COL_RANK, Qt.AscendingOrder)
             
-            self._refresh_favorites_table()
+            # 只有優先度改變：就地更新優先度欄即可，不必重建整張表
+            if not self._apply_fav_order(valid_order):
+                self._refresh_favorites_table()
             self.model_results.notify_favorites_changed()
             self.proxy_results.invalidate()
             self.schedule_autosave(250)
             self.schedule_search(0)
-        finally:
-            # 恢復拖曳狀態
-            if was_drag_enabled:
-                self.tbl_fav.set_drag_enabled(True)
 
     def _on_fav_drop_completed(self, changed: bool) -> None:
         # If the drop did not change the underlying favorites order, the
@@ -2077,12 +2301,17 @@ class MainWindow(QMainWindow):
         # lightweight refresh to restore correct visuals.
         if not changed:
             # Only refresh the favorites table UI; this rebuild is cheap.
-            self._refresh_favorites_table()
+            self._refresh_favorites_table(force=True)
 
     def on_clear_out_of_schedule_favorites(self) -> None:
         if self.readonly_mode:
             return
-        missing = {cid for cid in self.favorites_ids if cid not in self.included_ids and cid not in self.locked_ids}
+        # 由打包索引的旗標欄一次篩出「在最愛、但不在課表也未鎖定」的 id
+        self._ensure_member_index()
+        flags = self._member_flags
+        missing = self._member_ids[
+            ((flags & _MEMBER_FAV) != 0) & ((flags & (_MEMBER_INC | _MEMBER_LOCK)) == 0)
+        ].tolist()
         if not missing:
             QMessageBox.information(self, "資訊", "目前沒有不在課表中的我的最愛。")
             return
@@ -2099,8 +2328,7 @@ class MainWindow(QMainWindow):
             self.favorites_ids.discard(cid)
             self.included_ids.discard(cid)
             self.locked_ids.discard(cid)
-            self.fav_seq.pop(cid, None)
-        self._fav_seq_next = (max(self.fav_seq.values()) + 1) if self.fav_seq else 1
+        self._discard_fav_seq(missing)
 
         self._mark_favorites_dirty()
         self._mark_included_dirty()
@@ -2132,6 +2360,7 @@ class MainWindow(QMainWindow):
         self.locked_ids.clear()
         self.fav_seq.clear()
         self._fav_seq_next = 1
+        self._mark_fav_seq_dirty()
 
         self._mark_favorites_dirty()
         self._mark_included_dirty()
@@ -2169,14 +2398,13 @@ class MainWindow(QMainWindow):
             self.favorites_ids.discard(cid_i)
             self.included_ids.discard(cid_i)
             self.locked_ids.discard(cid_i)
-            self.fav_seq.pop(cid_i, None)
-            self._fav_seq_next = (max(self.fav_seq.values()) + 1) if self.fav_seq else 1
+            self._discard_fav_seq((cid_i,))
 
-        self.included_ids |= self.locked_ids
+        if not self.locked_ids <= self.included_ids:
+            self.included_ids |= self.locked_ids
+            self._mark_included_dirty()
 
-        self._mark_favorites_dirty()
-        self._mark_included_dirty()
-        self._mark_locked_dirty()
+        self._member_sync_one(cid_i)
         if checked:
             if not self._try_append_favorite_row(cid_i):
                 self._refresh_favorites_table()
@@ -2197,19 +2425,38 @@ class MainWindow(QMainWindow):
         if self.courses_df is None:
             return
 
-        self.included_ids |= self.locked_ids
-        self._mark_included_dirty()
+        if not self.locked_ids <= self.included_ids:
+            self.included_ids |= self.locked_ids
+            self._mark_included_dirty()
 
         self._save_token += 1
         self._save_latest_token = self._save_token
-        self._save_pending_snapshot = (set(self.favorites_ids), set(self.included_ids), set(self.locked_ids), dict(self.fav_seq))
+        # 以打包成員索引的陣列副本當快照（連續記憶體複製），不再複製三個 set 與一個 dict
+        # 序號陣列只在 fav_seq 或成員 id 變動時重新取出；只改勾選旗標時沿用上一份快照的序號
+        self._ensure_member_index()
+        ids = self._member_ids.copy()
+        prev = self._save_pending_snapshot
+        if not self._save_seq_dirty and prev is not None and np.array_equal(prev[2], ids):
+            seqs = prev[4]
+        else:
+            get_seq = self.fav_seq.get
+            seqs = np.fromiter((get_seq(c, 10**12) for c in ids.tolist()), dtype=np.int64, count=ids.size)
+            self._save_seq_dirty = False
+        self._save_pending_snapshot = (
+            self.session_file_path,
+            id(self.courses_df),
+            ids,
+            self._member_flags.copy(),
+            seqs,
+        )
         self._save_pending = True
 
         delay_ms = int(max(0, delay_ms))
         if delay_ms == 0:
+            self._cancel_pending(PEND_AUTOSAVE)
             self._autosave_now()
             return
-        self._autosave_timer.start(delay_ms)
+        self._schedule_pending(PEND_AUTOSAVE, delay_ms)
 
     def _autosave_now(self) -> None:
         if self.readonly_mode:
@@ -2225,30 +2472,46 @@ class MainWindow(QMainWindow):
         if snapshot is None:
             return
 
-        fav, inc, lock, seq = snapshot
+        path, df_id, ids, flags, seqs = snapshot
         token = self._save_latest_token
 
         self._save_pending = False
+        sig = (path, df_id, ids.tobytes(), flags.tobytes(), seqs.tobytes())
+        if sig == self._last_saved_sig:
+            return
         self._save_inflight = True
+        self._save_inflight_sig = sig
 
-        included_sorted = sorted_array_from_set_int(inc)
-        locked_sorted = sorted_array_from_set_int(lock)
-
+        # ids 已排序，依旗標遮罩取出的子集仍維持排序
+        fav_mask = (flags & _MEMBER_FAV) != 0
         worker = SaveWorker(
             token,
             self.session_file_path,
             self.username,
-            fav,
-            included_sorted,
-            locked_sorted,
-            seq,
+            ids[fav_mask],
+            ids[(flags & _MEMBER_INC) != 0],
+            ids[(flags & _MEMBER_LOCK) != 0],
+            seqs[fav_mask],
             self.courses_df,
         )
         worker.finished.connect(self._on_save_finished)
         self.threadpool.start(worker)
 
+    def _on_direct_session_save(self) -> None:
+        """
+        繞過自動存檔直接寫入 session 檔後呼叫：作廢已存簽章（含進行中 worker 的簽章），
+        之後的自動存檔不會因內容與舊簽章相同而略過。
+        """
+        self._last_saved_sig = None
+        self._save_inflight_sig = None
+        if self._save_inflight:
+            # 進行中的 worker 可能在直接寫入之後才寫完舊內容；完成後以目前狀態再存一次
+            self.schedule_autosave(0)
+
     def _on_save_finished(self, token: int, ok: bool, msg: str) -> None:
         self._save_inflight = False
+        if ok:
+            self._last_saved_sig = self._save_inflight_sig
         if self._save_pending:
             QTimer.singleShot(0, self._autosave_now)
         if not ok:
@@ -2260,65 +2523,64 @@ class MainWindow(QMainWindow):
     def _refresh_history_list(self) -> None:
         if self._history_mode == "best":
             return
-        self.tbl_history.blockSignals(True)
-        self.tbl_history.setRowCount(0)
-
-        if not self.user_dir_path:
-            self.tbl_history.blockSignals(False)
+        # 歷史面板收起時不掃描資料夾；_enter_history_panel 開啟面板時會重新整理
+        if not self.gb_history.isVisibleTo(self):
             return
+        with TableFreeze(self.tbl_history):
+            self.tbl_history.setRowCount(0)
 
-        cache = load_best_schedule_cache(self.user_dir_path)
-        best_names = {os.path.basename(f) for f in cache.get("files", []) if f} if cache else set()
-        current_best_names = {os.path.basename(p) for p in self._best_files if p}
-        session_abs = os.path.abspath(self.session_file_path) if self.session_file_path else None
+            if not self.user_dir_path:
+                return
 
-        files = list_user_history_files(self.user_dir_path)
-        for p in files:
-            if session_abs and os.path.abspath(p) == session_abs:
-                continue
-            name = os.path.basename(p)
-            if name in best_names or name in current_best_names:
-                continue
-            r = self.tbl_history.rowCount()
-            self.tbl_history.insertRow(r)
+            cache = load_best_schedule_cache(self.user_dir_path)
+            best_names = {os.path.basename(f) for f in cache.get("files", []) if f} if cache else set()
+            current_best_names = {os.path.basename(p) for p in self._best_files if p}
+            session_abs = os.path.abspath(self.session_file_path) if self.session_file_path else None
 
-            fn = name
-            it0 = QTableWidgetItem(fn)
-            it0.setData(Qt.UserRole, p)
-            self.tbl_history.setItem(r, 0, it0)
+            files = list_user_history_files(self.user_dir_path)
+            for p in files:
+                if session_abs and os.path.abspath(p) == session_abs:
+                    continue
+                name = os.path.basename(p)
+                if name in best_names or name in current_best_names:
+                    continue
+                r = self.tbl_history.rowCount()
+                self.tbl_history.insertRow(r)
 
-            it1 = QTableWidgetItem(p)
-            self.tbl_history.setItem(r, 1, it1)
+                fn = name
+                it0 = QTableWidgetItem(fn)
+                it0.setData(Qt.UserRole, p)
+                self.tbl_history.setItem(r, 0, it0)
+
+                it1 = QTableWidgetItem(p)
+                self.tbl_history.setItem(r, 1, it1)
 
-        self.tbl_history.blockSignals(False)
         self._update_history_highlights()
         self._auto_select_history_first_row()
 
     def _refresh_best_schedule_list(self) -> None:
-        self.tbl_history.blockSignals(True)
-        self.tbl_history.setRowCount(0)
+        with TableFreeze(self.tbl_history):
+            self.tbl_history.setRowCount(0)
 
-        for p in self._best_files:
-            r = self.tbl_history.rowCount()
-            self.tbl_history.insertRow(r)
+            for p in self._best_files:
+                r = self.tbl_history.rowCount()
+                self.tbl_history.insertRow(r)
 
-            fn = os.path.basename(p)
-            it0 = QTableWidgetItem(fn)
-            it0.setData(Qt.UserRole, p)
-            self.tbl_history.setItem(r, 0, it0)
+                fn = os.path.basename(p)
+                it0 = QTableWidgetItem(fn)
+                it0.setData(Qt.UserRole, p)
+                self.tbl_history.setItem(r, 0, it0)
 
-            it1 = QTableWidgetItem(p)
-            self.tbl_history.setItem(r, 1, it1)
+                it1 = QTableWidgetItem(p)
+                self.tbl_history.setItem(r, 1, it1)
 
-        self.tbl_history.blockSignals(False)
         self._auto_select_history_first_row()
 
     def _auto_select_history_first_row(self) -> None:
         if self.tbl_history.rowCount() == 0 or self._history_mode is None:
             return
-        self.tbl_history.blockSignals(True)
-        self.tbl_history.setCurrentCell(0, 0)
-        self.tbl_history.blockSignals(False)
+        with QSignalBlocker(self.tbl_history):
+            self.tbl_history.setCurrentCell(0, 0)
         QTimer.singleShot(0, self.on_history_selected)
 
     def _capture_session_snapshot(self, *, force: bool = False) -> None:
@@ -2365,7 +2627,7 @@ class MainWindow(QMainWindow):
         for row in range(self.tbl_history.rowCount()):
             it0 = self.tbl_history.item(row, 0)
             it1 = self.tbl_history.item(row, 1)
-            brush = QBrush()
+            brush = self._empty_brush
             if target and it0 is not None:
                 path = it0.data(Qt.UserRole)
                 if path:
@@ -2601,16 +2863,15 @@ class MainWindow(QMainWindow):
 
         self._set_readonly(True)
         self._refresh_favorites_table()
-        self._refresh_timetable()
+        self._mark_tt_dirty()
         self.model_results.notify_favorites_changed()
         self.proxy_results.invalidate()
         self.schedule_search(0)
         self._update_history_highlights()
 
     def on_back_to_session(self) -> None:
-        self.tbl_history.blockSignals(True)
-        self.tbl_history.clearSelection()
-        self.tbl_history.blockSignals(False)
+        with QSignalBlocker(self.tbl_history):
+            self.tbl_history.clearSelection()
 
         restored = self._restore_session_state()
         self._close_history_panel()
@@ -2649,6 +2910,7 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "覆蓋失敗", f"覆蓋失敗：\n{e}")
             return
+        self._on_direct_session_save()
 
         self._session_fav_backup = set(self.favorites_ids)
         self._session_inc_backup = set(self.included_ids)
@@ -2658,7 +2920,7 @@ class MainWindow(QMainWindow):
         self._history_selected_file = ""
         self._set_readonly(False)
         self._refresh_favorites_table()
-        self._refresh_timetable()
+        self._mark_tt_dirty()
         self.model_results.notify_favorites_changed()
         self.proxy_results.invalidate()
         current_mode = self._history_mode
@@ -2669,57 +2931,62 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "完成", "已使用此規劃覆蓋本次登入檔案。")
 
     def _compute_total_credits(self, ids_sorted: np.ndarray) -> float:
-        if self.courses_df is None:
+        if self.courses_df is None or self._cid_sorted is None or self._credit_sorted is None:
             return 0.0
         if ids_sorted is None or ids_sorted.size == 0:
             return 0.0
 
-        if self._cid_sorted is not None and self._credit_sorted is not None:
-            ids = ids_sorted.astype(np.int64, copy=False)
-            pos = np.searchsorted(self._cid_sorted, ids)
-            if pos.size == 0:
-                return 0.0
-            valid = (pos >= 0) & (pos < self._cid_sorted.size)
-            if not np.any(valid):
-                return 0.0
-            pos = pos[valid]
-            ids = ids[valid]
-            match = self._cid_sorted[pos] == ids
-            if not np.any(match):
-                return 0.0
-            credits = self._credit_sorted[pos[match]]
-            total = float(np.nansum(credits)) if credits.size else 0.0
-            return total
-
-        sub = self.courses_df[self.courses_df["_cid"].isin(ids_sorted)][["學分"]]
-        if sub.empty:
+        # 課表通常只有十幾門課：查 dict 加總，不配置任何中間陣列
+        if ids_sorted.size <= 64:
+            get_credit = self._credit_by_cid.get
+            return float(sum(get_credit(c, 0.0) for c in ids_sorted.tolist()))
+
+        ids = ids_sorted.astype(np.int64, copy=False)
+        pos = np.searchsorted(self._cid_sorted, ids)
+        np.minimum(pos, self._cid_sorted.size - 1, out=pos)
+        match = self._cid_sorted[pos] == ids
+        if not np.any(match):
             return 0.0
-        s = pd.to_numeric(sub["學分"], errors="coerce").fillna(0).sum()
+        return float(self._credit_sorted[pos[match]].sum())
+
+    def _collect_slots_for_ids(self, ids: Optional[Set[int]]) -> Set[Tuple[str, str]]:
+        """ids 所佔節次的聯集；同一組 id 重複查詢時回傳快取的同一個 set（呼叫端不可修改）。"""
+        if self.courses_df is None or not ids:
+            return set()
         try:
-            return float(s)
+            key = frozenset(int(x) for x in ids)
         except Exception:
-            return 0.0
+            return set()
+        cache = self._slots_cache
+        slots = cache.get(key)
+        if slots is None:
+            slots = self._collect_slots_for_ids_uncached(key)
+            cache[key] = slots
+            if len(cache) > _SLOTS_CACHE_MAX:
+                cache.popitem(last=False)
+        return slots
 
-    def _collect_slots_for_ids(self, ids: Optional[Set[int]]) -> Set[Tuple[str, str]]:
+    def _collect_slots_for_ids_uncached(self, ids: Optional[Set[int]]) -> Set[Tuple[str, str]]:
         slots: Set[Tuple[str, str]] = set()
         if self.courses_df is None or not ids:
             return slots
-        if self._slots_by_cid:
-            for cid in ids:
-                try:
-                    cid_i = int(cid)
-                except Exception:
-                    continue
-                slots_set = self._slots_by_cid.get(cid_i)
-                if not slots_set:
-                    continue
-                for slot in slots_set:
-                    if not isinstance(slot, str) or "-" not in slot:
-                        continue
-                    day, per = slot.split("-", 1)
-                    if day and per:
-                        slots.add((day, per))
-            return slots
+        if self._slots_indptr is not None and self._cid_sorted is not None:
+            try:
+                ids_arr = np.fromiter((int(x) for x in ids), dtype=np.int64)
+            except Exception:
+                return slots
+            pos = np.searchsorted(self._cid_sorted, ids_arr)
+            inside = pos < self._cid_sorted.size
+            pos = pos[inside]
+            pos = pos[self._cid_sorted[pos] == ids_arr[inside]]
+            if pos.size == 0:
+                return slots
+            indptr = self._slots_indptr
+            values = self._slots_values
+            codes = np.unique(
+                np.concatenate([values[indptr[r] : indptr[r + 1]] for r in self._cid_sorted_rows[pos].tolist()])
+            )
+            return {slot_code_to_pair(c) for c in codes.tolist()}
 
         try:
             ids_list = [int(x) for x in ids]
@@ -2744,8 +3011,8 @@ class MainWindow(QMainWindow):
         self,
         widget: TimetableWidget,
         col_day_idx: List[int],
-        id_matrix: List[List[Optional[int]]],
-        locked_matrix: List[List[bool]],
+        id_matrix: np.ndarray,
+        locked_matrix: np.ndarray,
         *,
         diff_added_cids: Optional[Set[int]] = None,
         diff_removed_cells: Optional[Set[Tuple[int, int]]] = None,
@@ -2757,65 +3024,69 @@ class MainWindow(QMainWindow):
         if len(col_day_idx) != cols:
             return
 
-        for c in range(cols):
-            day_idx = col_day_idx[c]
-            base = self._day_bg_base[day_idx % len(self._day_bg_base)]
-            header_item = widget.horizontalHeaderItem(c)
-            if header_item is not None:
-                header_item.setBackground(QBrush(base))
-
-        black_bg = QBrush(QColor("#000000"))
-        white_fg = QBrush(QColor("#FFFFFF"))
-        added_brush = QBrush(QColor("#1B5E20"))
-        added_fg = QBrush(QColor("#FFFFFF"))
-        deleted_brush = QBrush(QColor("#B71C1C"))
+        # id / 鎖定矩陣對齊到 widget 大小（空格 id 為 -1）
+        ids = np.full((rows, cols), -1, dtype=np.int64)
+        locked = np.zeros((rows, cols), dtype=bool)
+        ids_in = np.asarray(id_matrix, dtype=np.int64).reshape(-1, cols) if np.size(id_matrix) else None
+        if ids_in is not None:
+            ids[: ids_in.shape[0]] = ids_in[:rows]
+        locked_in = np.asarray(locked_matrix, dtype=bool).reshape(-1, cols) if np.size(locked_matrix) else None
+        if locked_in is not None:
+            locked[: locked_in.shape[0]] = locked_in[:rows]
+
+        # 每格的樣式：0 底色、1 加深、2 鎖定（黑底白字）、3 新增（綠底白字）。
+        # 鎖定格必定已寫入課程文字，不需再讀回格子文字確認。
+        kind = np.zeros((rows, cols), dtype=np.int8)
+        kind[locked] = 2
+        if diff_added_cids:
+            added_arr = np.fromiter(diff_added_cids, dtype=np.int64, count=len(diff_added_cids))
+            kind[~locked & (ids >= 0) & np.isin(ids, added_arr)] = 3
+        eligible = (ids >= 0) & (kind == 0)
+
+        # 深淺交替：同一欄內，課程在「與上一格 id 不同」的一般格首次出現時依序編號，
+        # 編號為奇數者加深；首次編號之前的格子維持底色
+        prev = np.empty_like(ids)
+        prev[0] = -1
+        prev[1:] = ids[:-1]
+        events = eligible & (ids != prev)
+        row_idx = np.arange(rows)
+        for c in np.flatnonzero(events.any(axis=0)).tolist():
+            ev_rows = np.flatnonzero(events[:, c])
+            uniq, first = np.unique(ids[ev_rows, c], return_index=True)
+            order_rank = np.empty(uniq.size, dtype=np.int64)
+            order_rank[np.argsort(first, kind="stable")] = np.arange(uniq.size)
+            first_row = ev_rows[first]
+            el_rows = row_idx[eligible[:, c]]
+            pos = np.searchsorted(uniq, ids[el_rows, c])
+            np.minimum(pos, uniq.size - 1, out=pos)
+            hit = (uniq[pos] == ids[el_rows, c]) & (first_row[pos] <= el_rows)
+            dark = hit & (order_rank[pos] % 2 == 1)
+            kind[el_rows[dark], c] = 1
+
+        n_palette = len(self._day_bg_base)
+        day_brush = self._tt_day_brush
+        default_fg = self._tt_default_fg_brush
+        fg_of = (default_fg, default_fg, self._tt_locked_fg_brush, self._tt_added_fg_brush)
+        deleted_brush = self._tt_deleted_bg_brush
+        item_at = widget.item
+        kinds = kind.T.tolist()
 
         for c in range(cols):
-            day_idx = col_day_idx[c]
-            base = self._day_bg_base[day_idx % len(self._day_bg_base)]
-            darker = darken(base, self._block_dark_factor)
+            palette_idx = col_day_idx[c] % n_palette
+            base_brush = day_brush[(palette_idx, False)]
+            bg_of = (base_brush, day_brush[(palette_idx, True)], self._tt_locked_bg_brush, self._tt_added_bg_brush)
 
-            course_to_shade: Dict[int, int] = {}
-            next_shade = 0
-            prev_cid: Optional[int] = None
+            header_item = widget.horizontalHeaderItem(c)
+            if header_item is not None:
+                header_item.setBackground(base_brush)
 
-            for r in range(rows):
-                cid = id_matrix[r][c] if (r < len(id_matrix) and c < len(id_matrix[r])) else None
-                it = widget.item(r, c)
+            for r, k in enumerate(kinds[c]):
+                it = item_at(r, c)
                 if it is None:
                     it = QTableWidgetItem("")
                     widget.setItem(r, c, it)
-
-                locked = False
-                if locked_matrix and r < len(locked_matrix) and c < len(locked_matrix[r]):
-                    locked = bool(locked_matrix[r][c])
-
-                if locked and (it.text() or "").strip():
-                    it.setBackground(black_bg)
-                    it.setForeground(white_fg)
-                    prev_cid = cid
-                    continue
-
-                if diff_added_cids and cid is not None and cid in diff_added_cids:
-                    it.setBackground(added_brush)
-                    it.setForeground(added_fg)
-                    prev_cid = cid
-                    continue
-
-                it.setForeground(QBrush(QColor("#000000")))
-
-                if cid is None:
-                    it.setBackground(QBrush(base))
-                    prev_cid = None
-                    continue
-
-                if cid != prev_cid:
-                    if cid not in course_to_shade:
-                        course_to_shade[cid] = next_shade % 2
-                        next_shade += 1
-                shade = course_to_shade.get(cid, 0)
-                it.setBackground(QBrush(base if shade == 0 else darker))
-                prev_cid = cid
+                it.setBackground(bg_of[k])
+                it.setForeground(fg_of[k])
 
         if diff_removed_cells:
             for row, col in diff_removed_cells:
@@ -2824,6 +3095,28 @@ class MainWindow(QMainWindow):
                     if cell is not None:
                         cell.setBackground(deleted_brush)
 
+    def _cached_build_timetable(self, included_sorted: np.ndarray, locked_ids: Set[int]) -> Tuple[Any, ...]:
+        """
+        build_timetable_matrix_per_day_lanes_sorted 的結果快取（最多 _TT_BUILD_CACHE_MAX 筆，最久未用者先淘汰）。
+        結果只依輸入與課程資料而定，呼叫端不得修改回傳的矩陣。
+        """
+        key = (included_sorted.tobytes(), frozenset(locked_ids), tuple(self.show_days))
+        cache = self._tt_build_cache
+        hit = cache.get(key)
+        if hit is not None:
+            cache.move_to_end(key)
+            return hit
+        res = build_timetable_matrix_per_day_lanes_sorted(
+            self.courses_df,
+            included_sorted,
+            locked_ids,
+            self.show_days,
+        )
+        cache[key] = res
+        if len(cache) > _TT_BUILD_CACHE_MAX:
+            cache.popitem(last=False)
+        return res
+
     def _render_timetable(
         self,
         widget: TimetableWidget,
@@ -2834,91 +3127,89 @@ class MainWindow(QMainWindow):
         baseline_slots: Optional[Set[Tuple[str, str]]] = None,
         diff_added_cids: Optional[Set[int]] = None,
     ) -> List[str]:
-        matrix, conflicts, day_lanes, col_day_idx, id_matrix, locked_matrix = build_timetable_matrix_per_day_lanes_sorted(
-            self.courses_df,
-            included_sorted,
-            locked_ids,
-            self.show_days,
+        matrix, conflicts, day_lanes, col_day_idx, id_matrix, locked_matrix = self._cached_build_timetable(
+            included_sorted, locked_ids
         )
         cols = len(col_day_idx)
         if store_state:
             self._tt_col_day_idx = list(col_day_idx)
             self._rebuild_tt_first_lane_cols()
-            self._tt_locked_matrix = locked_matrix
+            lr, lc = np.nonzero(locked_matrix)
+            self._tt_locked_cells = frozenset(zip(lr.tolist(), lc.tolist()))
+
+        with TableFreeze(widget):
+            widget.setRowCount(len(PERIODS))
+            widget.setColumnCount(cols)
+
+            headers: List[str] = []
+            for d in self.show_days:
+                lanes = int(day_lanes.get(d, 1))
+                if lanes <= 1:
+                    headers.append(DAY_LABEL[d])
+                else:
+                    for k in range(1, lanes + 1):
+                        headers.append(f"{DAY_LABEL[d]} {k}")
 
-        widget.setRowCount(len(PERIODS))
-        widget.setColumnCount(cols)
+            widget.setHorizontalHeaderLabels(headers)
 
-        headers: List[str] = []
-        for d in self.show_days:
-            lanes = int(day_lanes.get(d, 1))
-            if lanes <= 1:
-                headers.append(DAY_LABEL[d])
+            if self.show_time:
+                vlabels = [f"{p}\n{PERIOD_TIME.get(p, '')}".rstrip() for p in PERIODS]
             else:
-                for k in range(1, lanes + 1):
-                    headers.append(f"{DAY_LABEL[d]} {k}")
-
-        widget.setHorizontalHeaderLabels(headers)
-
-        if self.show_time:
-            vlabels = [f"{p}\n{PERIOD_TIME.get(p, '')}".rstrip() for p in PERIODS]
-        else:
-            vlabels = PERIODS
-        widget.setVerticalHeaderLabels(vlabels)
-
-        slot_map: Set[Tuple[str, str]] = set()
-        day_map = {idx: self.show_days[idx] for idx in range(len(self.show_days))}
-        for c in range(cols):
-            day_idx = col_day_idx[c] if c < len(col_day_idx) else None
-            day_name = day_map.get(day_idx)
-            if day_name is None:
-                continue
+                vlabels = PERIODS
+            widget.setVerticalHeaderLabels(vlabels)
+
+            slot_map: Set[Tuple[str, str]] = set()
+            show_days = self.show_days
+            occ_r, occ_c = np.nonzero(id_matrix >= 0)
+            for r, c in zip(occ_r.tolist(), occ_c.tolist()):
+                day_idx = col_day_idx[c]
+                if 0 <= day_idx < len(show_days):
+                    slot_map.add((show_days[day_idx], PERIODS[r]))
+
+            # 旗標與對齊在迴圈外算好；整批 setItem 期間暫停重繪與訊號（TableFreeze）
+            noedit_flags = QTableWidgetItem("").flags() & ~Qt.ItemIsEditable
+            align = Qt.AlignLeft | Qt.AlignTop
+            set_item = widget.setItem
             for r in range(len(PERIODS)):
-                cid = id_matrix[r][c] if (r < len(id_matrix) and c < len(id_matrix[r])) else None
-                if cid is not None and 0 <= r < len(PERIODS):
-                    slot_map.add((day_name, PERIODS[r]))
-
-        for r in range(len(PERIODS)):
-            for c in range(cols):
-                it = QTableWidgetItem(matrix[r][c])
-                it.setFlags(it.flags() & ~Qt.ItemIsEditable)
-                it.setTextAlignment(Qt.AlignLeft | Qt.AlignTop)
-                widget.setItem(r, c, it)
-
-        deleted_cells: Optional[Set[Tuple[int, int]]] = None
-        if baseline_slots:
-            removed_slots = baseline_slots - slot_map
-            if removed_slots:
-                day_index = {day: idx for idx, day in enumerate(self.show_days)}
-                temp_cells: Set[Tuple[int, int]] = set()
-                for day, per in removed_slots:
-                    day_idx = day_index.get(day)
-                    if day_idx is None:
-                        continue
-                    try:
-                        row_idx = PERIODS.index(per)
-                    except ValueError:
-                        continue
-                    for c in range(cols):
-                        if c >= len(col_day_idx) or col_day_idx[c] != day_idx:
+                row_text = matrix[r]
+                for c in range(cols):
+                    it = QTableWidgetItem(row_text[c])
+                    it.setFlags(noedit_flags)
+                    it.setTextAlignment(align)
+                    set_item(r, c, it)
+
+            deleted_cells: Optional[Set[Tuple[int, int]]] = None
+            if baseline_slots:
+                removed_slots = baseline_slots - slot_map
+                if removed_slots:
+                    day_index = {day: idx for idx, day in enumerate(self.show_days)}
+                    temp_cells: Set[Tuple[int, int]] = set()
+                    for day, per in removed_slots:
+                        day_idx = day_index.get(day)
+                        if day_idx is None:
                             continue
-                        cell = widget.item(row_idx, c)
-                        if cell is None:
+                        try:
+                            row_idx = PERIODS.index(per)
+                        except ValueError:
                             continue
-                        if (cell.text() or "").strip():
-                            continue
-                        temp_cells.add((row_idx, c))
-                if temp_cells:
-                    deleted_cells = temp_cells
-
-        self._apply_timetable_background(
-            widget,
-            col_day_idx,
-            id_matrix,
-            locked_matrix,
-            diff_added_cids=diff_added_cids,
-            diff_removed_cells=deleted_cells,
-        )
+                        for c in range(cols):
+                            if c >= len(col_day_idx) or col_day_idx[c] != day_idx:
+                                continue
+                            # 格子文字即 matrix 內容，不必再向 widget 讀回
+                            if (matrix[row_idx][c] or "").strip():
+                                continue
+                            temp_cells.add((row_idx, c))
+                    if temp_cells:
+                        deleted_cells = temp_cells
+
+            self._apply_timetable_background(
+                widget,
+                col_day_idx,
+                id_matrix,
+                locked_matrix,
+                diff_added_cids=diff_added_cids,
+                diff_removed_cells=deleted_cells,
+            )
 
         if cols <= 12:
             widget.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
@@ -2972,12 +3263,26 @@ class MainWindow(QMainWindow):
         self._sync_timetable_font_size(self.tbl_tt)
         self._apply_timetable_row_heights()
 
+    def _mark_tt_dirty(self) -> None:
+        """標記課表需重繪，於下一輪事件迴圈統一重繪一次（含預覽課表）。"""
+        if self._tt_dirty:
+            return
+        self._tt_dirty = True
+        QTimer.singleShot(0, self._flush_tt)
+
+    def _flush_tt(self) -> None:
+        if self._tt_dirty:
+            self._refresh_timetable()
+
     def _refresh_timetable(self) -> None:
+        # 直接重繪已涵蓋尚未執行的延後重繪
+        self._tt_dirty = False
         if self.courses_df is None:
             return
 
-        self.included_ids |= self.locked_ids
-        self._mark_included_dirty()
+        if not self.locked_ids <= self.included_ids:
+            self.included_ids |= self.locked_ids
+            self._mark_included_dirty()
 
         inc_sorted = self._get_included_sorted()
 
@@ -3022,21 +3327,115 @@ class MainWindow(QMainWindow):
 
         self.tbl_tt.viewport().update()
 
+    def _dept_equals(self, dept: str) -> np.ndarray:
+        """系所等值篩選：有整數編碼時只做一次整數比較。"""
+        if self._dept_code_arr is not None:
+            code = self._dept_code_of.get(dept)
+            if code is None:
+                return np.zeros(self._dept_code_arr.shape[0], dtype=bool)
+            return self._dept_code_arr == code
+        if self._dept_arr is not None:
+            return self._dept_arr == dept
+        return (self.courses_df["系所"] == dept).to_numpy()
+
+    def _text_contains(self, col: str, token: str) -> np.ndarray:
+        ix = self._text_index.get(col)
+        if ix is not None:
+            return ix.contains(token)
+        return self.courses_df[col].str.contains(token, regex=False, na=False).to_numpy()
+
+    def _apply_text_filter(self, keep: np.ndarray, col: str, tokens: List[str]) -> None:
+        """就地將 keep 中不含全部 tokens 的列設為 False；存活列少時只比對這些列，不掃描整欄。"""
+        n = keep.size
+        idx = np.flatnonzero(keep)
+        if idx.size == 0:
+            return
+        ix = self._text_index.get(col)
+        if ix is None or idx.size >= (n >> 3):
+            keep &= self._text_contains_all(col, tokens)
+            return
+        for tok in tokens:
+            hit = ix.contains_rows(tok, idx)
+            idx = idx[hit]
+            if idx.size == 0:
+                break
+        keep[:] = False
+        keep[idx] = True
+
+    def _text_contains_all(self, col: str, tokens: List[str]) -> np.ndarray:
+        ix = self._text_index.get(col)
+        if ix is not None:
+            return ix.contains_all(tokens)
+        keep = np.ones(len(self.courses_df), dtype=bool)
+        for tok in tokens:
+            keep &= self._text_contains(col, tok)
+        return keep
+
+    def _occupied_mask(self, inc_sorted: np.ndarray) -> np.ndarray:
+        key = inc_sorted.tobytes()
+        cached = self._occ_mask_cache
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        occ = np.array(occupied_masks_sorted(self.courses_df, inc_sorted), dtype=np.uint64)
+        self._occ_mask_cache = (key, occ)
+        return occ
+
+    def _search_state_key(self) -> Tuple[Any, ...]:
+        """所有篩選輸入的快照；與上次查詢相同時可略過整輪篩選。"""
+        excl = self.ck_exclude_selected.isChecked()
+        conflict = self.ck_exclude_conflict.isChecked()
+        inc_key = self._get_included_sorted().tobytes() if (excl or conflict) else b""
+        return (
+            self.ed_serial.text(),
+            self.ed_course_code.text(),
+            self.ed_cname.text(),
+            self.ed_teacher.text(),
+            self.ed_full.text(),
+            self.cb_dept.currentText(),
+            self.cb_gened_core.currentText(),
+            self.cb_match_mode.currentIndex(),
+            self.ck_gened.isChecked(),
+            self.ck_sport.isChecked(),
+            self.ck_teaching.isChecked(),
+            self.ck_not_full.isChecked(),
+            excl,
+            conflict,
+            self.ck_show_tba.isChecked(),
+            self._sel_mask.tobytes(),
+            inc_key,
+        )
+
     def on_search(self) -> None:
         if self.courses_df is None:
             return
 
+        state_key = self._search_state_key()
+        if state_key == self._last_search_key:
+            return
+        self._last_search_key = state_key
+
         df = self.courses_df
         n = len(df)
-        mask = np.ones(n, dtype=bool)
+        keep = np.ones(n, dtype=bool)
+
+        cid_arr = self._cid_arr if self._cid_arr is not None else df["_cid"].to_numpy(dtype=np.int64, copy=False)
+        if self._mask_arr is not None:
+            mask_arr = self._mask_arr
+        else:
+            mask_arr = np.column_stack(
+                (df["_mask_lo"].to_numpy(dtype="uint64"), df["_mask_hi"].to_numpy(dtype="uint64"))
+            )
+        tba = self._tba_arr if self._tba_arr is not None else df["_tba"].to_numpy(dtype=bool, copy=False)
+
+        # 第一階段只套用陣列層級的便宜條件（序號、系所等值、人數），
+        # 子字串條件先收集起來，第二階段只對仍存活的列比對
+        text_preds: List[Tuple[str, List[str]]] = []
 
         full = (self.ed_full.text() or "").strip()
         if full:
             tokens = [t.strip().lower() for t in full.split() if t.strip()]
             if tokens:
-                s = df["_alltext"]
-                for tok in tokens:
-                    mask &= s.str.contains(tok, regex=False, na=False).to_numpy()
+                text_preds.append(("_alltext", tokens))
 
         special_gened = self.ck_gened.isChecked()
         special_sport = self.ck_sport.isChecked()
@@ -3052,115 +3451,104 @@ class MainWindow(QMainWindow):
                 except Exception:
                     continue
             if ids:
-                cid_arr = self._cid_arr if self._cid_arr is not None else df["_cid"].to_numpy(dtype=np.int64, copy=False)
-                mask &= np.isin(cid_arr, np.array(ids, dtype=np.int64))
+                keep &= np.isin(cid_arr, np.array(ids, dtype=np.int64))
 
         code_q = (self.ed_course_code.text() or "").strip()
         if code_q and "開課代碼" in df.columns:
             tokens = [t.strip().lower() for t in code_q.split() if t.strip()]
             if tokens:
-                s = df["_code_lc"] if "_code_lc" in df.columns else df["開課代碼"].astype(str).str.lower()
-                for tok in tokens:
-                    mask &= s.str.contains(tok, regex=False, na=False).to_numpy()
+                if "_code_lc" in df.columns:
+                    text_preds.append(("_code_lc", tokens))
+                else:
+                    s = df["開課代碼"].astype(str).str.lower()
+                    for tok in tokens:
+                        keep &= s.str.contains(tok, regex=False, na=False).to_numpy()
 
         cname = self.ed_cname.text().strip()
         if cname and "中文課程名稱" in df.columns:
             cname_lc = cname.lower()
             if "_cname_lc" in df.columns:
-                mask &= df["_cname_lc"].str.contains(cname_lc, regex=False, na=False).to_numpy()
+                text_preds.append(("_cname_lc", [cname_lc]))
             else:
-                mask &= df["中文課程名稱"].astype(str).str.contains(cname, na=False).to_numpy()
+                keep &= df["中文課程名稱"].astype(str).str.contains(cname, na=False).to_numpy()
 
         teacher = self.ed_teacher.text().strip()
         if teacher and "教師" in df.columns:
             teacher_lc = teacher.lower()
             if "_teacher_lc" in df.columns:
-                mask &= df["_teacher_lc"].str.contains(teacher_lc, regex=False, na=False).to_numpy()
+                text_preds.append(("_teacher_lc", [teacher_lc]))
             else:
-                mask &= df["教師"].astype(str).str.contains(teacher, na=False).to_numpy()
+                keep &= df["教師"].astype(str).str.contains(teacher, na=False).to_numpy()
 
+        gened_core: Optional[str] = None
         apply_dept_filter = not (special_gened or special_sport)
         if apply_dept_filter:
             dept_text = self.cb_dept.currentText().strip()
             if dept_text and dept_text != "(全部)" and "系所" in df.columns:
                 if dept_text in self._all_depts:
-                    if self._dept_arr is not None:
-                        mask &= (self._dept_arr == dept_text)
-                    else:
-                        mask &= (df["系所"] == dept_text).to_numpy()
+                    keep &= self._dept_equals(dept_text)
                 else:
                     dept_lc = dept_text.lower()
                     if "_dept_lc" in df.columns:
-                        mask &= df["_dept_lc"].str.contains(dept_lc, regex=False, na=False).to_numpy()
+                        text_preds.append(("_dept_lc", [dept_lc]))
                     else:
-                        mask &= df["系所"].astype(str).str.contains(dept_text, na=False).to_numpy()
+                        keep &= df["系所"].astype(str).str.contains(dept_text, na=False).to_numpy()
 
         elif special_gened and "系所" in df.columns:
-            if self._dept_arr is not None:
-                mask &= (self._dept_arr == GENED_DEPT_NAME)
-            else:
-                mask &= (df["系所"] == GENED_DEPT_NAME).to_numpy()
+            keep &= self._dept_equals(GENED_DEPT_NAME)
             core_choice = self.cb_gened_core.currentText().strip()
             if core_choice and core_choice != "所有通識" and "_gened_cats" in df.columns:
-                core_mask = np.array([core_choice in cats for cats in df["_gened_cats"]], dtype=bool)
-                mask &= core_mask
+                gened_core = core_choice
 
         elif special_sport and "系所" in df.columns:
-            if self._dept_arr is not None:
-                mask &= (self._dept_arr == SPORT_DEPT_NAME)
-            else:
-                mask &= (df["系所"] == SPORT_DEPT_NAME).to_numpy()
+            keep &= self._dept_equals(SPORT_DEPT_NAME)
 
         elif special_teaching:
             if "中文課程名稱" in df.columns:
-                mask &= df["中文課程名稱"].astype(str).str.contains(TEACHING_NAME_TOKEN, na=False).to_numpy()
+                if "_cname_lc" in df.columns:
+                    text_preds.append(("_cname_lc", [TEACHING_NAME_TOKEN.lower()]))
+                else:
+                    keep &= df["中文課程名稱"].astype(str).str.contains(TEACHING_NAME_TOKEN, na=False).to_numpy()
 
         if self.ck_not_full.isChecked():
             if "限修人數" in df.columns and "選修人數" in df.columns:
                 nf = (df["限修人數"].notna()) & (df["選修人數"].notna()) & (df["選修人數"] < df["限修人數"])
-                mask &= nf.to_numpy()
-
-        if self.ck_exclude_selected.isChecked():
-            if self.included_ids:
-                cid_arr = self._cid_arr if self._cid_arr is not None else df["_cid"].to_numpy(dtype=np.int64, copy=False)
-                mask &= ~np.isin(cid_arr, np.array(list(self.included_ids), dtype=np.int64))
+                keep &= nf.to_numpy()
 
-        if not self.ck_show_tba.isChecked():
-            tba = self._tba_arr if self._tba_arr is not None else df["_tba"].to_numpy(dtype=bool, copy=False)
-            mask &= ~tba
+        # 第二階段：子字串與通識分類只檢查前面留下的列
+        for col, tokens in text_preds:
+            self._apply_text_filter(keep, col, tokens)
 
-        if (self._sel_lo != 0) or (self._sel_hi != 0):
-            sel_lo = np.uint64(self._sel_lo)
-            sel_hi = np.uint64(self._sel_hi)
+        if gened_core is not None:
+            idx = np.flatnonzero(keep)
+            cats_arr = df["_gened_cats"].to_numpy(dtype=object, copy=False)
+            hit = np.fromiter((gened_core in cats_arr[i] for i in idx), dtype=bool, count=idx.size)
+            keep[idx[~hit]] = False
 
-            mlo = self._mask_lo_arr if self._mask_lo_arr is not None else df["_mask_lo"].to_numpy(dtype="uint64", copy=False)
-            mhi = self._mask_hi_arr if self._mask_hi_arr is not None else df["_mask_hi"].to_numpy(dtype="uint64", copy=False)
-
-            mode = self.cb_match_mode.currentIndex()
-            if mode == 0:
-                cond = (np.bitwise_and(mlo, np.bitwise_not(sel_lo)) == 0) & (np.bitwise_and(mhi, np.bitwise_not(sel_hi)) == 0)
-            else:
-                cond = (np.bitwise_and(mlo, sel_lo) != 0) | (np.bitwise_and(mhi, sel_hi) != 0)
-
-            mask &= cond
+        excl_sorted = self._get_included_sorted() if self.ck_exclude_selected.isChecked() else None
 
+        occ_mask: Optional[np.ndarray] = None
         if self.ck_exclude_conflict.isChecked():
             inc_sorted = self._get_included_sorted()
             if inc_sorted.size:
-                occ_lo, occ_hi = occupied_masks_sorted(self.courses_df, inc_sorted)
-                occ_lo = np.uint64(occ_lo)
-                occ_hi = np.uint64(occ_hi)
-
-                mlo = self._mask_lo_arr if self._mask_lo_arr is not None else df["_mask_lo"].to_numpy(dtype="uint64", copy=False)
-                mhi = self._mask_hi_arr if self._mask_hi_arr is not None else df["_mask_hi"].to_numpy(dtype="uint64", copy=False)
-                tba = self._tba_arr if self._tba_arr is not None else df["_tba"].to_numpy(dtype=bool, copy=False)
-
-                cond_no_conflict = (np.bitwise_and(mlo, occ_lo) == 0) & (np.bitwise_and(mhi, occ_hi) == 0)
-                cond = cond_no_conflict | tba
-                mask &= cond
+                occ_mask = self._occupied_mask(inc_sorted)
+
+        rows = filter_rows(
+            keep,
+            cid_arr,
+            mask_arr,
+            tba,
+            show_tba=self.ck_show_tba.isChecked(),
+            excl_sorted=excl_sorted,
+            sel_mask=self._sel_mask,
+            sel_not=self._sel_mask_not,
+            intersect_mode=self.cb_match_mode.currentIndex() != 0,
+            occ_mask=occ_mask,
+        )
 
         cols = self.display_columns if self.display_columns else [c for c in df.columns if not str(c).startswith("_")]
-        self.filtered_df = df.loc[mask, cols]
-        self.model_results.set_df(self.filtered_df)
+        col_pos = df.columns.get_indexer(cols)
+        self.filtered_df = df.iloc[rows, col_pos]
+        self.model_results.set_df(self.filtered_df, row_cids=cid_arr[rows])
         self.model_results.notify_favorites_changed()
         self.proxy_results.invalidate()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from typing import Optional, Sequence
+
+import numpy as np
+
+# pyarrow 為選用套件：有安裝時子字串比對交給 Arrow compute kernel，否則以單一字串緩衝區搜尋
+try:
+    import pyarrow as _pa
+    import pyarrow.compute as _pc
+
+    _PYARROW_AVAILABLE = True
+except Exception:
+    _PYARROW_AVAILABLE = False
+
+_TEXT_SEP = "\x00"
+
+
+def _sorted_contains(sorted_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """values 中每個元素是否出現在已排序的 sorted_ids（searchsorted，不需再排序）。"""
+    if sorted_ids.size == 0 or values.size == 0:
+        return np.zeros(values.shape[0], dtype=bool)
+    pos = np.searchsorted(sorted_ids, values, side="left")
+    np.minimum(pos, sorted_ids.size - 1, out=pos)
+    return sorted_ids[pos] == values
+
+
+def filter_rows(
+    keep: np.ndarray,
+    cid: np.ndarray,
+    mask: np.ndarray,
+    tba: np.ndarray,
+    *,
+    show_tba: bool = True,
+    excl_sorted: Optional[np.ndarray] = None,
+    sel_mask: Optional[np.ndarray] = None,
+    sel_not: Optional[np.ndarray] = None,
+    intersect_mode: bool = False,
+    occ_mask: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    非文字條件的合併篩選，回傳符合列的位置（int64，遞增）。
+    mask 為 (N, 2) uint64 的課程時間遮罩；sel_mask / occ_mask 為 (2,) 的選取 / 已佔用遮罩；
+    sel_not 為呼叫端預先算好的 ~sel_mask（未提供時於此計算）。
+    先以 keep 壓縮出候選列，之後每個條件只處理仍存活的列，
+    不再對整張表產生中間布林陣列。
+    """
+    idx = np.flatnonzero(keep)
+
+    if idx.size and not show_tba:
+        idx = idx[~tba[idx]]
+
+    if idx.size and excl_sorted is not None and excl_sorted.size:
+        idx = idx[~_sorted_contains(excl_sorted, cid[idx])]
+
+    if idx.size and sel_mask is not None and sel_mask.any():
+        sub = mask[idx]
+        if intersect_mode:
+            sub &= sel_mask
+            idx = idx[sub.any(axis=1)]
+        else:
+            # 完全落在選取範圍內：選取以外的位元皆為 0
+            sub &= ~sel_mask if sel_not is None else sel_not
+            idx = idx[~sub.any(axis=1)]
+
+    if idx.size and occ_mask is not None and occ_mask.any():
+        sub = mask[idx]
+        sub &= occ_mask
+        idx = idx[~sub.any(axis=1) | tba[idx]]
+
+    return idx
+
+
+class SubstringIndex:
+    """
+    單一字串欄位的子字串搜尋索引（載入課程檔時建立一次）。
+    無 pyarrow 時將所有值以 NUL 串成一個字串，以 str.find 在 C 層掃描，
+    只對命中的列做一次 bisect 換算列號，再跳到下一列起點繼續找。
+    """
+
+    __slots__ = ("_n", "_values", "_buf", "_starts", "_pa_arr")
+
+    def __init__(self, values: Sequence[str]):
+        vals = ["" if v is None else str(v) for v in values]
+        self._n = len(vals)
+        self._values = vals
+        self._buf = ""
+        self._starts: list = []
+        self._pa_arr = None
+        if _PYARROW_AVAILABLE:
+            self._pa_arr = _pa.array(vals, type=_pa.large_string())
+            return
+        self._buf = _TEXT_SEP.join(vals)
+        starts = [0] * (self._n + 1)
+        pos = 0
+        for i, v in enumerate(vals):
+            starts[i] = pos
+            pos += len(v) + 1
+        starts[self._n] = pos
+        self._starts = starts
+
+    def __len__(self) -> int:
+        return self._n
+
+    def contains(self, token: str) -> np.ndarray:
+        """每列是否包含 token（不分 regex，與 str.contains(regex=False) 相同）。"""
+        n = self._n
+        if not token:
+            return np.ones(n, dtype=bool)
+        if self._pa_arr is not None:
+            res = _pc.match_substring(self._pa_arr, token)
+            return np.asarray(res.to_numpy(zero_copy_only=False), dtype=bool)
+        if _TEXT_SEP in token:
+            return np.fromiter((token in v for v in self._values), dtype=bool, count=n)
+
+        hits = []
+        append = hits.append
+        starts = self._starts
+        find = self._buf.find
+        dense_at = max(64, n >> 3)
+        out = np.zeros(n, dtype=bool)
+        pos = find(token)
+        while pos >= 0:
+            r = bisect_right(starts, pos) - 1
+            append(r)
+            if len(hits) > dense_at:
+                # 命中過於密集時逐列比對剩餘部分較快
+                rest = self._values[r + 1 :]
+                out[r + 1 :] = np.fromiter((token in v for v in rest), dtype=bool, count=len(rest))
+                break
+            pos = find(token, starts[r + 1])
+        if hits:
+            out[hits] = True
+        return out
+
+    def contains_rows(self, token: str, rows: np.ndarray) -> np.ndarray:
+        """只檢查 rows（列號陣列）這些列是否包含 token，回傳與 rows 等長的布林陣列。"""
+        m = int(rows.size)
+        if not token:
+            return np.ones(m, dtype=bool)
+        if m == 0:
+            return np.zeros(0, dtype=bool)
+        if self._pa_arr is not None:
+            res = _pc.match_substring(self._pa_arr.take(_pa.array(rows)), token)
+            return np.asarray(res.to_numpy(zero_copy_only=False), dtype=bool)
+        if m > (self._n >> 3):
+            # 候選列仍多時，整段緩衝區掃描一次比逐列比對快
+            return self.contains(token)[rows]
+        vals = self._values
+        return np.fromiter((token in vals[i] for i in rows.tolist()), dtype=bool, count=m)
+
+    def contains_all(self, tokens: Sequence[str]) -> np.ndarray:
+        """
+        每列是否同時包含所有 tokens（AND）。
+        只有第一個（最長、通常最具篩選性的）token 掃描整欄，其餘 token 只檢查仍存活的列。
+        """
+        toks = sorted({t for t in tokens if t}, key=len, reverse=True)
+        if not toks:
+            return np.ones(self._n, dtype=bool)
+        out = self.contains(toks[0])
+        if len(toks) == 1:
+            return out
+        idx = np.flatnonzero(out)
+        for tok in toks[1:]:
+            if idx.size == 0:
+                break
+            idx = idx[self.contains_rows(tok, idx)]
+        out = np.zeros(self._n, dtype=bool)
+        out[idx] = True
+        return out
@@ -1,13 +1,15 @@
 ﻿from __future__ import annotations
 
-from typing import Dict, List, Optional, Set, Tuple
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
 
 import numpy as np
-import pandas as pd
 from PySide6.QtGui import QColor
 
 from app_constants import DAY_LABEL, DAYS, PERIODS, PERIOD_INDEX
-from app_utils import strip_bracket_text_for_timetable, format_cid4
+from app_utils import lazy_pandas, strip_bracket_text_for_timetable, format_cid4
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def darken(color: QColor, factor: float) -> QColor:
@@ -21,7 +23,7 @@ def _subset_courses_by_ids(
     courses_df: pd.DataFrame, included_ids_sorted: np.ndarray, cols: List[str]
 ) -> pd.DataFrame:
     if courses_df is None or courses_df.empty:
-        return pd.DataFrame(columns=cols)
+        return lazy_pandas().DataFrame(columns=cols)
     if included_ids_sorted is None or included_ids_sorted.size == 0:
         return courses_df.iloc[0:0][cols]
 
@@ -98,19 +100,23 @@ def build_timetable_matrix_per_day_lanes_sorted(
     List[str],
     Dict[str, int],
     List[int],
-    List[List[Optional[int]]],
-    List[List[bool]],
+    np.ndarray,
+    np.ndarray,
 ]:
+    """
+    回傳 (文字矩陣, 衝堂提示, 各天欄數, 各欄星期索引, id 矩陣, 鎖定矩陣)。
+    id 矩陣為 (節次數, 欄數) int64，空格為 -1；鎖定矩陣為同形狀的 bool。
+    """
     lane_map, _ = build_lane_assignment_sorted(courses_df, included_ids_sorted)
     day_lanes: Dict[str, int] = {d: 1 for d in show_days}
 
     subset_meta = _subset_courses_by_ids(
         courses_df,
         included_ids_sorted,
-        ["_cid", "銝剜?隤脩??迂", "_slots_set", "_tt_label"],
+        ["_cid", "中文課程名稱", "_slots_set", "_tt_label"],
     )
 
-    for cid, _cname, slots in subset_meta.itertuples(index=False, name=None):
+    for cid, _cname, slots, _label in subset_meta.itertuples(index=False, name=None):
         cid_i = int(cid)
         lane = lane_map.get(cid_i, 1)
         slots_set = slots if isinstance(slots, set) else set()
@@ -130,8 +136,8 @@ def build_timetable_matrix_per_day_lanes_sorted(
 
     cols = offset
     matrix = [["" for _ in range(cols)] for _ in PERIODS]
-    id_matrix: List[List[Optional[int]]] = [[None for _ in range(cols)] for _ in PERIODS]
-    locked_matrix: List[List[bool]] = [[False for _ in range(cols)] for _ in PERIODS]
+    id_matrix = np.full((len(PERIODS), cols), -1, dtype=np.int64)
+    locked_matrix = np.zeros((len(PERIODS), cols), dtype=bool)
     conflict_slots: List[str] = []
 
     locked_ids_set = set(int(x) for x in locked_ids_set)
@@ -160,16 +166,17 @@ def build_timetable_matrix_per_day_lanes_sorted(
             c = day_offset[day] + (lane - 1)
 
             if matrix[r][c] and label not in matrix[r][c]:
-                conflict_slots.append(f"{DAY_LABEL.get(day, day)} 蝚洌per}蝭")
+                conflict_slots.append(f"{DAY_LABEL.get(day, day)} 第{per}節")
                 matrix[r][c] = matrix[r][c] + "\n---\n" + label
                 if is_locked:
-                    locked_matrix[r][c] = True
+                    locked_matrix[r, c] = True
             else:
                 matrix[r][c] = label
-                if id_matrix[r][c] is None:
-                    id_matrix[r][c] = cid_i
+                if id_matrix[r, c] < 0:
+                    id_matrix[r, c] = cid_i
                 if is_locked:
-                    locked_matrix[r][c] = True\n
+                    locked_matrix[r, c] = True
+
     uniq: List[str] = []
     seen: Set[str] = set()
     for x in conflict_slots:
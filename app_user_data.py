@@ -6,14 +6,13 @@ import time
 from typing import Dict, List, Optional, Set, Tuple
 
 import numpy as np
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
 
 from app_constants import user_data_store_path
 from app_utils import (
     format_cid4,
     parse_cid_to_int,
     sanitize_folder_name,
+    sorted_index_of,
     truthy_flag,
 )
 
@@ -76,27 +75,24 @@ def list_user_history_files(user_dir_path: str) -> List[str]:
     files: List[str] = []
     seen: Set[str] = set()
     history_dir = history_dir_path(user_dir_path)
+    # scandir 的 is_file() 使用目錄項快取，不必每個檔案各 stat 一次；先比副檔名再判斷型別
     if history_dir and os.path.isdir(history_dir):
-        for fn in os.listdir(history_dir):
-            if not fn.lower().endswith(".xlsx"):
+        with os.scandir(history_dir) as it:
+            for entry in it:
+                if not entry.name.lower().endswith(".xlsx") or not entry.is_file():
+                    continue
+                files.append(entry.path)
+                seen.add(os.path.abspath(entry.path))
+    with os.scandir(user_dir_path) as it:
+        for entry in it:
+            fn = entry.name
+            if not fn.lower().endswith(".xlsx") or fn.startswith(BEST_SCHEDULE_FILE_PREFIX):
                 continue
-            path = os.path.join(history_dir, fn)
-            if not os.path.isfile(path):
+            if not entry.is_file():
                 continue
-            files.append(path)
-            seen.add(os.path.abspath(path))
-    for fn in os.listdir(user_dir_path):
-        path = os.path.join(user_dir_path, fn)
-        if not os.path.isfile(path):
-            continue
-        abs_path = os.path.abspath(path)
-        if abs_path in seen:
-            continue
-        if not fn.lower().endswith(".xlsx"):
-            continue
-        if fn.startswith(BEST_SCHEDULE_FILE_PREFIX):
-            continue
-        files.append(path)
+            if os.path.abspath(entry.path) in seen:
+                continue
+            files.append(entry.path)
     files.sort(key=lambda p: os.path.basename(p), reverse=True)
     return files
 
@@ -107,11 +103,8 @@ def list_all_users(course_excel_path: str) -> List[str]:
     root = user_root_dir(course_excel_path)
     if not os.path.isdir(root):
         return []
-    names: List[str] = []
-    for entry in os.listdir(root):
-        p = os.path.join(root, entry)
-        if os.path.isdir(p):
-            names.append(entry)
+    with os.scandir(root) as it:
+        names: List[str] = [entry.name for entry in it if entry.is_dir()]
     names.sort(key=lambda s: s.lower())
     return names
 
@@ -169,6 +162,9 @@ def load_user_file(xlsx_path: str) -> Tuple[Set[int], Set[int], Dict[int, int],
     if not os.path.exists(xlsx_path):
         raise FileNotFoundError(f"找不到使用者檔案：{xlsx_path}")
 
+    # openpyxl 匯入成本高，只在實際讀寫使用者檔案時才匯入，不拖慢程式啟動
+    from openpyxl import load_workbook
+
     wb = load_workbook(xlsx_path, data_only=True)
     if "我的最愛" not in wb.sheetnames:
         raise RuntimeError("使用者檔案缺少工作表「我的最愛」。")
@@ -234,6 +230,9 @@ def save_user_file(
     fav_seq: Dict[int, int],
     courses_df,
 ) -> None:
+    from openpyxl import Workbook
+    from openpyxl.utils.dataframe import dataframe_to_rows
+
     os.makedirs(os.path.dirname(os.path.abspath(xlsx_path)), exist_ok=True)
 
     wb = Workbook()
@@ -244,11 +243,7 @@ def save_user_file(
     items.sort(key=lambda x: (x[0], x[1]))
 
     def _sorted_has(arr: np.ndarray, cid: int) -> bool:
-        if arr is None or arr.size == 0:
-            return False
-        x = np.int64(int(cid))
-        p = int(np.searchsorted(arr, x, side="left"))
-        return 0 <= p < arr.size and int(arr[p]) == int(x)
+        return sorted_index_of(arr, cid) >= 0
 
     ws_fav = wb.create_sheet("我的最愛")
     ws_fav.append([f"使用者：{username}（此檔案由程式自動產生）"])
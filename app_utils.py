@@ -2,12 +2,45 @@ from __future__ import annotations
 
 import re
 from dataclasses import dataclass
-from typing import List, Optional, Set, Tuple
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 import numpy as np
-import pandas as pd
 
-from app_constants import BITS_PER_DAY, DAY_INDEX, DAYS, PERIOD_INDEX, PERIODS
+from app_constants import (
+    BITS_PER_DAY,
+    DAY_CODE_TABLE,
+    DAY_INDEX,
+    DAYS,
+    PERIOD_CODE_TABLE,
+    PERIOD_INDEX,
+    PERIODS,
+)
+
+
+# 熱路徑使用的正規式在模組載入時編譯一次
+_DIGITS_RE = re.compile(r"\d+")
+_SQ_BRACKET_RE = re.compile(r"\[.*?\]")
+_FW_BRACKET_RE = re.compile(r"【.*?】")
+_SQ_BRACKET_GROUP_RE = re.compile(r"\[(.*?)\]")
+_FW_BRACKET_GROUP_RE = re.compile(r"【(.*?)】")
+_WHITESPACE_RE = re.compile(r"\s+")
+_GENED_SEP_RE = re.compile(r"[；;]")
+_FOLDER_UNSAFE_RE = re.compile(r"[\\/:*?\[\]]+")
+
+# 純 Python 熱迴圈逐字查表時，bytes 索引比 ndarray 純量索引快；存 index + 1，0 表示不符
+_DAY_TABLE = (DAY_CODE_TABLE + 1).astype(np.uint8).tobytes()
+_DAY_TABLE_LEN = len(_DAY_TABLE)
+_PERIOD_TABLE = (PERIOD_CODE_TABLE + 1).astype(np.uint8).tobytes()
+_PERIOD_TABLE_LEN = len(_PERIOD_TABLE)
+
+
+@lru_cache(maxsize=None)
+def lazy_pandas():
+    """回傳 pandas 模組；匯入成本高且啟動時用不到，首次呼叫（載入課程檔）時才匯入。"""
+    import pandas
+
+    return pandas
 
 
 @dataclass
@@ -16,6 +49,8 @@ class ParsedTime:
     tba: bool
 
 
+# 開課序號種類有限（最愛、課表每次重繪都會格式化同一批 id），以有上限的快取保留結果
+@lru_cache(maxsize=8192)
 def format_cid4(cid: int) -> str:
     try:
         n = int(cid)
@@ -25,12 +60,12 @@ def format_cid4(cid: int) -> str:
 
 
 def parse_cid_to_int(val) -> Optional[int]:
-    if val is None or (isinstance(val, float) and pd.isna(val)):
+    if val is None or (isinstance(val, float) and val != val):
         return None
     s = str(val).strip()
     if not s:
         return None
-    m = re.search(r"\d+", s)
+    m = _DIGITS_RE.search(s)
     if not m:
         return None
     try:
@@ -41,16 +76,33 @@ def parse_cid_to_int(val) -> Optional[int]:
 
 def strip_bracket_text_for_timetable(name: str) -> str:
     s = str(name or "")
-    s = re.sub(r"\[.*?\]", "", s)
-    s = re.sub(r"【.*?】", "", s)
-    s = re.sub(r"\s+", " ", s).strip()
+    s = _SQ_BRACKET_RE.sub("", s)
+    s = _FW_BRACKET_RE.sub("", s)
+    s = _WHITESPACE_RE.sub(" ", s).strip()
     return s
 
 
 def sorted_array_from_set_int(s: Set[int]) -> np.ndarray:
     if not s:
         return np.empty((0,), dtype=np.int64)
-    return np.array(sorted((int(x) for x in s)), dtype=np.int64)
+    # 直接寫入預先配置的 int64 陣列後原地排序，不經過中間的 sorted list
+    arr = np.fromiter(s, dtype=np.int64, count=len(s))
+    arr.sort()
+    return arr
+
+
+def sorted_index_of(sorted_arr: Optional[np.ndarray], value: int) -> int:
+    """
+    已排序整數陣列中 value 的位置，不存在時回傳 -1。
+    單筆查詢用 ndarray.searchsorted 搭配 Python int，不經 np.searchsorted 包裝、也不建立 0 維陣列。
+    """
+    if sorted_arr is None or sorted_arr.size == 0:
+        return -1
+    x = int(value)
+    pos = int(sorted_arr.searchsorted(x))
+    if pos < sorted_arr.size and sorted_arr.item(pos) == x:
+        return pos
+    return -1
 
 
 def slot_to_mask(day: str, period: str) -> Tuple[np.uint64, np.uint64]:
@@ -64,20 +116,57 @@ def slot_to_mask(day: str, period: str) -> Tuple[np.uint64, np.uint64]:
     return np.uint64(0), np.uint64(1) << np.uint64(idx - 64)
 
 
+# "一-3" -> 位元索引；以 Python int 做位元運算，避免逐 slot 建立 np.uint64 純量
+_SLOT_BIT: Dict[str, int] = {
+    f"{d}-{p}": DAY_INDEX[d] * BITS_PER_DAY + PERIOD_INDEX[p] for d in DAYS for p in PERIODS
+}
+_U64_MASK = (1 << 64) - 1
+
+
+def slots_to_mask_int(slots: Iterable[str]) -> int:
+    m = 0
+    for s in slots:
+        bit = _SLOT_BIT.get(s)
+        if bit is not None:
+            m |= 1 << bit
+    return m
+
+
 def slots_set_to_masks(slots: Set[str]) -> Tuple[np.uint64, np.uint64]:
-    lo = np.uint64(0)
-    hi = np.uint64(0)
     if not slots:
-        return lo, hi
-    for s in slots:
-        try:
-            d, p = s.split("-", 1)
-        except Exception:
-            continue
-        mlo, mhi = slot_to_mask(d, p)
-        lo |= mlo
-        hi |= mhi
-    return lo, hi
+        return np.uint64(0), np.uint64(0)
+    m = slots_to_mask_int(slots)
+    return np.uint64(m & _U64_MASK), np.uint64(m >> 64)
+
+
+def slot_sets_to_mask_array(slot_sets: Sequence[Set[str]]) -> np.ndarray:
+    """將多組 slots 轉成 (N, 2) uint64 陣列（欄 0 為 lo、欄 1 為 hi）。"""
+    out = np.zeros((len(slot_sets), 2), dtype=np.uint64)
+    for i, slots in enumerate(slot_sets):
+        if slots:
+            m = slots_to_mask_int(slots)
+            out[i, 0] = m & _U64_MASK
+            out[i, 1] = m >> 64
+    return out
+
+
+def mask_arrays_to_slot_csr(mask_arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    由每列的 (N, 2) uint64 位元遮罩（lo, hi）建立 CSR 形式的 slot 表：
+    第 i 列的 slot 代碼為 values[indptr[i]:indptr[i + 1]]，代碼即位元索引（day * BITS_PER_DAY + period）。
+    """
+    n = int(mask_arr.shape[0])
+    words = np.ascontiguousarray(mask_arr, dtype="<u8")
+    bits = np.unpackbits(words.view(np.uint8), axis=1, bitorder="little")
+    rows, codes = np.nonzero(bits)
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, codes.astype(np.int16)
+
+
+def slot_code_to_pair(code: int) -> Tuple[str, str]:
+    day_idx, per_idx = divmod(int(code), BITS_PER_DAY)
+    return DAYS[day_idx], PERIODS[per_idx]
 
 
 def expand_period_range(start: str, end: Optional[str]) -> List[str]:
@@ -99,8 +188,11 @@ def expand_period_range(start: str, end: Optional[str]) -> List[str]:
 
 def _extract_first_day(s: str) -> Optional[str]:
     for ch in s:
-        if ch in ("一", "二", "三", "四", "五", "六", "日", "天"):
-            return "日" if ch == "天" else ch
+        o = ord(ch)
+        if o < _DAY_TABLE_LEN:
+            idx = _DAY_TABLE[o]
+            if idx:
+                return DAYS[idx - 1]
     return None
 
 
@@ -111,10 +203,11 @@ def _extract_first_token(s: str) -> Optional[str]:
     if t.startswith("10"):
         return "10"
     ch = t[0]
+    o = ord(ch)
+    if o < _PERIOD_TABLE_LEN and _PERIOD_TABLE[o]:
+        return PERIODS[_PERIOD_TABLE[o] - 1]
     if ch.isdigit():
         return ch
-    if ch in ("A", "B", "C", "D"):
-        return ch
     return None
 
 
@@ -190,8 +283,8 @@ def parse_gened_categories_from_course_name(course_name: str) -> List[str]:
     if not s:
         return []
 
-    matches_sq = list(re.finditer(r"\[(.*?)\]", s))
-    matches_fw = list(re.finditer(r"【(.*?)】", s))
+    matches_sq = list(_SQ_BRACKET_GROUP_RE.finditer(s))
+    matches_fw = list(_FW_BRACKET_GROUP_RE.finditer(s))
 
     picked = None
     if matches_sq and matches_fw:
@@ -208,7 +301,7 @@ def parse_gened_categories_from_course_name(course_name: str) -> List[str]:
     if not inner:
         return []
 
-    parts = [p.strip() for p in re.split(r"[；;]", inner) if p.strip()]
+    parts = [p.strip() for p in _GENED_SEP_RE.split(inner) if p.strip()]
     if not parts:
         return []
 
@@ -220,7 +313,7 @@ def parse_gened_categories_from_course_name(course_name: str) -> List[str]:
     else:
         tail = last.strip()
 
-    tail = re.sub(r"\s+", " ", tail).strip()
+    tail = _WHITESPACE_RE.sub(" ", tail).strip()
     if not tail:
         return []
 
@@ -229,7 +322,7 @@ def parse_gened_categories_from_course_name(course_name: str) -> List[str]:
 
 def sanitize_folder_name(name: str) -> str:
     s = (name or "").strip() or "未命名使用者"
-    s = re.sub(r"[\\/:*?\[\]]+", "_", s)
+    s = _FOLDER_UNSAFE_RE.sub("_", s)
     s = s.replace("\r", " ").replace("\n", " ").strip()
     return s[:80] if len(s) > 80 else s
 
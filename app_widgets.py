@@ -1,10 +1,9 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Optional, Protocol, Set, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Protocol, Sequence, Set, Tuple
 
 import numpy as np
-import pandas as pd
 from PySide6.QtCore import (
     Qt,
     QAbstractTableModel,
@@ -12,61 +11,334 @@ from PySide6.QtCore import (
     QEvent,
     QSortFilterProxyModel,
     QRect,
+    QStringListModel,
     Signal,
 )
-from PySide6.QtGui import QColor, QPainter, QPen, QFontMetrics, QBrush
+from PySide6.QtGui import QColor, QFont, QPainter, QPalette, QPen, QFontMetrics, QBrush
 from PySide6.QtWidgets import (
     QAbstractItemView,
+    QApplication,
+    QCompleter,
     QHBoxLayout,
     QHeaderView,
+    QStyle,
+    QStyleOptionButton,
     QStyledItemDelegate,
     QTableView,
     QTableWidget,
-    QTableWidgetItem,
+    QToolTip,
     QWidget,
 )
 
-from app_utils import sorted_array_from_set_int
+from app_utils import lazy_pandas, sorted_array_from_set_int, sorted_index_of
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-class IntSortItem(QTableWidgetItem):
-    def __init__(self, text: str = "", value: int = 0):
-        super().__init__(text)
-        self.setData(Qt.UserRole, int(value))
 
-    def __lt__(self, other: "QTableWidgetItem") -> bool:
-        try:
-            a = int(self.data(Qt.UserRole) or 0)
-        except Exception:
-            a = 0
-        try:
-            b = int(other.data(Qt.UserRole) or 0)
-        except Exception:
-            b = 0
-        return a < b
+# 文字寬度快取：以 QFont.key() 區分字型，表頭/欄寬計算多半是同一批字串
+_FONT_METRICS_CACHE: Dict[str, QFontMetrics] = {}
+_TEXT_WIDTH_CACHE: Dict[Tuple[str, str], int] = {}
 
 
-class FloatSortItem(QTableWidgetItem):
-    def __init__(self, text: str = "", value: float = 0.0):
-        super().__init__(text)
-        try:
-            self.setData(Qt.UserRole, float(value))
-        except Exception:
-            self.setData(Qt.UserRole, 0.0)
+def font_metrics(font: QFont) -> QFontMetrics:
+    key = font.key()
+    fm = _FONT_METRICS_CACHE.get(key)
+    if fm is None:
+        fm = QFontMetrics(font)
+        _FONT_METRICS_CACHE[key] = fm
+    return fm
 
-    def __lt__(self, other: "QTableWidgetItem") -> bool:
-        try:
-            a = float(self.data(Qt.UserRole) or 0.0)
-        except Exception:
-            a = 0.0
+
+def text_width(font: QFont, text: str) -> int:
+    """horizontalAdvance 的快取版本。"""
+    k = (font.key(), text)
+    w = _TEXT_WIDTH_CACHE.get(k)
+    if w is None:
+        w = int(font_metrics(font).horizontalAdvance(text))
+        _TEXT_WIDTH_CACHE[k] = w
+    return w
+
+
+class TableFreeze:
+    """
+    重建表格期間暫停重繪與訊號（drag=True 時一併暫停拖曳）的 context manager；
+    離開時（含例外）依相反順序還原進入前的狀態。
+    排序不在此切換：view 重新啟用排序時會整表重排一次。
+    """
+
+    __slots__ = ("_t", "_signals", "_drag", "_prev_updates", "_prev_blocked", "_prev_drag")
+
+    def __init__(self, table: QWidget, *, signals: bool = True, drag: bool = False):
+        self._t = table
+        self._signals = signals
+        self._drag = drag
+        self._prev_updates = True
+        self._prev_blocked = False
+        self._prev_drag = False
+
+    def __enter__(self) -> "TableFreeze":
+        t = self._t
+        if self._drag:
+            self._prev_drag = t.is_drag_enabled()
+            t.set_drag_enabled(False)
+        self._prev_updates = t.updatesEnabled()
+        t.setUpdatesEnabled(False)
+        if self._signals:
+            self._prev_blocked = t.blockSignals(True)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        t = self._t
+        if self._signals:
+            t.blockSignals(self._prev_blocked)
+        t.setUpdatesEnabled(self._prev_updates)
+        if self._drag and self._prev_drag:
+            t.set_drag_enabled(True)
+
+
+# 我的最愛：各列的開課序號（供 handler 反查），所有欄位都可取得
+FAV_CID_ROLE = Qt.UserRole + 1
+
+
+# 學分值種類很少（0、1、1.5、2、3…），格式化結果依值快取
+_CREDIT_TEXT_CACHE: Dict[float, str] = {}
+
+
+def _fav_credit_text(cr: float) -> str:
+    s = _CREDIT_TEXT_CACHE.get(cr)
+    if s is None:
+        if cr == 0.0:
+            s = ""
+        else:
+            s = str(int(cr)) if abs(cr - round(cr)) < 1e-9 else f"{cr:g}"
+        _CREDIT_TEXT_CACHE[cr] = s
+    return s
+
+
+class FavoritesModel(QAbstractTableModel):
+    """
+    我的最愛表格的資料模型：每欄以平行 list（SoA）保存，重建時整批替換後 reset，
+    不再為每格建立 QTableWidgetItem。Qt.UserRole 為排序鍵（搭配 QSortFilterProxyModel.setSortRole）。
+    """
+
+    # 使用者切換「課表」/「鎖定」勾選：cid, column, checked
+    checkToggled = Signal(int, int, bool)
+
+    def __init__(
+        self,
+        headers: Sequence[str],
+        *,
+        schedule_col: int,
+        lock_col: int,
+        id_col: int,
+        name_col: int,
+        teacher_col: int,
+        credit_col: int,
+        rank_col: int,
+        drag_col: int,
+    ):
+        super().__init__()
+        self._headers = list(headers)
+        self._schedule_col = schedule_col
+        self._lock_col = lock_col
+        self._id_col = id_col
+        self._name_col = name_col
+        self._teacher_col = teacher_col
+        self._credit_col = credit_col
+        self._rank_col = rank_col
+        self._drag_col = drag_col
+
+        self._cids: List[int] = []
+        self._cid_texts: List[str] = []
+        self._names: List[str] = []
+        self._teachers: List[str] = []
+        self._credits: List[float] = []
+        self._credit_texts: List[str] = []
+        self._in_course: List[bool] = []
+        self._locked: List[bool] = []
+        self._ranks: List[int] = []
+        self._row_of: Dict[int, int] = {}
+
+        # 每格都會呼叫 data()/flags()：欄位對應的資料 list 與旗標先建好表，不在熱路徑逐欄比較。
+        # 各 list 物件在整個 model 生命週期中不替換（重建時就地改寫內容），表中的參照一直有效。
+        self._display_lists: Dict[int, List] = {
+            id_col: self._cid_texts,
+            name_col: self._names,
+            teacher_col: self._teachers,
+            credit_col: self._credit_texts,
+        }
+        self._sort_lists: Dict[int, List] = {
+            id_col: self._cids,
+            name_col: self._names,
+            teacher_col: self._teachers,
+            credit_col: self._credits,
+            rank_col: self._ranks,
+        }
+        ro_flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        self._ro_flags = ro_flags
+        self._col_flags = [ro_flags] * len(self._headers)
+        if 0 <= lock_col < len(self._headers):
+            self._col_flags[lock_col] = ro_flags | Qt.ItemIsUserCheckable
+        if 0 <= drag_col < len(self._headers):
+            self._col_flags[drag_col] = ro_flags | Qt.ItemIsDragEnabled | Qt.ItemIsDropEnabled
+        self._check_flags = ro_flags | Qt.ItemIsUserCheckable
+
+    # ---- 批次更新 ----
+    def reset_rows(
+        self,
+        cids: Sequence[int],
+        infos: Sequence[Tuple[str, str, str, float]],
+        in_course: Sequence[bool],
+        locked: Sequence[bool],
+        ranks: Sequence[int],
+    ) -> None:
+        """以 cids 的順序整批替換所有列；infos 為（序號文字, 課名, 教師, 學分）。"""
+        self.beginResetModel()
+        self._cids[:] = [int(c) for c in cids]
+        self._cid_texts[:] = [i[0] for i in infos]
+        self._names[:] = [i[1] for i in infos]
+        self._teachers[:] = [i[2] for i in infos]
+        self._credits[:] = [float(i[3]) for i in infos]
+        credit_text = _fav_credit_text
+        self._credit_texts[:] = [credit_text(cr) for cr in self._credits]
+        self._locked[:] = [bool(x) for x in locked]
+        self._in_course[:] = [bool(x) or lk for x, lk in zip(in_course, self._locked)]
+        self._ranks[:] = [int(x) for x in ranks]
+        self._row_of = {c: r for r, c in enumerate(self._cids)}
+        self.endResetModel()
+
+    def append_row(
+        self,
+        cid: int,
+        info: Tuple[str, str, str, float],
+        in_course: bool,
+        locked: bool,
+        rank: int,
+    ) -> int:
+        row = len(self._cids)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._cids.append(int(cid))
+        self._cid_texts.append(info[0])
+        self._names.append(info[1])
+        self._teachers.append(info[2])
+        self._credits.append(float(info[3]))
+        self._credit_texts.append(_fav_credit_text(float(info[3])))
+        self._locked.append(bool(locked))
+        self._in_course.append(bool(in_course) or bool(locked))
+        self._ranks.append(int(rank))
+        self._row_of[int(cid)] = row
+        self.endInsertRows()
+        return row
+
+    def set_ranks(self, rank_of: Dict[int, int]) -> None:
+        if not self._cids:
+            return
+        get_rank = rank_of.get
+        self._ranks[:] = [int(get_rank(c, 0)) for c in self._cids]
+        self.dataChanged.emit(
+            self.index(0, self._rank_col),
+            self.index(len(self._cids) - 1, self._rank_col),
+            [Qt.DisplayRole, Qt.UserRole],
+        )
+
+    def cids(self) -> List[int]:
+        return list(self._cids)
+
+    def row_of_cid(self, cid: int) -> int:
+        return self._row_of.get(int(cid), -1)
+
+    # ---- Qt model 介面 ----
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._cids)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._headers)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._headers[section] if 0 <= section < len(self._headers) else None
+        return str(section + 1)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        r = index.row()
+        c = index.column()
+
+        if role == Qt.DisplayRole:
+            values = self._display_lists.get(c)
+            if values is not None:
+                return values[r]
+            if c == self._rank_col:
+                rank = self._ranks[r]
+                return str(rank) if rank > 0 else ""
+            if c == self._schedule_col or c == self._lock_col:
+                return ""
+            return None
+
+        if role == Qt.CheckStateRole:
+            if c == self._schedule_col:
+                return Qt.Checked if self._in_course[r] else Qt.Unchecked
+            if c == self._lock_col:
+                return Qt.Checked if self._locked[r] else Qt.Unchecked
+            return None
+
+        if role == Qt.UserRole:
+            values = self._sort_lists.get(c)
+            if values is not None:
+                return values[r]
+            if c == self._schedule_col:
+                return 1 if self._in_course[r] else 0
+            if c == self._lock_col:
+                return 1 if self._locked[r] else 0
+            return None
+
+        if role == FAV_CID_ROLE:
+            return self._cids[r]
+        return None
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        c = index.column()
+        if c == self._schedule_col:
+            return self._ro_flags if self._locked[index.row()] else self._check_flags
+        return self._col_flags[c]
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.EditRole) -> bool:
+        if not index.isValid() or role != Qt.CheckStateRole:
+            return False
+        r = index.row()
+        c = index.column()
+        if c not in (self._schedule_col, self._lock_col):
+            return False
         try:
-            b = float(other.data(Qt.UserRole) or 0.0)
+            checked = Qt.CheckState(value) == Qt.Checked
         except Exception:
-            b = 0.0
-        return a < b
+            checked = bool(value)
+
+        if c == self._schedule_col:
+            # 鎖定的課程一定在課表中
+            if self._locked[r]:
+                return False
+            self._in_course[r] = checked
+        else:
+            self._locked[r] = checked
+            if checked:
+                self._in_course[r] = True
+        # 整列通知：刪除欄的按鈕依鎖定狀態繪製
+        self.dataChanged.emit(self.index(r, 0), self.index(r, len(self._headers) - 1), [Qt.CheckStateRole, Qt.UserRole])
+        self.checkToggled.emit(self._cids[r], c, checked)
+        return True
+
+    def supportedDropActions(self):
+        return Qt.MoveAction | Qt.CopyAction
 
 
-class FavoritesTableWidget(QTableWidget):
+class FavoritesTableView(QTableView):
     orderChanged = Signal(list)
     # Emitted after a drop completes. Argument: changed (bool) indicating whether
     # the underlying order actually changed.
@@ -103,11 +375,15 @@ class FavoritesTableWidget(QTableWidget):
         self.setAcceptDrops(False)
         self.setDefaultDropAction(Qt.MoveAction)
 
+    def _row_count(self) -> int:
+        model = self.model()
+        return model.rowCount() if model is not None else 0
+
     def cid_at_row(self, row: int) -> Optional[int]:
-        item = self.item(row, self._cid_column)
-        if not item:
+        model = self.model()
+        if model is None:
             return None
-        data = item.data(Qt.UserRole)
+        data = model.index(row, self._cid_column).data(Qt.UserRole)
         if data is None:
             return None
         try:
@@ -135,7 +411,7 @@ class FavoritesTableWidget(QTableWidget):
 
     def _current_order(self) -> List[int]:
         order: List[int] = []
-        for row in range(self.rowCount()):
+        for row in range(self._row_count()):
             cid = self.cid_at_row(row)
             if cid is not None:
                 order.append(cid)
@@ -229,13 +505,13 @@ class FavoritesTableWidget(QTableWidget):
                 self._drag_select_column = col
                 self._drag_select_start_row = row
                 self._last_drag_select_row = row
-                item = self.item(row, col)
-                if item and item.flags() & Qt.ItemIsUserCheckable:
+                idx = self.model().index(row, col)
+                if idx.flags() & Qt.ItemIsUserCheckable:
                     # Toggle the state for a single click
-                    current_state = item.checkState()
+                    current_state = idx.data(Qt.CheckStateRole)
                     new_state = Qt.Unchecked if current_state == Qt.Checked else Qt.Checked
                     self._drag_select_initial_state = new_state
-                    item.setCheckState(new_state)
+                    self.model().setData(idx, new_state, Qt.CheckStateRole)
                     self._drag_select_affected_rows.add(row)
                 else:
                     self._drag_select_initial_state = None
@@ -283,20 +559,20 @@ class FavoritesTableWidget(QTableWidget):
                 # Determine the range of rows to apply the state to
                 rows_to_process = range(min(start_row, end_row), max(start_row, end_row) + 1)
                 
+                model = self.model()
                 for r in rows_to_process:
+                    idx = model.index(r, self._drag_select_column)
                     # Check if this row was already processed in this drag
-                    if r in self._drag_select_affected_rows and self.item(r, self._drag_select_column).checkState() == self._drag_select_initial_state:
+                    if r in self._drag_select_affected_rows and idx.data(Qt.CheckStateRole) == self._drag_select_initial_state:
                         continue
 
-                    item = self.item(r, self._drag_select_column)
-                    if item and item.flags() & Qt.ItemIsUserCheckable and self._drag_select_initial_state is not None:
+                    if idx.flags() & Qt.ItemIsUserCheckable and self._drag_select_initial_state is not None:
                         # Prevent changing state on locked items when dragging schedule column
                         if self._drag_select_column == 1: # Schedule column
-                            lock_item = self.item(r, 2) # Lock column
-                            if lock_item and lock_item.checkState() == Qt.Checked:
+                            if model.index(r, 2).data(Qt.CheckStateRole) == Qt.Checked: # Lock column
                                 continue
                         
-                        item.setCheckState(self._drag_select_initial_state)
+                        model.setData(idx, self._drag_select_initial_state, Qt.CheckStateRole)
                         self._drag_select_affected_rows.add(r)
 
                 self._last_drag_select_row = current_row
@@ -351,13 +627,14 @@ class FavoritesTableWidget(QTableWidget):
     def dragMoveEvent(self, event) -> None:
         if self._drag_enabled and self._drag_source_row is not None:
             dest_index = self._drop_insert_index(event)
-            if dest_index < 0 or dest_index > self.rowCount():
+            row_count = self._row_count()
+            if dest_index < 0 or dest_index > row_count:
                 self._drop_indicator_rect = None
             else:
-                if dest_index == self.rowCount():
+                if dest_index == row_count:
                     # Dropping at the very end
-                    if self.rowCount() > 0:
-                        last_row_rect = self.visualRect(self.model().index(self.rowCount() - 1, 0))
+                    if row_count > 0:
+                        last_row_rect = self.visualRect(self.model().index(row_count - 1, 0))
                         self._drop_indicator_rect = QRect(
                             last_row_rect.left(),
                             last_row_rect.bottom() - 1,
@@ -424,24 +701,43 @@ class FavoritesTableWidget(QTableWidget):
 class ResultsModel(QAbstractTableModel):
     favoriteToggled = Signal(int, bool)
 
-    def __init__(self, df: pd.DataFrame, favorites_ref: Set[int]):
+    def __init__(self, df: Optional[pd.DataFrame], favorites_ref: Set[int]):
         super().__init__()
         self._df = df
+        self._columns: List[str] = []
+        self._col_pos: List[int] = []
+        self._rebuild_columns(None)
         self._favorites = favorites_ref
         self._readonly = False
         self._fav_sorted = np.empty((0,), dtype=np.int64)
+        self._row_cids = np.empty((0,), dtype=np.int64)
+        self._rebuild_row_cids()
         self._rebuild_fav_sorted()
 
+    def _rebuild_row_cids(self, row_cids: Optional[np.ndarray] = None) -> None:
+        # 每列的開課序號由呼叫端以載入時建好的 _cid 陣列依列號取出；未提供時才取 df 的 _cid 欄
+        if row_cids is None and self._df is not None and "_cid" in self._df.columns:
+            row_cids = self._df["_cid"].to_numpy(dtype=np.int64, copy=False)
+        self._row_cids = row_cids if row_cids is not None else np.empty((0,), dtype=np.int64)
+
+    def _rebuild_columns(self, columns: Optional[Sequence[str]]) -> None:
+        # 顯示欄位只記錄名稱與在 df 中的位置，取值時再投影，不另外複製一份子 DataFrame
+        if self._df is None:
+            self._columns, self._col_pos = [], []
+            return
+        if columns is None:
+            self._columns = [str(c) for c in self._df.columns]
+            self._col_pos = list(range(len(self._columns)))
+            return
+        pos = self._df.columns.get_indexer(list(columns)).tolist()
+        self._columns = [str(c) for c, p in zip(columns, pos) if p >= 0]
+        self._col_pos = [p for p in pos if p >= 0]
+
     def _rebuild_fav_sorted(self) -> None:
         self._fav_sorted = sorted_array_from_set_int(self._favorites)
 
     def _fav_has(self, cid: int) -> bool:
-        arr = self._fav_sorted
-        if arr.size == 0:
-            return False
-        x = np.int64(int(cid))
-        pos = int(np.searchsorted(arr, x, side="left"))
-        return 0 <= pos < arr.size and int(arr[pos]) == int(x)
+        return sorted_index_of(self._fav_sorted, cid) >= 0
 
     def set_readonly(self, readonly: bool) -> None:
         self._readonly = bool(readonly)
@@ -450,18 +746,31 @@ class ResultsModel(QAbstractTableModel):
             bot = self.index(self.rowCount() - 1, 0)
             self.dataChanged.emit(top, bot, [Qt.CheckStateRole])
 
-    def set_df(self, df: pd.DataFrame) -> None:
+    def set_df(
+        self,
+        df: Optional[pd.DataFrame],
+        columns: Optional[Sequence[str]] = None,
+        row_cids: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        columns 為要顯示的欄位（依序）；None 表示顯示 df 的全部欄位。
+        row_cids 為與 df 各列對齊的開課序號（int64）。
+        """
         self.beginResetModel()
         self._df = df
+        self._rebuild_columns(columns)
+        self._rebuild_row_cids(row_cids)
         self.endResetModel()
 
     def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
-        return 0 if parent.isValid() else len(self._df)
+        if parent.isValid() or self._df is None:
+            return 0
+        return len(self._df)
 
     def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
         if parent.isValid():
             return 0
-        return len(self._df.columns) + 1
+        return len(self._col_pos) + 1
 
     def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
         if role != Qt.DisplayRole:
@@ -469,17 +778,13 @@ class ResultsModel(QAbstractTableModel):
         if orientation == Qt.Horizontal:
             if section == 0:
                 return "我的最愛"
-            return str(self._df.columns[section - 1])
+            return self._columns[section - 1]
         return str(section + 1)
 
     def _course_id_at_row(self, row: int) -> Optional[int]:
-        if row < 0 or row >= len(self._df):
-            return None
-        try:
-            v = self._df.iloc[row]["開課序號"]
-            return int(str(v).strip())
-        except Exception:
+        if row < 0 or row >= self._row_cids.size:
             return None
+        return self._row_cids.item(row)
 
     def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
         if not index.isValid():
@@ -493,23 +798,21 @@ class ResultsModel(QAbstractTableModel):
                 cid = self._course_id_at_row(r)
                 return 1 if (cid is not None and self._fav_has(cid)) else 0
 
-            col_name = self._df.columns[c - 1]
-            v = self._df.iat[r, c - 1]
+            col_name = self._columns[c - 1]
+            if col_name == "開課序號":
+                cid = self._course_id_at_row(r)
+                return 10**9 if cid is None else cid
 
-            if str(col_name) == "開課序號":
-                try:
-                    return int(str(v).strip())
-                except Exception:
-                    return 10**9
+            v = self._df.iat[r, self._col_pos[c - 1]]
 
-            if isinstance(v, (int, float, np.integer, np.floating)) and not (isinstance(v, float) and pd.isna(v)):
+            if isinstance(v, (int, float, np.integer, np.floating)) and not (isinstance(v, float) and lazy_pandas().isna(v)):
                 try:
                     return float(v)
                 except Exception:
                     return 0.0
 
             try:
-                return "" if pd.isna(v) else str(v)
+                return "" if lazy_pandas().isna(v) else str(v)
             except Exception:
                 return str(v)
 
@@ -524,12 +827,12 @@ class ResultsModel(QAbstractTableModel):
             return None
 
         c2 = c - 1
-        if c2 < 0 or c2 >= len(self._df.columns):
+        if c2 < 0 or c2 >= len(self._col_pos):
             return None
 
         if role in (Qt.DisplayRole, Qt.ToolTipRole):
-            v = self._df.iat[r, c2]
-            return "" if pd.isna(v) else str(v)
+            v = self._df.iat[r, self._col_pos[c2]]
+            return "" if lazy_pandas().isna(v) else str(v)
         return None
 
     def flags(self, index: QModelIndex):
@@ -581,6 +884,83 @@ class CheckBoxClickDelegate(QStyledItemDelegate):
         return super().editorEvent(event, model, option, index)
 
 
+class FavHandleDelegate(QStyledItemDelegate):
+    """我的最愛拖曳欄：每格直接畫「☰」，不再為每列建立 QWidget + QLabel。"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tooltip = ""
+
+    def paint(self, painter: QPainter, option, index: QModelIndex):
+        super().paint(painter, option, index)
+        painter.save()
+        painter.setPen(option.palette.color(QPalette.Text))
+        painter.drawText(option.rect, Qt.AlignCenter, "☰")
+        painter.restore()
+
+    def helpEvent(self, event, view, option, index):
+        if event.type() == QEvent.ToolTip and self.tooltip:
+            QToolTip.showText(event.globalPos(), self.tooltip, view)
+            return True
+        return super().helpEvent(event, view, option, index)
+
+
+class FavDeleteDelegate(QStyledItemDelegate):
+    """
+    我的最愛刪除欄：未鎖定的列畫出「×」按鈕，滑鼠在按鈕上放開時發出 deleteRequested(cid)；
+    取代每列一個 QPushButton。鎖定狀態取 lock_col 的 Qt.UserRole，cid 取 FAV_CID_ROLE。
+    """
+
+    deleteRequested = Signal(int)
+
+    BUTTON_WIDTH = 32
+
+    def __init__(self, lock_col: int, parent=None):
+        super().__init__(parent)
+        self._lock_col = lock_col
+        # 按鈕的樣式選項只建立一次，繪製時只改 rect / state
+        self._button_opt = QStyleOptionButton()
+        self._button_opt.text = "×"
+
+    def _is_locked(self, index: QModelIndex) -> bool:
+        return bool(index.siblingAtColumn(self._lock_col).data(Qt.UserRole))
+
+    def _button_rect(self, rect: QRect) -> QRect:
+        w = min(self.BUTTON_WIDTH, rect.width())
+        return QRect(rect.left() + (rect.width() - w) // 2, rect.top(), w, rect.height())
+
+    def paint(self, painter: QPainter, option, index: QModelIndex):
+        super().paint(painter, option, index)
+        if self._is_locked(index):
+            return
+        btn = self._button_opt
+        btn.rect = self._button_rect(option.rect)
+        btn.state = QStyle.State_Raised | (option.state & QStyle.State_Enabled)
+        widget = option.widget
+        style = widget.style() if widget is not None else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, btn, painter, widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick):
+            if event.button() != Qt.LeftButton or self._is_locked(index):
+                return False
+            pos = event.position().toPoint() if hasattr(event, "position") else event.pos()
+            if not self._button_rect(option.rect).contains(pos):
+                return False
+            if event.type() == QEvent.MouseButtonRelease:
+                cid = index.data(FAV_CID_ROLE)
+                if cid is not None:
+                    self.deleteRequested.emit(int(cid))
+            return True
+        return super().editorEvent(event, model, option, index)
+
+    def helpEvent(self, event, view, option, index):
+        if event.type() == QEvent.ToolTip and not self._is_locked(index):
+            QToolTip.showText(event.globalPos(), "刪除此最愛", view)
+            return True
+        return super().helpEvent(event, view, option, index)
+
+
 class ResultsFrozenView(QWidget):
     def __init__(self, parent: Optional[QWidget] = None):
         super().__init__(parent)
@@ -707,18 +1087,17 @@ class ResultsFrozenView(QWidget):
             return
         self._last_header_signature = sig
 
-        hh = self.main_view.horizontalHeader()
-        fm = QFontMetrics(hh.font())
-        one_char = max(1, fm.horizontalAdvance("字"))
+        font = self.main_view.horizontalHeader().font()
+        one_char = max(1, text_width(font, "字"))
 
         title0 = headers[0] if headers else "我的最愛"
-        w0 = fm.horizontalAdvance(title0) + one_char + 22
+        w0 = text_width(font, title0) + one_char + 22
         w0 = max(w0, 60)
         self.frozen_view.setColumnWidth(0, int(w0))
 
         for c in range(1, col_count):
             title = headers[c]
-            w = fm.horizontalAdvance(title) + one_char + 22
+            w = text_width(font, title) + one_char + 22
             w = max(w, 60)
             self.main_view.setColumnWidth(c, int(w))
 
@@ -789,6 +1168,63 @@ class TimetableWidget(QTableWidget):
         super().wheelEvent(event)
 
 
+class _MaskFilterProxy(QSortFilterProxyModel):
+    """依預先算好的布林遮罩過濾來源列；遮罩為 None 時全部顯示。"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._mask: Optional[np.ndarray] = None
+
+    def set_mask(self, mask: Optional[np.ndarray]) -> None:
+        self._mask = mask
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        m = self._mask
+        return m is None or (source_row < m.size and bool(m[source_row]))
+
+
+class ContainsCompleter(QCompleter):
+    """
+    不分大小寫的「包含」補全：候選字串的 casefold 版本只在 set_items 時計算一次，
+    輸入變動時（set_filter_text，接在 line edit 的 textEdited）以 numpy 一次掃過全部候選，
+    結果交給 proxy 過濾；splitPath 不修改模型。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._items_folded = np.empty((0,), dtype=str)
+        self._needle = ""
+        self._list_model = QStringListModel(self)
+        self._proxy = _MaskFilterProxy(self)
+        self._proxy.setSourceModel(self._list_model)
+        self.setModel(self._proxy)
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+
+    def set_items(self, items: Sequence[str]) -> None:
+        texts = [str(x) for x in items]
+        self._items_folded = np.array([t.casefold() for t in texts], dtype=str)
+        self._list_model.setStringList(texts)
+        self._proxy.set_mask(self._match_mask(self._needle))
+
+    def set_filter_text(self, text: str) -> None:
+        needle = (text or "").casefold()
+        if needle == self._needle:
+            return
+        self._needle = needle
+        self._proxy.set_mask(self._match_mask(needle))
+
+    def _match_mask(self, needle: str) -> Optional[np.ndarray]:
+        if not needle or not self._items_folded.size:
+            return None
+        return np.char.find(self._items_folded, needle) >= 0
+
+    def splitPath(self, path: str) -> List[str]:
+        # 過濾已由 proxy 完成，不讓 QCompleter 再以前綴比對
+        return [""]
+
+
 class MainWindowLike(Protocol):
     def tt_cell_has_selector_box(self, row: int, col: int) -> bool: ...
     def tt_day_idx_from_col(self, col: int) -> Optional[int]: ...
@@ -802,6 +1238,11 @@ class TTTimeSelectDelegate(QStyledItemDelegate):
         self.mw = mw
         self.box_size = 12
         self.box_margin = 2
+        # 勾選框的顏色與畫筆在建構時建立一次，繪製每格時直接取用
+        self._selected_color = QColor(220, 0, 0)
+        self._selected_pen = QPen(self._selected_color, 1)
+        self._locked_pen = QPen(QColor(140, 140, 140), 1)
+        self._normal_pen = QPen(QColor(0, 0, 0), 1)
 
     def paint(self, painter: QPainter, option, index: QModelIndex):
         super().paint(painter, option, index)
@@ -825,13 +1266,12 @@ class TTTimeSelectDelegate(QStyledItemDelegate):
         painter.save()
 
         if selected:
-            painter.setPen(QPen(QColor(220, 0, 0), 1))
+            painter.setPen(self._selected_pen)
             painter.drawRect(box)
             inner = box.adjusted(2, 2, -2, -2)
-            painter.fillRect(inner, QColor(220, 0, 0))
+            painter.fillRect(inner, self._selected_color)
         else:
-            pen_color = QColor(140, 140, 140) if locked_cell else QColor(0, 0, 0)
-            painter.setPen(QPen(pen_color, 1))
+            painter.setPen(self._locked_pen if locked_cell else self._normal_pen)
             painter.drawRect(box)
 
         painter.restore()
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import multiprocessing
 import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Dict, List, Set, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 import numpy as np
 from PySide6.QtCore import QObject, QRunnable, Signal
@@ -20,34 +22,37 @@ class SaveWorker(QObject, QRunnable):
         token: int,
         path: str,
         username: str,
-        favorites: Set[int],
+        favorites_sorted: np.ndarray,
         included_sorted: np.ndarray,
         locked_sorted: np.ndarray,
-        fav_seq: Dict[int, int],
+        fav_seqs: np.ndarray,
         courses_df,
     ):
+        """fav_seqs 與 favorites_sorted 逐一對齊；陣列由呼叫端的快照切出，不再複製。"""
         QObject.__init__(self)
         QRunnable.__init__(self)
         self.setAutoDelete(True)
 
+        empty = np.empty((0,), dtype=np.int64)
         self.token = int(token)
         self.path = path
         self.username = username
-        self.favorites = set(favorites)
-        self.included_sorted = included_sorted.copy() if included_sorted is not None else np.empty((0,), dtype=np.int64)
-        self.locked_sorted = locked_sorted.copy() if locked_sorted is not None else np.empty((0,), dtype=np.int64)
-        self.fav_seq = dict(fav_seq)
+        self.favorites_sorted = favorites_sorted if favorites_sorted is not None else empty
+        self.included_sorted = included_sorted if included_sorted is not None else empty
+        self.locked_sorted = locked_sorted if locked_sorted is not None else empty
+        self.fav_seqs = fav_seqs if fav_seqs is not None else empty
         self.courses_df = courses_df
 
     def run(self):
         try:
+            favorites = self.favorites_sorted.tolist()
             save_user_file(
                 self.path,
                 self.username,
-                self.favorites,
+                favorites,
                 self.included_sorted,
                 self.locked_sorted,
-                self.fav_seq,
+                dict(zip(favorites, self.fav_seqs.tolist())),
                 self.courses_df,
             )
             self.finished.emit(self.token, True, "")
@@ -73,6 +78,157 @@ class _HalfEntry:
     priority_sum: int
 
 
+_BEST_KEEP = 5
+
+# 配對組數達此門檻才把配對分段送到子行程；組數少時行程啟動成本高於計算本身
+_PARALLEL_MERGE_MIN_PAIRS = 2_000_000
+
+_HalfItem = Tuple[int, float, int, int, int]
+
+
+def _order_key_for_ids(ids: tuple, order_map: Dict[int, int]) -> List[int]:
+    return sorted(order_map.get(int(cid), 10**12) for cid in ids)
+
+
+def _better_half_entry(a: _HalfEntry, b: _HalfEntry, order_map: Dict[int, int]) -> bool:
+    if a.credit != b.credit:
+        return a.credit > b.credit
+    if a.priority_sum != b.priority_sum:
+        return a.priority_sum < b.priority_sum
+    return _order_key_for_ids(a.ids, order_map) < _order_key_for_ids(b.ids, order_map)
+
+
+def _enumerate_half(
+    items_half: List[_HalfItem],
+    order_map: Dict[int, int],
+    should_stop: Optional[Callable[[], bool]] = None,
+    on_item_done: Optional[Callable[[int, int], None]] = None,
+) -> Dict[int, _HalfEntry]:
+    """列舉半邊課程的所有不衝堂組合，每個遮罩只保留最佳者。"""
+    results: Dict[int, _HalfEntry] = {0: _HalfEntry(mask=0, credit=0.0, gened=0, ids=tuple(), priority_sum=0)}
+    total_items = len(items_half)
+    for idx, (cid, credit, gened, mask, order_val) in enumerate(items_half, start=1):
+        if should_stop is not None and should_stop():
+            return {}
+        snapshot = list(results.items())
+        for mask0, entry in snapshot:
+            if mask0 & mask:
+                continue
+            new_mask = mask0 | mask
+            new_entry = _HalfEntry(
+                mask=new_mask,
+                credit=entry.credit + credit,
+                gened=entry.gened + gened,
+                ids=entry.ids + (cid,),
+                priority_sum=entry.priority_sum + order_val,
+            )
+            existing = results.get(new_mask)
+            if existing is None or _better_half_entry(new_entry, existing, order_map):
+                results[new_mask] = new_entry
+        if on_item_done is not None:
+            on_item_done(idx, total_items)
+    return results
+
+
+def _best_sort_key(entry: dict):
+    # 同分時以配對順序（左半位置、右半位置）決定先後
+    return (-entry["credits"], entry["priority_sum"], entry["order_key"], entry["pair_pos"])
+
+
+def _merge_halves(
+    left_list: List[_HalfEntry],
+    right_list: List[_HalfEntry],
+    base_credit: float,
+    base_gened: int,
+    locked_ids: List[int],
+    order_map: Dict[int, int],
+    should_stop: Optional[Callable[[], bool]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    left_start: int = 0,
+    left_stride: int = 1,
+) -> List[dict]:
+    """
+    左右兩半配對，保留前 _BEST_KEEP 名（學分多、優先度和小者優先）。
+    right_list 需依學分遞減排序；left_list 可為完整左半清單的等距切片 full[left_start::left_stride]，
+    各切片結果合併後再排序即得與完整清單相同的結果。
+    """
+    best: List[dict] = []
+
+    def consider_combo(left: _HalfEntry, right: _HalfEntry, pair_pos: Tuple[int, int]) -> None:
+        total_credit = base_credit + left.credit + right.credit
+        total_gened = base_gened + left.gened + right.gened
+        ids_all = sorted(locked_ids + list(left.ids) + list(right.ids))
+        order_key = sorted(order_map.get(cid, 10**12) for cid in ids_all)
+        priority_sum = sum(order_key)
+        entry = {
+            "credits": total_credit,
+            "gened": total_gened,
+            "ids": ids_all,
+            "order_key": order_key,
+            "priority_sum": priority_sum,
+            "pair_pos": pair_pos,
+        }
+        best.append(entry)
+        best.sort(key=_best_sort_key)
+        if len(best) > _BEST_KEEP:
+            del best[_BEST_KEEP:]
+
+    max_right_credit = right_list[0].credit if right_list else 0.0
+
+    total_pairs = len(left_list) * len(right_list)
+    step = max(1, total_pairs // 200) if total_pairs > 0 else 1
+    done_pairs = 0
+
+    for li, left in enumerate(left_list):
+        if should_stop is not None and should_stop():
+            return []
+        if len(best) == _BEST_KEEP:
+            worst_credit = best[-1]["credits"]
+            if base_credit + left.credit + max_right_credit + 1e-9 < worst_credit:
+                continue
+        for ri, right in enumerate(right_list):
+            if should_stop is not None and should_stop():
+                return []
+            total_credit = base_credit + left.credit + right.credit
+            if len(best) == _BEST_KEEP and total_credit + 1e-9 < best[-1]["credits"]:
+                break
+            if left.mask & right.mask:
+                continue
+            consider_combo(left, right, (left_start + li * left_stride, ri))
+            done_pairs += 1
+            if on_progress is not None and done_pairs % step == 0 and total_pairs > 0:
+                on_progress(done_pairs, total_pairs)
+
+    return best
+
+
+# 子行程共用的取消旗標：由 pool initializer 傳入（同步物件只能在建立行程時繼承，不能隨 submit 傳遞）
+_MERGE_STOP_EVENT = None
+# 每檢查這麼多次才查一次旗標；Event.is_set 需跨行程取鎖，不在每組配對都查
+_MERGE_STOP_CHECK_EVERY = 4096
+
+
+def _init_merge_worker(stop_event) -> None:
+    global _MERGE_STOP_EVENT
+    _MERGE_STOP_EVENT = stop_event
+
+
+def _merge_halves_in_child(*args, **kwargs) -> List[dict]:
+    """子行程入口：以共用 Event 作為 _merge_halves 的 should_stop，主行程取消時正在執行的配對也會停止。"""
+    event = _MERGE_STOP_EVENT
+    calls = 0
+
+    def stop() -> bool:
+        nonlocal calls
+        calls += 1
+        if calls < _MERGE_STOP_CHECK_EVERY:
+            return False
+        calls = 0
+        return event is not None and event.is_set()
+
+    return _merge_halves(*args, should_stop=stop, **kwargs)
+
+
 class BestScheduleWorker(QObject, QRunnable):
     finished = Signal(int, bool, bool, list, str)
     progress = Signal(int, int)
@@ -182,6 +338,85 @@ class BestScheduleWorker(QObject, QRunnable):
             k += 1
         return out
 
+    def _enumerate_halves(
+        self,
+        left_items: List[_HalfItem],
+        right_items: List[_HalfItem],
+        order_map: Dict[int, int],
+    ) -> Tuple[Dict[int, _HalfEntry], Dict[int, _HalfEntry]]:
+        def stop() -> bool:
+            return self._cancel_requested
+
+        def progress_cb(start: int, span: int) -> Callable[[int, int], None]:
+            def _cb(idx: int, total: int) -> None:
+                if total > 0:
+                    self._emit_progress(start + int(span * (idx / total)))
+            return _cb
+
+        left_map = _enumerate_half(left_items, order_map, stop, progress_cb(0, 40))
+        if self._cancel_requested:
+            return {}, {}
+        right_map = _enumerate_half(right_items, order_map, stop, progress_cb(40, 40))
+        return left_map, right_map
+
+    def _merge_halves_parallel(
+        self,
+        left_list: List[_HalfEntry],
+        right_list: List[_HalfEntry],
+        base_credit: float,
+        base_gened: int,
+        locked_ids: List[int],
+        order_map: Dict[int, int],
+    ) -> List[dict]:
+        # 純 Python 配對受 GIL 限制，執行緒無法並行；左半（第一層選擇）等距切片分給子行程，
+        # 每片的學分分布相近，各自的剪枝門檻也相近，最後合併各片前幾名
+        workers = max(2, min(os.cpu_count() or 1, 8, len(left_list)))
+
+        ctx = multiprocessing.get_context("spawn")
+        stop_event = ctx.Event()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=ctx,
+            initializer=_init_merge_worker,
+            initargs=(stop_event,),
+        )
+        cancelled = False
+        futures = []
+        try:
+            for k in range(workers):
+                futures.append(
+                    pool.submit(
+                        _merge_halves_in_child,
+                        left_list[k::workers],
+                        right_list,
+                        base_credit,
+                        base_gened,
+                        locked_ids,
+                        order_map,
+                        left_start=k,
+                        left_stride=workers,
+                    )
+                )
+            pending = set(futures)
+            while pending:
+                _done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                if self._cancel_requested:
+                    cancelled = True
+                    return []
+                self._emit_progress(80 + int(20 * (len(futures) - len(pending)) / len(futures)))
+
+            merged: List[dict] = []
+            for fut in futures:
+                merged.extend(fut.result())
+            merged.sort(key=_best_sort_key)
+            return merged[:_BEST_KEEP]
+        finally:
+            # 取消（或例外離開）時通知仍在執行的子行程停止配對；不等待其結束，讓 UI 能立即收到取消結果
+            if cancelled or any(not f.done() for f in futures):
+                stop_event.set()
+                cancelled = True
+            pool.shutdown(wait=not cancelled, cancel_futures=cancelled)
+
     def _compute_best_combinations(self) -> List[dict]:
         cand, base_credit, base_gened, locked_ids, base_lo, base_hi = self._build_candidates()
         if not cand and not locked_ids:
@@ -202,54 +437,7 @@ class BestScheduleWorker(QObject, QRunnable):
         left_items = items[:mid]
         right_items = items[mid:]
 
-        def order_key_for_ids(ids: tuple) -> List[int]:
-            return sorted(order_map.get(int(cid), 10**12) for cid in ids)
-
-        def better_entry(a: _HalfEntry, b: _HalfEntry) -> bool:
-            if a.credit != b.credit:
-                return a.credit > b.credit
-            if a.priority_sum != b.priority_sum:
-                return a.priority_sum < b.priority_sum
-            ka = order_key_for_ids(a.ids)
-            kb = order_key_for_ids(b.ids)
-            return ka < kb
-
-        def enumerate_half(
-            items_half: List[Tuple[int, float, int, int, int]],
-            progress_start: int,
-            progress_span: int,
-        ) -> Dict[int, _HalfEntry]:
-            results: Dict[int, _HalfEntry] = {
-                0: _HalfEntry(mask=0, credit=0.0, gened=0, ids=tuple(), priority_sum=0)
-            }
-            total_items = len(items_half)
-            for idx, (cid, credit, gened, mask, order_val) in enumerate(items_half, start=1):
-                if self._cancel_requested:
-                    return {}
-                snapshot = list(results.items())
-                for mask0, entry in snapshot:
-                    if mask0 & mask:
-                        continue
-                    new_mask = mask0 | mask
-                    new_entry = _HalfEntry(
-                        mask=new_mask,
-                        credit=entry.credit + credit,
-                        gened=entry.gened + gened,
-                        ids=entry.ids + (cid,),
-                        priority_sum=entry.priority_sum + order_val,
-                    )
-                    existing = results.get(new_mask)
-                    if existing is None or better_entry(new_entry, existing):
-                        results[new_mask] = new_entry
-                if total_items > 0:
-                    pct = progress_start + int(progress_span * (idx / total_items))
-                    self._emit_progress(pct)
-            return results
-
-        left_map = enumerate_half(left_items, 0, 40)
-        if self._cancel_requested:
-            return []
-        right_map = enumerate_half(right_items, 40, 40)
+        left_map, right_map = self._enumerate_halves(left_items, right_items, order_map)
         if self._cancel_requested:
             return []
 
@@ -259,56 +447,26 @@ class BestScheduleWorker(QObject, QRunnable):
         left_list.sort(key=lambda x: -x.credit)
         right_list.sort(key=lambda x: (-x.credit, x.priority_sum))
 
-        best: List[dict] = []
-
-        def consider_combo(left: _HalfEntry, right: _HalfEntry) -> None:
-            total_credit = base_credit + left.credit + right.credit
-            total_gened = base_gened + left.gened + right.gened
-            ids_all = sorted(locked_ids + list(left.ids) + list(right.ids))
-            order_key = sorted(order_map.get(cid, 10**12) for cid in ids_all)
-            priority_sum = sum(order_key)
-            entry = {
-                "credits": total_credit,
-                "gened": total_gened,
-                "ids": ids_all,
-                "order_key": order_key,
-                "priority_sum": priority_sum,
-            }
-            best.append(entry)
-            best.sort(key=lambda x: (-x["credits"], x["priority_sum"], x["order_key"]))
-            if len(best) > 5:
-                del best[5:]
-
-        max_right_credit = right_list[0].credit if right_list else 0.0
-
-        total_pairs = len(left_list) * len(right_list)
-        step = max(1, total_pairs // 200) if total_pairs > 0 else 1
-        done_pairs = 0
-
-        for left in left_list:
-            if self._cancel_requested:
-                return []
-            if len(best) == 5:
-                worst_credit = best[-1]["credits"]
-                if base_credit + left.credit + max_right_credit + 1e-9 < worst_credit:
-                    continue
-            for right in right_list:
+        parallel_ok = (os.cpu_count() or 1) > 1 and len(left_list) > 1
+        if parallel_ok and len(left_list) * len(right_list) >= _PARALLEL_MERGE_MIN_PAIRS:
+            try:
+                return self._merge_halves_parallel(
+                    left_list, right_list, base_credit, base_gened, locked_ids, order_map
+                )
+            except Exception:
                 if self._cancel_requested:
                     return []
-                total_credit = base_credit + left.credit + right.credit
-                if len(best) == 5 and total_credit + 1e-9 < best[-1]["credits"]:
-                    break
-                if left.mask & right.mask:
-                    continue
-                consider_combo(left, right)
-                done_pairs += 1
-                if done_pairs % step == 0 and total_pairs > 0:
-                    pct = 80 + int(20 * done_pairs / total_pairs)
-                    self._emit_progress(pct)
-
-        if not best:
-            return []
-        return best
+                # 無法啟動子行程（例如受限環境）時退回單行程
+
+        def stop() -> bool:
+            return self._cancel_requested
+
+        def on_progress(done_pairs: int, total_pairs: int) -> None:
+            self._emit_progress(80 + int(20 * done_pairs / total_pairs))
+
+        return _merge_halves(
+            left_list, right_list, base_credit, base_gened, locked_ids, order_map, stop, on_progress
+        )
 
     def _write_results(self, results: List[dict]) -> List[str]:
         if not results: